@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'pms.middleware.StaticFilesMiddleware',
+    'pms.middleware.RequestMetricsMiddleware',
+    'pms.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,10 +58,18 @@ ROOT_URLCONF = 'kodi_pms.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'pms.instrumentation.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compile each template once per process. This is Django's default
+            # since 4.1, spelled out so it survives edits to this block; in
+            # development runserver still reloads edited templates.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -81,6 +93,103 @@ DATABASES = {
     }
 }
 
+# Read replica (pms.routers). Set PMS_REPLICA_DB to the replica's database
+# name, e.g. a second SQLite file kept current with `manage.py sync_replica`,
+# or a Postgres standby with the primary's credentials. The read-only views
+# in PMS_REPLICA_VIEWS then read from it, except for a client's first
+# PMS_REPLICA_STICKY_SECONDS after a write.
+if os.environ.get('PMS_REPLICA_DB'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ['PMS_REPLICA_DB'],
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['pms.routers.ReplicaRouter']
+PMS_READ_REPLICA = 'replica' if 'replica' in DATABASES else None
+PMS_REPLICA_VIEWS = (
+    'dashboard', 'financial_trend', 'export_data', 'property_list', 'unit_list', 'tenant_list', 'lease_list',
+    'payment_list', 'ticket_list', 'visitor_list', 'search',
+)
+PMS_REPLICA_STICKY_SECONDS = 10
+
+# SQLite tuning profile (pms.sqlite_tuning): WAL, synchronous=NORMAL,
+# busy_timeout and in-memory temp tables on every new connection. Opt in
+# with PMS_SQLITE_PROFILE=production on the servers; WAL is written into
+# the database file, so it stays off for checkouts and one-off commands.
+PMS_SQLITE_PROFILE = os.environ.get('PMS_SQLITE_PROFILE') or None
+# Overrides of the profile's pragmas; size these to the host's memory.
+PMS_SQLITE_PRAGMAS = {
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# locmem is per-process; point this at Redis or Memcached in production so
+# every worker shares the dashboard cache and its invalidations.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'kodi-pms',
+    },
+    # Rendered rows are small but many: several pages of 50 per list.
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'kodi-pms-fragments',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
+# Rendered list rows and property cards ({% cached_rows %}). Keys change
+# with each row's updated_at, so entries only need to expire to free space.
+PMS_FRAGMENT_CACHE = 'fragments'
+PMS_FRAGMENT_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Seconds a cached dashboard may live; writes invalidate it sooner.
+PMS_DASHBOARD_CACHE_TIMEOUT = 300
+
+# Serve the async dashboard and list views. kodi_pms/asgi.py sets the
+# environment variable; WSGI deployments keep the sync views.
+PMS_ASYNC_VIEWS = os.environ.get('PMS_ASYNC_VIEWS') == '1'
+
+# Live dashboard updates (pms.events), streamed by the ASGI views. The local
+# backend reaches streams in the same process only; with several workers set
+# PMS_EVENTS_REDIS_URL to use Redis pub/sub (pip install redis).
+PMS_EVENTS_REDIS_URL = os.environ.get('PMS_EVENTS_REDIS_URL')
+PMS_EVENTS_BACKEND = 'pms.events.RedisBackend' if PMS_EVENTS_REDIS_URL else 'pms.events.LocalBackend'
+PMS_EVENTS_INTERVAL = 1.0
+PMS_EVENTS_STREAM_SECONDS = 300
+PMS_EVENTS_KEEPALIVE = 15
+
+# Request instrumentation (pms.middleware.RequestMetricsMiddleware).
+# Send per-request SQL/template/total timings as a Server-Timing header.
+PMS_SERVER_TIMING = True
+# Maximum SQL queries per request, by URL name. Requests over budget are
+# logged, or raise QueryBudgetExceeded when PMS_QUERY_BUDGET_RAISE is set.
+# Each allows two queries for the session and user of a signed-in request,
+# plus the conditional-GET validator queries of the pages that have them.
+PMS_QUERY_BUDGETS = {
+    'dashboard': 10,
+    'financial_trend': 4,
+    'property_list': 3,
+    'property_detail': 5,
+    'unit_list': 3,
+    'tenant_list': 3,
+    'lease_list': 3,
+    'payment_list': 6,
+    'ticket_list': 3,
+    'visitor_list': 7,
+    'tenant_lookup': 3,
+    'lease_lookup': 3,
+    'unit_lookup': 3,
+    'property_lookup': 3,
+    'search': 3,
+    'gate_inside': 4,
+}
+PMS_QUERY_BUDGET_RAISE = False
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -117,7 +226,20 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
 STATIC_URL = 'static/'
+# static/ holds the compiled stylesheet and icon font; rebuild them with
+# `manage.py build_assets`. `manage.py collectstatic` copies them to
+# STATIC_ROOT under content-hashed names, with gzip/brotli copies, which
+# pms.middleware.StaticFilesMiddleware serves when DEBUG is off.
 STATICFILES_DIRS = [BASE_DIR / 'static']
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'pms.staticfiles.PrecompressedManifestStaticFilesStorage'},
+}
+# Cache lifetime, in seconds, of static files with content-hashed names.
+PMS_STATIC_MAX_AGE = 365 * 24 * 60 * 60
+# Tailwind v4 CLI used by `manage.py build_assets`.
+PMS_TAILWIND_BIN = 'tailwindcss'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Property, Unit, Tenant, Lease, Payment, Expense, MaintenanceTicket, Visitor
+from .models import Property, Unit, Tenant, Lease, Payment, Expense, MaintenanceTicket, Visitor, PropertyMonthlyLedger, TenantLedgerEntry, RentInvoice, LeaseSweepRun, UnitStatusChange, PropertyDailySnapshot
 
 @admin.register(Property)
 class PropertyAdmin(admin.ModelAdmin):
@@ -9,7 +9,7 @@ class PropertyAdmin(admin.ModelAdmin):
 
 @admin.register(Unit)
 class UnitAdmin(admin.ModelAdmin):
-    list_display = ('unit_number', 'property', 'unit_type', 'rent_amount', 'status')
+    list_display = ('unit_number', 'property', 'unit_type', 'rent_amount', 'status', 'vacant_since')
     list_filter = ('status', 'unit_type', 'property')
     search_fields = ('unit_number',)
 
@@ -46,3 +46,47 @@ class VisitorAdmin(admin.ModelAdmin):
     list_display = ('name', 'unit_visiting', 'entry_time', 'exit_time')
     list_filter = ('entry_time',)
     search_fields = ('name', 'phone', 'vehicle_plate')
+
+@admin.register(PropertyMonthlyLedger)
+class PropertyMonthlyLedgerAdmin(admin.ModelAdmin):
+    list_display = ('property', 'year', 'month', 'revenue', 'expenses', 'payment_count', 'expense_count')
+    list_filter = ('year', 'property')
+
+@admin.register(RentInvoice)
+class RentInvoiceAdmin(admin.ModelAdmin):
+    list_display = ('lease', 'tenant', 'period_start', 'period_end', 'due_date', 'amount')
+    list_filter = ('period_start',)
+    search_fields = ('tenant__first_name', 'tenant__last_name')
+    raw_id_fields = ('lease', 'tenant')
+    readonly_fields = ('lease', 'tenant', 'period_start', 'period_end', 'due_date', 'amount')
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(TenantLedgerEntry)
+class TenantLedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ('tenant', 'entry_type', 'amount', 'due_date', 'posted_at', 'description')
+    list_filter = ('entry_type', 'posted_at')
+    search_fields = ('tenant__first_name', 'tenant__last_name', 'description')
+    raw_id_fields = ('tenant', 'lease', 'payment', 'invoice')
+    # Entries must be posted through pms.balances so Tenant.balance stays in step.
+    readonly_fields = ('tenant', 'lease', 'payment', 'invoice', 'entry_type', 'amount', 'due_date', 'posted_at', 'description')
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(LeaseSweepRun)
+class LeaseSweepRunAdmin(admin.ModelAdmin):
+    list_display = ('ran_at', 'as_of', 'expiring', 'terminated', 'units_vacated')
+
+@admin.register(UnitStatusChange)
+class UnitStatusChangeAdmin(admin.ModelAdmin):
+    list_display = ('unit', 'from_status', 'to_status', 'changed_at', 'reason')
+    list_filter = ('to_status', 'reason')
+    raw_id_fields = ('unit',)
+
+@admin.register(PropertyDailySnapshot)
+class PropertyDailySnapshotAdmin(admin.ModelAdmin):
+    list_display = ('property', 'date', 'occupied_units', 'vacant_units', 'maintenance_units',
+                    'expected_rent', 'collected_rent', 'open_tickets')
+    list_filter = ('date', 'property')
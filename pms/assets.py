@@ -0,0 +1,123 @@
+"""
+Build step for the self-hosted stylesheet and icon font (``manage.py
+build_assets``).
+
+* The Tailwind CLI compiles ``assets/tailwind.css`` into
+  ``static/css/app.css``. It keeps only the utilities used in ``templates/``
+  and in the form widgets' ``attrs`` in ``pms``.
+* The Font Awesome solid font is cut down to the icons the templates use.
+  The subset becomes ``static/webfonts/fa-solid-900-subset.woff2``, with the
+  matching rules in ``static/css/icons.css``.
+
+The outputs are committed, so deployments and the offline gate terminals
+need no build tools. Rebuild after adding a class or an icon. Build-time
+requirements: a Tailwind v4 CLI (``pip install tailwindcss-bin``, or
+``npm install tailwindcss @tailwindcss/cli``), Font Awesome Free
+(``pip install fontawesomefree``, or an unpacked release) and fontTools
+with brotli for WOFF2 output.
+"""
+import json
+import re
+import shutil
+import subprocess
+from pathlib import Path
+
+from django.conf import settings
+
+TEMPLATE_GLOB = 'templates/**/*.html'
+ICON_CLASS = re.compile(r'\bfa-([a-z0-9-]+)')
+# Single-selector rules of fontawesome.css, e.g. sizing (fa-lg) and fixed width (fa-fw).
+HELPER_RULE = re.compile(r'^\.fa-([a-z0-9-]+) \{([^}]*)\}', re.M)
+FONT_FAMILY = 'Font Awesome 6 Free'
+SUBSET_FONT = 'fa-solid-900-subset.woff2'
+
+ICON_BASE_CSS = (
+    '.fa,.fas,.fa-solid{-moz-osx-font-smoothing:grayscale;-webkit-font-smoothing:antialiased;'
+    'display:var(--fa-display,inline-block);font-style:normal;font-variant:normal;line-height:1;'
+    f'text-rendering:auto;font-family:"{FONT_FAMILY}";font-weight:900}}'
+)
+
+
+class AssetBuildError(Exception):
+    pass
+
+
+def template_files(base_dir=None):
+    return sorted(Path(base_dir or settings.BASE_DIR).glob(TEMPLATE_GLOB))
+
+
+def used_icons(paths):
+    """Names of the ``fa-*`` classes in ``paths``, icons and helpers alike."""
+    names = set()
+    for path in paths:
+        names.update(ICON_CLASS.findall(Path(path).read_text(encoding='utf-8')))
+    return names
+
+
+def solid_codepoints(fontawesome_dir):
+    """``{icon name or alias: codepoint}`` of the free solid icons, from Font Awesome's metadata."""
+    metadata = json.loads((Path(fontawesome_dir) / 'metadata' / 'icons.json').read_text(encoding='utf-8'))
+    codepoints = {}
+    for name, icon in metadata.items():
+        if 'solid' not in icon.get('free', []):
+            continue
+        codepoint = int(icon['unicode'], 16)
+        for alias in [name, *icon.get('aliases', {}).get('names', [])]:
+            codepoints[alias] = codepoint
+    return codepoints
+
+
+def build_icons(fontawesome_dir, static_dir, icons):
+    """
+    Write the subset font and ``css/icons.css`` for the ``fa-*`` class
+    names in ``icons``. Returns the names that are neither free solid icons
+    nor Font Awesome helper classes (typos, Pro-only icons), which get no
+    rule.
+    """
+    try:
+        from fontTools import subset
+    except ImportError:
+        raise AssetBuildError('fontTools is required to subset the icon font: pip install fonttools brotli')
+
+    fontawesome_dir, static_dir = Path(fontawesome_dir), Path(static_dir)
+    codepoints = solid_codepoints(fontawesome_dir)
+    found = {name: codepoints[name] for name in sorted(icons) if name in codepoints}
+    helpers = dict(HELPER_RULE.findall((fontawesome_dir / 'css' / 'fontawesome.css').read_text(encoding='utf-8')))
+    helpers = {name: ' '.join(helpers[name].split()) for name in sorted(icons) if name in helpers and name not in found}
+
+    (static_dir / 'webfonts').mkdir(parents=True, exist_ok=True)
+    (static_dir / 'css').mkdir(parents=True, exist_ok=True)
+    options = subset.Options()
+    options.flavor = 'woff2'
+    options.layout_features = []
+    font = subset.load_font(str(fontawesome_dir / 'webfonts' / 'fa-solid-900.ttf'), options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=sorted(set(found.values())))
+    subsetter.subset(font)
+    subset.save_font(font, str(static_dir / 'webfonts' / SUBSET_FONT), options)
+    shutil.copyfile(fontawesome_dir / 'LICENSE.txt', static_dir / 'webfonts' / 'FONTAWESOME-LICENSE.txt')
+
+    rules = [
+        '/* Generated by `manage.py build_assets` from Font Awesome Free; see ../webfonts/FONTAWESOME-LICENSE.txt. */',
+        f'@font-face{{font-family:"{FONT_FAMILY}";font-style:normal;font-weight:900;font-display:block;'
+        f'src:url(../webfonts/{SUBSET_FONT}) format("woff2")}}',
+        ICON_BASE_CSS,
+    ]
+    rules += [f'.fa-{name}{{{body}}}' for name, body in helpers.items()]
+    rules += [f'.fa-{name}::before{{content:"\\{codepoint:x}"}}' for name, codepoint in found.items()]
+    (static_dir / 'css' / 'icons.css').write_text('\n'.join(rules) + '\n', encoding='utf-8')
+    return sorted(set(icons) - set(found) - set(helpers))
+
+
+def build_stylesheet(tailwind, source, output):
+    """Compile ``source`` with the Tailwind CLI at ``tailwind`` into a minified ``output``."""
+    executable = shutil.which(tailwind)
+    if executable is None:
+        raise AssetBuildError(f'Tailwind CLI {tailwind!r} not found: pip install tailwindcss-bin, or set PMS_TAILWIND_BIN.')
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    result = subprocess.run(
+        [executable, '--input', str(source), '--output', str(output), '--minify'],
+        capture_output=True, text=True,
+    )
+    if result.returncode:
+        raise AssetBuildError(f'Tailwind failed:\n{result.stderr}')
@@ -0,0 +1,214 @@
+"""
+Tenant account ledger: rent charges and payments posted as
+``TenantLedgerEntry`` rows, with ``Tenant.balance`` kept equal to their sum.
+
+Every posting writes its entry and adjusts the balance with an ``F()``
+update in the same transaction, so concurrent postings never lose an
+update and the balance never needs recomputing from history.
+``rent_due_date`` then moves to the due date of the oldest charge the
+balance has not covered, or to the next due date once the tenant is paid
+up. ``manage.py reconcile_balances`` checks stored balances against the
+entries.
+"""
+from calendar import monthrange
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from . import counters
+from .models import Tenant, TenantLedgerEntry
+
+ZERO = Decimal('0')
+
+# Lease.payment_frequency is free text; recognised values map to a step of
+# (months, days). Anything unrecognised bills monthly.
+FREQUENCY_STEPS = {
+    'weekly': (0, 7),
+    'biweekly': (0, 14),
+    'fortnightly': (0, 14),
+    'monthly': (1, 0),
+    'quarterly': (3, 0),
+    'semi-annually': (6, 0),
+    'semi-annual': (6, 0),
+    'biannually': (6, 0),
+    'annually': (12, 0),
+    'annual': (12, 0),
+    'yearly': (12, 0),
+}
+
+
+def add_months(day, months):
+    index = day.month - 1 + months
+    year, month = day.year + index // 12, index % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, monthrange(year, month)[1]))
+
+
+def frequency_step(frequency):
+    return FREQUENCY_STEPS.get((frequency or '').strip().lower(), (1, 0))
+
+
+def next_due_date(day, frequency):
+    """The due date one billing period after ``day``."""
+    months, days = frequency_step(frequency)
+    return add_months(day, months) + timedelta(days=days)
+
+
+def _payment_entry(payment):
+    return TenantLedgerEntry(
+        tenant_id=payment.tenant_id, lease_id=payment.lease_id, payment=payment,
+        entry_type='payment', amount=-payment.amount, posted_at=payment.date,
+        description=f'Payment {payment.receipt_number}',
+    )
+
+
+def _adjust_balances(deltas):
+    """Apply ``{tenant_id: delta}`` to ``Tenant.balance``; tenant pages show it, so ``updated_at`` moves too."""
+    counters.adjust(Tenant, 'balance', deltas, updated_at=timezone.now())
+
+
+def refresh_due_dates(tenant_ids):
+    """
+    Point ``rent_due_date`` at the oldest charge each tenant's balance does
+    not cover, or one billing period past their latest charge when the
+    balance is settled. Tenants without charges are left alone.
+    """
+    tenant_ids = set(tenant_ids)
+    if not tenant_ids:
+        return
+    balances = dict(Tenant.objects.filter(pk__in=tenant_ids).values_list('pk', 'balance'))
+    charges = TenantLedgerEntry.objects.filter(entry_type='charge', due_date__isnull=False)
+
+    due_dates = {}
+    latest = charges.filter(tenant=OuterRef('pk')).order_by('-due_date', '-id')
+    rows = (
+        Tenant.objects.filter(pk__in=balances)
+        .annotate(
+            last_due=Subquery(latest.values('due_date')[:1]),
+            last_amount=Subquery(latest.values('amount')[:1]),
+            frequency=Subquery(latest.values('lease__payment_frequency')[:1]),
+        )
+        .filter(last_due__isnull=False)
+        .values_list('pk', 'last_due', 'last_amount', 'frequency')
+    )
+    owing_more = []
+    for pk, last_due, last_amount, frequency in rows:
+        balance = balances[pk]
+        if balance <= 0:
+            due_dates[pk] = next_due_date(last_due, frequency)
+        elif balance <= last_amount:
+            # Only the latest charge is (partly) unpaid: the common case.
+            due_dates[pk] = last_due
+        else:
+            owing_more.append(pk)
+
+    for pk in owing_more:
+        # Walk back from the newest charge until the charges cover the
+        # balance.
+        remaining = balances[pk]
+        for amount, day in charges.filter(tenant_id=pk).order_by('-due_date', '-id').values_list('amount', 'due_date').iterator(chunk_size=20):
+            due_dates[pk] = day
+            remaining -= amount
+            if remaining <= 0:
+                break
+
+    by_date = defaultdict(list)
+    for pk, day in due_dates.items():
+        by_date[day].append(pk)
+    for day, pks in by_date.items():
+        Tenant.objects.filter(pk__in=pks).update(rent_due_date=day, updated_at=timezone.now())
+
+
+def _post(entries, deltas):
+    with transaction.atomic():
+        TenantLedgerEntry.objects.bulk_create(entries)
+        _adjust_balances(deltas)
+        refresh_due_dates(deltas)
+    return entries
+
+
+def post_charges(entries):
+    """
+    Post unsaved charge ``TenantLedgerEntry`` objects (each with a
+    ``due_date``) and add them to their tenants' balances.
+    """
+    deltas = defaultdict(lambda: ZERO)
+    for entry in entries:
+        entry.entry_type = 'charge'
+        deltas[entry.tenant_id] += entry.amount
+    return _post(entries, deltas)
+
+
+def post_charge(tenant_id, amount, due_date, lease_id=None, description=''):
+    entry = TenantLedgerEntry(
+        tenant_id=tenant_id, lease_id=lease_id, amount=amount, due_date=due_date, description=description,
+    )
+    return post_charges([entry])[0]
+
+
+def post_adjustment(tenant_id, amount, description=''):
+    """Post a signed manual correction (positive increases what is owed)."""
+    entry = TenantLedgerEntry(tenant_id=tenant_id, entry_type='adjustment', amount=amount, description=description)
+    return _post([entry], {tenant_id: amount})[0]
+
+
+def post_payments(payments):
+    """Credit saved ``Payment`` objects that have no ledger entry yet."""
+    deltas = defaultdict(lambda: ZERO)
+    for payment in payments:
+        deltas[payment.tenant_id] -= payment.amount
+    return _post([_payment_entry(payment) for payment in payments], deltas)
+
+
+def repost_payment(payment, previous):
+    """
+    Bring a saved payment's entry up to date. ``previous`` is the
+    ``(tenant_id, amount)`` stored before the save, or None for a new payment.
+    """
+    if previous is None:
+        return post_payments([payment])
+    deltas = defaultdict(lambda: ZERO)
+    deltas[previous[0]] += previous[1]
+    deltas[payment.tenant_id] -= payment.amount
+    fresh = _payment_entry(payment)
+    with transaction.atomic():
+        updated = TenantLedgerEntry.objects.filter(payment=payment).update(
+            tenant_id=fresh.tenant_id, lease_id=fresh.lease_id, amount=fresh.amount,
+            posted_at=fresh.posted_at, description=fresh.description,
+        )
+        if not updated:
+            fresh.save()
+        _adjust_balances(deltas)
+        refresh_due_dates(deltas)
+
+
+def unpost_entry(tenant_id, amount):
+    """Take a deleted entry's amount back off its tenant's balance."""
+    with transaction.atomic():
+        _adjust_balances({tenant_id: -amount})
+        refresh_due_dates([tenant_id])
+
+
+# Reconciliation
+
+def balance_drift(tenant_ids):
+    """
+    Return ``[(tenant_id, stored_balance, ledger_balance)]`` for the tenants
+    in ``tenant_ids`` whose stored balance differs from their entries.
+    """
+    ledger = dict(
+        TenantLedgerEntry.objects.filter(tenant_id__in=tenant_ids)
+        .values('tenant_id').annotate(total=Sum('amount')).order_by()
+        .values_list('tenant_id', 'total')
+    )
+    return counters.drift(Tenant, 'balance', tenant_ids, ledger, zero=ZERO)
+
+
+def fix_drift(drift):
+    """Reset drifted balances to their ledger totals and refresh due dates."""
+    with transaction.atomic():
+        _adjust_balances({pk: ledger - stored for pk, stored, ledger in drift})
+        refresh_due_dates(pk for pk, _, _ in drift)
@@ -0,0 +1,416 @@
+"""
+In-process view benchmarks.
+
+``benchmark_urls`` times every URL in ``pms.urls`` and counts its queries,
+for ``manage.py benchmark_views``. That command runs it against seeded
+portfolios of several sizes and writes a JSON report. ``compare_reports``
+lists the regressions between two such reports.
+
+``sqlite_contention`` runs concurrent writers and readers against the
+database, for ``manage.py benchmark_sqlite``.
+
+``compare`` measures the WSGI and ASGI request paths under concurrent load,
+for ``manage.py benchmark_handlers``. Requests are fed straight into Django's ``WSGIHandler`` (from a pool of
+``concurrency`` threads, as a threaded WSGI server would) and
+``ASGIHandler`` (as ``concurrency`` asyncio tasks on one event loop, as
+uvicorn would), with no server or network in between. WSGI serves the sync
+views and ASGI the async ones from ``pms.urls.ASYNC_VIEWS``. Run it against
+the database the comparison is about: on SQLite every query is serialized,
+so only a client/server backend such as Postgres shows what overlapping
+queries buy.
+"""
+import asyncio
+import io
+import random
+import statistics
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import timedelta
+from decimal import Decimal
+from types import ModuleType
+
+import django
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+from django.db import OperationalError, connection, connections, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import urls as pms_urls
+from .exports import EXPORTS
+from .instrumentation import query_budget
+from .kpis import compute_dashboard_kpis
+from .models import Property, Unit, Tenant, Payment, Visitor
+
+HOST = 'localhost'
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    'fragments': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+@dataclass
+class LatencyStats:
+    handler: str
+    path: str
+    requests: int
+    concurrency: int
+    errors: int
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    throughput: float
+
+    @classmethod
+    def from_samples(cls, handler, path, concurrency, samples, errors, elapsed):
+        ordered = sorted(samples)
+
+        def percentile(q):
+            return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+        return cls(
+            handler=handler, path=path, requests=len(ordered), concurrency=concurrency, errors=errors,
+            mean_ms=sum(ordered) / len(ordered) * 1000,
+            p50_ms=percentile(0.50), p95_ms=percentile(0.95), p99_ms=percentile(0.99),
+            throughput=len(ordered) / elapsed,
+        )
+
+
+def _split(path):
+    path, _, query = path.partition('?')
+    return path, query
+
+
+def wsgi_latencies(path, requests, concurrency):
+    """Return the latency (seconds) of each of ``requests`` GETs and the error count."""
+    application = get_wsgi_application()
+    path_info, query = _split(path)
+
+    def one(_):
+        statuses = []
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path_info, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+            'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': HOST,
+            'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+        }
+        started = time.perf_counter()
+        response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        try:
+            for _chunk in response:
+                pass
+        finally:
+            response.close()
+        return time.perf_counter() - started, not statuses[0].startswith('2')
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    return [elapsed for elapsed, _ in results], sum(failed for _, failed in results)
+
+
+def asgi_latencies(path, requests, concurrency):
+    """ASGI counterpart of ``wsgi_latencies``."""
+    application = get_asgi_application()
+    path_info, query = _split(path)
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path_info, 'raw_path': path_info.encode(), 'query_string': query.encode(), 'root_path': '',
+        'headers': [(b'host', HOST.encode())], 'client': ('127.0.0.1', 0), 'server': (HOST, 80),
+    }
+
+    async def one(slots):
+        messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+        statuses = []
+
+        async def receive():
+            return messages.pop() if messages else {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+
+        async with slots:
+            started = time.perf_counter()
+            await application(dict(scope), receive, send)
+            return time.perf_counter() - started, not 200 <= statuses[0] < 300
+
+    async def run():
+        slots = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*(one(slots) for _ in range(requests)))
+
+    results = asyncio.run(run())
+    return [elapsed for elapsed, _ in results], sum(failed for _, failed in results)
+
+
+def _urlconf(views_map):
+    # The project URLconf minus admin, with the pms views swapped as needed.
+    urlconf = ModuleType('pms_benchmark_urls')
+    urlconf.urlpatterns = pms_urls.swap_views(pms_urls.urlpatterns, views_map)
+    return urlconf
+
+
+def compare(paths, requests=200, concurrency=20, use_cache=False):
+    """
+    Benchmark each of ``paths`` under WSGI (sync views) and ASGI (async
+    views). Returns a list of ``LatencyStats``. The dashboard KPI cache is
+    bypassed unless ``use_cache`` is set, so the queries are measured.
+    """
+    sync_views = {async_view: view for view, async_view in pms_urls.ASYNC_VIEWS.items()}
+    runs = [
+        ('wsgi', wsgi_latencies, _urlconf(sync_views)),
+        ('asgi', asgi_latencies, _urlconf(pms_urls.ASYNC_VIEWS)),
+    ]
+    overrides = {} if use_cache else {'CACHES': NO_CACHE}
+    stats = []
+    for path in paths:
+        for name, run, urlconf in runs:
+            with override_settings(ROOT_URLCONF=urlconf, **overrides):
+                # One untimed request warms the URL resolver and templates.
+                run(path, 1, 1)
+                started = time.perf_counter()
+                samples, errors = run(path, requests, concurrency)
+                elapsed = time.perf_counter() - started
+            stats.append(LatencyStats.from_samples(name, path, concurrency, samples, errors, elapsed))
+    return stats
+
+
+# URL benchmark suite
+
+# Slower than the baseline by this factor (and by more than the noise
+# floor) counts as a regression, as does any extra query.
+SLOWDOWN = 1.5
+NOISE_MS = 5.0
+BENCHMARK_USER = 'benchmark'
+# Long-lived responses (pms.events) rather than pages to time.
+EVENT_STREAMS = {'dashboard_events'}
+
+
+@dataclass
+class UrlTiming:
+    name: str
+    path: str
+    status: int
+    queries: int
+    budget: int
+    min_ms: float
+    median_ms: float
+    max_ms: float
+    bytes: int
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def _url_kwargs():
+    """Sample keyword arguments for the URLs that take some, by URL name."""
+    property_pk = Property.objects.order_by('pk').values_list('pk', flat=True).first()
+    return {
+        'property_detail': [{'pk': property_pk}],
+        'unit_create': [{'property_pk': property_pk}],
+        'export_data': [{'dataset': dataset} for dataset in EXPORTS],
+    }
+
+
+def _url_queries():
+    # Bound the exports to the last month, like a typical download, and
+    # search for a prefix shared by many seeded names.
+    return {'export_data': f'start={timezone.localdate() - timedelta(days=30)}', 'search': 'q=kel'}
+
+
+def benchmark_paths():
+    """
+    Return ``(name, path)`` for every GET-able URL in ``pms.urls`` but the
+    event streams, and the names of URLs skipped for lack of sample
+    arguments.
+    """
+    kwargs, queries = _url_kwargs(), _url_queries()
+    paths, skipped = [], []
+    for pattern in pms_urls.urlpatterns:
+        if pattern.name in EVENT_STREAMS:
+            continue
+        if not pattern.pattern.converters:
+            samples = [{}]
+        elif kwargs.get(pattern.name) and None not in kwargs[pattern.name][0].values():
+            samples = kwargs[pattern.name]
+        else:
+            skipped.append(pattern.name)
+            continue
+        for sample in samples:
+            path = reverse(pattern.name, kwargs=sample)
+            if pattern.name in queries:
+                path = f'{path}?{queries[pattern.name]}'
+            paths.append((pattern.name, path))
+    return paths, skipped
+
+
+def _benchmark_client():
+    user, _ = User.objects.get_or_create(
+        username=BENCHMARK_USER, defaults={'is_staff': True, 'is_superuser': True},
+    )
+    # Failing views are reported with their status rather than aborting the run.
+    client = Client(raise_request_exception=False)
+    client.force_login(user)
+    return client
+
+
+def _get(client, path):
+    response = client.get(path)
+    if response.streaming:
+        size = sum(len(chunk) for chunk in response.streaming_content)
+    else:
+        size = len(response.content)
+    return response, size
+
+
+def benchmark_urls(repeat=5, use_cache=False):
+    """
+    GET every URL in ``pms.urls`` ``repeat`` times as a superuser and
+    return ``(timings, skipped)``. ``timings`` is a list of ``UrlTiming``;
+    its query count is taken from the last run. The dashboard KPI cache is
+    bypassed unless ``use_cache`` is set.
+    """
+    overrides = {} if use_cache else {'CACHES': NO_CACHE}
+    with override_settings(**overrides):
+        client = _benchmark_client()
+        paths, skipped = benchmark_paths()
+        timings = []
+        for name, path in paths:
+            _get(client, path)
+            samples = []
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    response, size = _get(client, path)
+                    samples.append((time.perf_counter() - started) * 1000)
+            timings.append(UrlTiming(
+                name=name, path=path, status=response.status_code, queries=len(queries),
+                budget=query_budget(name), min_ms=round(min(samples), 2),
+                median_ms=round(statistics.median(samples), 2), max_ms=round(max(samples), 2), bytes=size,
+            ))
+    return timings, skipped
+
+
+def report_header(repeat):
+    return {
+        'generated_at': timezone.now().isoformat(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'repeat': repeat,
+        'runs': [],
+    }
+
+
+def compare_reports(baseline, current, slowdown=SLOWDOWN, noise_ms=NOISE_MS):
+    """
+    List the regressions of ``current`` against ``baseline`` (both report
+    dicts): URLs that run more queries, respond with a different status, or
+    whose median time grew by more than ``slowdown`` times and ``noise_ms``.
+    Runs are matched by scale and URLs by path.
+    """
+    previous = {
+        (run['scale'], row['path']): row
+        for run in baseline['runs'] for row in run['results']
+    }
+    regressions = []
+    for run in current['runs']:
+        for row in run['results']:
+            old = previous.get((run['scale'], row['path']))
+            if old is None:
+                continue
+            label = f"scale {run['scale']} {row['path']}"
+            if row['status'] != old['status']:
+                regressions.append(f"{label}: status {old['status']} -> {row['status']}")
+            if row['queries'] > old['queries']:
+                regressions.append(f"{label}: {old['queries']} -> {row['queries']} queries")
+            if row['median_ms'] > old['median_ms'] * slowdown and row['median_ms'] - old['median_ms'] > noise_ms:
+                regressions.append(f"{label}: median {old['median_ms']}ms -> {row['median_ms']}ms")
+    return regressions
+
+
+# Concurrent reads and writes
+
+@dataclass
+class ContentionStats:
+    label: str
+    seconds: float
+    writers: int
+    readers: int
+    writes: int
+    reads: int
+    locked: int
+
+    @property
+    def writes_per_second(self):
+        return self.writes / self.seconds
+
+    @property
+    def reads_per_second(self):
+        return self.reads / self.seconds
+
+
+def sqlite_contention(label, seconds=10, writers=4, readers=8):
+    """
+    For ``seconds``, run ``writers`` threads and ``readers`` threads
+    against the default database. Each writer transaction records a guard
+    check-in and a payment. Each read computes the dashboard KPIs and
+    fetches the first visitor page. "database is locked" errors are counted
+    and the operation is retried.
+    Every thread opens its own connection, so the connection hooks of the
+    current settings apply.
+    """
+    unit_ids = list(Unit.objects.values_list('pk', flat=True)[:1000])
+    tenant_ids = list(Tenant.objects.values_list('pk', flat=True)[:1000])
+    tag = uuid.uuid4().hex[:6]
+    connections.close_all()
+    deadline = time.monotonic() + seconds
+
+    def run(operation):
+        done = locked = 0
+        try:
+            while time.monotonic() < deadline:
+                try:
+                    operation(done)
+                    done += 1
+                except OperationalError as exc:
+                    if 'locked' not in str(exc):
+                        raise
+                    locked += 1
+        finally:
+            connection.close()
+        return done, locked
+
+    def writer(n):
+        rng = random.Random(n)
+
+        def write(done):
+            with transaction.atomic():
+                Visitor.objects.create(name='Benchmark guest', phone='0700000000', unit_visiting_id=rng.choice(unit_ids))
+                Payment.objects.create(
+                    tenant_id=rng.choice(tenant_ids), amount=Decimal('100'), method='cash',
+                    receipt_number=f'{tag}-{n}-{done}',
+                )
+        return run(write)
+
+    def reader(n):
+        def read(done):
+            compute_dashboard_kpis()
+            list(Visitor.objects.order_by('-entry_time', '-id')[:50])
+        return run(read)
+
+    with ThreadPoolExecutor(max_workers=writers + readers) as pool:
+        write_results = [pool.submit(writer, n) for n in range(writers)]
+        read_results = [pool.submit(reader, n) for n in range(readers)]
+        write_results = [future.result() for future in write_results]
+        read_results = [future.result() for future in read_results]
+    return ContentionStats(
+        label=label, seconds=seconds, writers=writers, readers=readers,
+        writes=sum(done for done, _ in write_results), reads=sum(done for done, _ in read_results),
+        locked=sum(locked for _, locked in write_results + read_results),
+    )
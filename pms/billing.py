@@ -0,0 +1,166 @@
+"""
+Rent invoicing: bill every billable lease for the period containing a date.
+
+Leases are walked in primary-key order, one keyset chunk per transaction.
+Each chunk's invoices are inserted with ``bulk_create(ignore_conflicts=True)``
+against the unique (lease, period_start) constraint, so a run can be
+repeated or resumed without double billing. Invoices without a ledger entry
+are then charged to their tenants through ``pms.balances``.
+
+``run_billing`` can split the properties across worker processes. Each
+worker bills a disjoint set of leases, so they never contend for the same
+rows. SQLite allows only one writer at a time, so on SQLite the run
+always uses a single process.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from . import balances, caching, events
+from .models import Lease, Property, RentInvoice, TenantLedgerEntry
+
+CHUNK_SIZE = 1000
+CENT = Decimal('0.01')
+
+
+@dataclass
+class BillingResult:
+    leases: int = 0
+    invoices: int = 0
+
+    def __add__(self, other):
+        return BillingResult(self.leases + other.leases, self.invoices + other.invoices)
+
+
+def billing_period(start_date, frequency, as_of):
+    """
+    Return ``(period_start, period_end)`` of the billing period containing
+    ``as_of`` for a lease starting on ``start_date``, or None before the
+    lease starts. Periods are anchored on the start date and computed from
+    it directly, so month-end anchors do not drift (Jan 31, Feb 29, Mar 31 rather
+    than Jan 31, Feb 29, Mar 29).
+    """
+    if as_of < start_date:
+        return None
+    months, days = balances.frequency_step(frequency)
+    if months:
+        steps = ((as_of.year - start_date.year) * 12 + as_of.month - start_date.month) // months
+        period_start = balances.add_months(start_date, steps * months)
+        if period_start > as_of:
+            steps -= 1
+            period_start = balances.add_months(start_date, steps * months)
+        next_start = balances.add_months(start_date, (steps + 1) * months)
+    else:
+        steps = (as_of - start_date).days // days
+        period_start = start_date + timedelta(days=steps * days)
+        next_start = period_start + timedelta(days=days)
+    return period_start, next_start - timedelta(days=1)
+
+
+def billing_amount(monthly_rent, frequency):
+    """Rent for one billing period of ``frequency``."""
+    months, days = balances.frequency_step(frequency)
+    if months:
+        return monthly_rent * months
+    return (monthly_rent * 12 * days / 365).quantize(CENT)
+
+
+def _bill_chunk(rows, as_of):
+    invoices = []
+    for lease_id, tenant_id, start_date, end_date, monthly_rent, frequency in rows:
+        period = billing_period(start_date, frequency, as_of)
+        if period is None or period[0] > end_date:
+            continue
+        invoices.append(RentInvoice(
+            lease_id=lease_id, tenant_id=tenant_id, period_start=period[0], period_end=period[1],
+            due_date=period[0], amount=billing_amount(monthly_rent, frequency),
+        ))
+
+    with transaction.atomic():
+        RentInvoice.objects.bulk_create(invoices, ignore_conflicts=True)
+        # ignore_conflicts leaves primary keys unset, so read back the
+        # invoices this chunk still has to charge.
+        unposted = RentInvoice.objects.filter(
+            lease_id__in=[invoice.lease_id for invoice in invoices],
+            period_start__in={invoice.period_start for invoice in invoices},
+            ledger_entry__isnull=True,
+        ).values_list('pk', 'lease_id', 'tenant_id', 'amount', 'due_date')
+        charges = [
+            TenantLedgerEntry(
+                tenant_id=tenant_id, lease_id=lease_id, invoice_id=pk, amount=amount, due_date=due_date,
+                description=f'Rent {due_date:%b %Y}',
+            )
+            for pk, lease_id, tenant_id, amount, due_date in unposted
+        ]
+        balances.post_charges(charges)
+    return len(charges)
+
+
+def bill_leases(as_of=None, property_ids=None, chunk_size=CHUNK_SIZE):
+    """
+    Invoice every billable lease (optionally only those on ``property_ids``)
+    for the billing period containing ``as_of`` (default: today).
+    Returns a ``BillingResult``.
+    """
+    as_of = as_of or timezone.localdate()
+    leases = Lease.objects.filter(status__in=Lease.OPEN_STATUSES, start_date__lte=as_of)
+    if property_ids is not None:
+        leases = leases.filter(unit__property_id__in=property_ids)
+    columns = ('pk', 'tenant_id', 'start_date', 'end_date', 'monthly_rent', 'payment_frequency')
+
+    result = BillingResult()
+    last_pk = 0
+    while True:
+        rows = list(leases.filter(pk__gt=last_pk).order_by('pk').values_list(*columns)[:chunk_size])
+        if not rows:
+            break
+        last_pk = rows[-1][0]
+        result += BillingResult(leases=len(rows), invoices=_bill_chunk(rows, as_of))
+    if result.invoices:
+        # Balances moved through update(), which sends no signals.
+        caching.invalidate_all_dashboards()
+        events.publish(['tenants'])
+    return result
+
+
+def _bill_properties(args):
+    as_of, property_ids, chunk_size = args
+    try:
+        return bill_leases(as_of, property_ids, chunk_size)
+    finally:
+        connections.close_all()
+
+
+def run_billing(as_of=None, property_ids=None, workers=1, chunk_size=CHUNK_SIZE):
+    """
+    Bill leases like ``bill_leases``, spreading the properties over
+    ``workers`` processes when more than one is requested and the database
+    accepts concurrent writers.
+    """
+    as_of = as_of or timezone.localdate()
+    if workers <= 1 or connection.vendor == 'sqlite':
+        return bill_leases(as_of, property_ids, chunk_size)
+
+    if property_ids is None:
+        property_ids = list(Property.objects.order_by('pk').values_list('pk', flat=True))
+    # Several groups per worker so a few large properties don't leave the
+    # other workers idle.
+    groups = [property_ids[i::workers * 4] for i in range(workers * 4)]
+    tasks = [(as_of, group, chunk_size) for group in groups if group]
+
+    # Forked workers must open their own database connections.
+    connections.close_all()
+    context = multiprocessing.get_context('fork')
+    result = BillingResult()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        for partial in pool.map(_bill_properties, tasks):
+            result += partial
+    if result.invoices:
+        caching.invalidate_all_dashboards()
+        events.publish(['tenants'])
+    return result
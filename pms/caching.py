@@ -0,0 +1,135 @@
+"""
+Owner-scoped cache for the dashboard KPIs and financial trend series.
+
+Entries are keyed per owner and per period (the local date the KPIs were
+computed for, or the requested date range of a series) and stored in
+Django's default cache, so locmem works in development and a shared
+backend (Redis, Memcached) works across workers in production.
+
+Invalidation is generational: every key embeds the generation counter of
+its owner (or of the unscoped, portfolio-wide dashboard) plus a global
+epoch. The model signals in ``pms.signals`` bump the counters of the
+owners a write affects, which orphans their cached entries without having
+to know every period that was cached.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .kpis import acompute_dashboard_kpis, compute_dashboard_kpis
+from .timeseries import financial_series
+
+DASHBOARD_CACHE_TIMEOUT = getattr(settings, 'PMS_DASHBOARD_CACHE_TIMEOUT', 300)
+
+KEY_PREFIX = 'pms:dashboard'
+ALL_OWNERS = 'all'
+EPOCH = 'epoch'
+HITS_KEY = f'{KEY_PREFIX}:stats:hits'
+MISSES_KEY = f'{KEY_PREFIX}:stats:misses'
+
+
+def _owner_label(owner_id):
+    return ALL_OWNERS if owner_id is None else str(owner_id)
+
+
+def _generation_key(label):
+    return f'{KEY_PREFIX}:generation:{label}'
+
+
+def _incr(key):
+    # incr() raises on a missing key; add() is a no-op if a racing worker
+    # created it first.
+    cache.add(key, 0, None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+        return 1
+
+
+def versioned_key(kind, owner_id, *parts):
+    labels = [EPOCH, _owner_label(owner_id)]
+    generations = cache.get_many([_generation_key(label) for label in labels])
+    versions = '.'.join(str(generations.get(_generation_key(label), 0)) for label in labels)
+    suffix = ':'.join(str(part) for part in parts)
+    return f'{KEY_PREFIX}:{kind}:{_owner_label(owner_id)}:{suffix}:{versions}'
+
+
+def dashboard_cache_key(owner_id, period):
+    return versioned_key('kpis', owner_id, period)
+
+
+def invalidate_dashboard(owner_ids=()):
+    """
+    Invalidate cached dashboards for ``owner_ids`` and the portfolio-wide
+    dashboard. Pass ``None`` as an owner id for properties without an owner.
+    """
+    for owner_id in set(owner_ids):
+        if owner_id is not None:
+            _incr(_generation_key(owner_id))
+    # The unscoped dashboard covers every owner's properties.
+    _incr(_generation_key(ALL_OWNERS))
+
+
+def invalidate_all_dashboards():
+    """Invalidate every owner's cached dashboard."""
+    _incr(_generation_key(EPOCH))
+
+
+def get_dashboard_kpis(owner=None, now=None):
+    """Return the cached ``DashboardKPIs`` for ``owner``, computing on a miss."""
+    now = timezone.localtime(now or timezone.now())
+    key = dashboard_cache_key(getattr(owner, 'pk', None), now.date().isoformat())
+    kpis = cache.get(key)
+    if kpis is not None:
+        _incr(HITS_KEY)
+        return kpis
+    _incr(MISSES_KEY)
+    kpis = compute_dashboard_kpis(now=now, owner=owner)
+    cache.set(key, kpis, DASHBOARD_CACHE_TIMEOUT)
+    return kpis
+
+
+async def aget_dashboard_kpis(owner=None, now=None):
+    """Async ``get_dashboard_kpis`` for the ASGI dashboard."""
+    now = timezone.localtime(now or timezone.now())
+    key = await sync_to_async(dashboard_cache_key)(getattr(owner, 'pk', None), now.date().isoformat())
+    kpis = await cache.aget(key)
+    if kpis is not None:
+        await sync_to_async(_incr)(HITS_KEY)
+        return kpis
+    await sync_to_async(_incr)(MISSES_KEY)
+    kpis = await acompute_dashboard_kpis(now=now, owner=owner)
+    await cache.aset(key, kpis, DASHBOARD_CACHE_TIMEOUT)
+    return kpis
+
+
+def get_financial_series(start, end, bucket='day', property_id=None, owner=None):
+    """Return the cached ``financial_series`` as a list of plain dicts."""
+    key = versioned_key('trend', getattr(owner, 'pk', None), start.isoformat(), end.isoformat(), bucket, property_id)
+    series = cache.get(key)
+    if series is not None:
+        _incr(HITS_KEY)
+        return series
+    _incr(MISSES_KEY)
+    series = [point.as_dict() for point in financial_series(start, end, bucket, property_id, owner)]
+    cache.set(key, series, DASHBOARD_CACHE_TIMEOUT)
+    return series
+
+
+def dashboard_cache_stats():
+    """Return the hit/miss counters shared by every worker using this cache."""
+    counters = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = counters.get(HITS_KEY, 0)
+    misses = counters.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total * 100, 1) if total else 0.0,
+    }
+
+
+def reset_dashboard_cache_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
@@ -0,0 +1,89 @@
+"""
+Conditional GET for pages that are refreshed far more often than they change.
+
+``conditional_page(validator)`` wraps a view. The validator returns a
+version of the data behind the page, built from a few cheap queries (row
+counts and the newest ``updated_at`` of each table the page shows), or
+None to skip validation. The version becomes the page's ``ETag``. A
+client whose copy is current gets 304 Not Modified before the view runs
+its queries or renders.
+
+Counts catch deletions, which leave no newer ``updated_at`` behind. For
+that reason no ``Last-Modified`` is sent: a client revalidating with
+``If-Modified-Since`` alone would get 304 for a list a row was deleted
+from.
+``QuerySet.update()`` skips ``auto_now``, so the bulk updates of the models
+involved set ``updated_at`` themselves.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.db.models import Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+
+def table_version(queryset, *related_models):
+    """
+    Version of a list over ``queryset`` whose rows also show fields of
+    ``related_models``: the row count, then the newest ``updated_at`` of
+    each table. These are separate queries because SQLite answers a bare
+    ``COUNT(*)``, or ``MAX()`` of an indexed column, without a scan, but
+    not both in one query.
+    """
+    version = [queryset.count()]
+    for rows in (queryset, *(model.objects.all() for model in related_models)):
+        version.append(rows.aggregate(changed=Max('updated_at'))['changed'])
+    return version
+
+
+def _etag(request, validator, args, kwargs):
+    """The ``ETag`` for the request, or None."""
+    version = validator(request, *args, **kwargs)
+    if version is None:
+        return None
+    # The pages show the signed-in user's name.
+    user = getattr(request, 'user', None)
+    digest = hashlib.md5(repr([getattr(user, 'pk', None), *version]).encode()).hexdigest()
+    return quote_etag(digest)
+
+
+def _finish(request, response, etag):
+    if etag is None or response.status_code not in (200, 304):
+        return response
+    response.headers.setdefault('ETag', etag)
+    # The page is per user and must be revalidated on every refresh rather
+    # than reused from the browser's heuristic freshness.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def conditional_page(validator):
+    """
+    Serve GET and HEAD requests of the decorated view (sync or async)
+    conditionally, versioned by ``validator(request, *args, **kwargs)``.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def _view(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+                etag = await sync_to_async(_etag)(request, validator, args, kwargs)
+                response = get_conditional_response(request, etag=etag)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return _finish(request, response, etag)
+        else:
+            @wraps(view)
+            def _view(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return view(request, *args, **kwargs)
+                etag = _etag(request, validator, args, kwargs)
+                response = get_conditional_response(request, etag=etag)
+                if response is None:
+                    response = view(request, *args, **kwargs)
+                return _finish(request, response, etag)
+        return _view
+    return decorator
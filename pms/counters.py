@@ -0,0 +1,91 @@
+"""
+Denormalised counters kept with ``F()`` updates: ``Tenant.balance``
+(``pms.balances``) and ``Property.visitors_inside`` (``pms.gate``).
+
+Each is adjusted in the same transaction as the rows it sums, so
+concurrent writes never lose an update. ``ReconcileCommand`` is the base of
+the ``manage.py reconcile_*`` commands that check a counter against its
+rows and optionally reset the ones that drifted.
+"""
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+
+def adjust(model, field, deltas, **changes):
+    """
+    Apply ``{pk: delta}`` to ``model.field``, one UPDATE per distinct
+    delta (deltas repeat, so a batch needs only a few). ``changes`` are
+    set on the updated rows as well.
+    """
+    pks_by_delta = defaultdict(list)
+    for pk, delta in deltas.items():
+        if delta and pk is not None:
+            pks_by_delta[delta].append(pk)
+    for delta, pks in pks_by_delta.items():
+        model.objects.filter(pk__in=pks).update(**{field: F(field) + delta}, **changes)
+
+
+def drift(model, field, pks, actual, zero=0):
+    """
+    Return ``[(pk, stored, actual)]`` for the rows of ``pks`` whose
+    ``field`` differs from ``actual`` (``{pk: value}``, ``zero`` if absent).
+    """
+    return [
+        (pk, stored, actual.get(pk, zero))
+        for pk, stored in model.objects.filter(pk__in=pks).order_by('pk').values_list('pk', field)
+        if stored != actual.get(pk, zero)
+    ]
+
+
+class ReconcileCommand(BaseCommand):
+    """
+    Check a counter of ``model`` a chunk of rows at a time: ``find_drift``
+    lists the drifted rows of a chunk and ``fix_drift`` resets them.
+    """
+    model = None
+    default_chunk_size = 1000
+    # The rows checked ('tenants'), the --fix help and the summary after a fix.
+    noun = ''
+    fix_help = ''
+    fixed = ''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=self.default_chunk_size, help=f'{self.noun.capitalize()} checked per pass.')
+        parser.add_argument('--fix', action='store_true', help=self.fix_help)
+
+    def find_drift(self, pks):
+        raise NotImplementedError
+
+    def fix_drift(self, drift):
+        raise NotImplementedError
+
+    def describe(self, pk, stored, actual):
+        raise NotImplementedError
+
+    def handle(self, *args, chunk_size, fix, **options):
+        checked = drifted = 0
+        last_pk = 0
+        while True:
+            chunk = list(
+                self.model.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:chunk_size]
+            )
+            if not chunk:
+                break
+            last_pk = chunk[-1]
+            rows = self.find_drift(chunk)
+            for row in rows:
+                self.stdout.write(self.describe(*row))
+            if rows and fix:
+                self.fix_drift(rows)
+            checked += len(chunk)
+            drifted += len(rows)
+
+        summary = f'Checked {checked} {self.noun}; {drifted} drifted.'
+        if drifted and fix:
+            self.stdout.write(self.style.SUCCESS(f'{summary} {self.fixed}'))
+        elif drifted:
+            self.stdout.write(self.style.WARNING(f'{summary} Re-run with --fix to reset them.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,292 @@
+"""
+Live dashboard updates over server-sent events.
+
+Writes publish small "these KPIs may have moved, for these owners" events,
+and ``views.adashboard_events`` streams the refreshed figures to the open
+dashboards:
+
+* ``publish(groups, owner_ids)`` runs once a write has committed, next to
+  the dashboard cache invalidation (``pms.signals``, ``pms.gate``, the
+  billing, lease sweep and statement import jobs). ``groups`` names the
+  queries of ``pms.kpis`` that the write can change (``GROUPS_BY_MODEL``).
+  ``owner_ids`` names the owners whose dashboards show it; ``None`` means
+  every dashboard.
+* The backend carries events to every worker. ``LocalBackend`` stays
+  within the process (runserver, a single ASGI worker). ``RedisBackend``
+  uses Redis pub/sub across workers and hosts. ``PMS_EVENTS_BACKEND``
+  picks one.
+* In each worker, one ``Hub`` listens to the backend for all of its
+  streams. It gathers ``PMS_EVENTS_INTERVAL`` seconds of events, then
+  recomputes each changed group once for each dashboard scope that has
+  viewers: the portfolio-wide dashboard and each owner's. It never
+  recomputes once per open page, and never the whole KPI set. Streams
+  receive only the fields of those groups.
+
+Django 4.2 does not tell a streaming response that its client has gone.
+Each stream therefore ends after ``PMS_EVENTS_STREAM_SECONDS`` and the
+browser reconnects. On reconnecting it is sent the whole (cached) KPI set,
+to cover any events it missed in between.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+from .kpis import compute_kpi_fields
+from .models import Property, Unit, Tenant, Lease, Payment, Expense, MaintenanceTicket, Visitor
+
+logger = logging.getLogger(__name__)
+
+ALL_OWNERS = 'all'
+GROUPS_BY_MODEL = {
+    Payment: ('ledger', 'tenants'),
+    Expense: ('ledger',),
+    MaintenanceTicket: ('tickets',),
+    Visitor: ('visitors', 'properties'),
+    # Leases move unit status and, through billing, balances.
+    Lease: ('leases', 'units', 'tenants'),
+    Unit: ('units',),
+    Tenant: ('tenants',),
+    Property: ('properties', 'units'),
+}
+# Messages a slow stream may fall behind by before newer ones are dropped.
+STREAM_BACKLOG = 10
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class LocalBackend:
+    """Events within this process: runserver, or a single ASGI worker."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._listeners = set()
+
+    def publish(self, event):
+        # Writes run in sync threads, the listeners on event loops.
+        with self._lock:
+            listeners = list(self._listeners)
+        for loop, queue in listeners:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:  # the loop has closed
+                pass
+
+    async def listen(self):
+        listener = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._listeners.add(listener)
+        try:
+            while True:
+                yield await listener[1].get()
+        finally:
+            with self._lock:
+                self._listeners.discard(listener)
+
+
+class RedisBackend:
+    """
+    Events across workers and hosts over the Redis pub/sub channel
+    ``PMS_EVENTS_CHANNEL`` at ``PMS_EVENTS_REDIS_URL``. Needs the ``redis``
+    package.
+    """
+
+    def __init__(self):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured('RedisBackend needs the redis package: pip install redis')
+        self.url = _setting('PMS_EVENTS_REDIS_URL', 'redis://localhost:6379/0')
+        self.channel = _setting('PMS_EVENTS_CHANNEL', 'pms:events')
+        self._client = redis.Redis.from_url(self.url)
+
+    def publish(self, event):
+        self._client.publish(self.channel, json.dumps(event))
+
+    async def listen(self):
+        from redis import asyncio as aioredis
+
+        client = aioredis.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(self.channel)
+        try:
+            async for message in pubsub.listen():
+                if message['type'] == 'message':
+                    yield json.loads(message['data'])
+        finally:
+            await pubsub.unsubscribe(self.channel)
+            await pubsub.close()
+            await client.close()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = import_string(_setting('PMS_EVENTS_BACKEND', 'pms.events.LocalBackend'))()
+        return _backend
+
+
+def publish(groups, owner_ids=None):
+    """
+    Tell open dashboards that the KPI ``groups`` may have changed for
+    ``owner_ids`` (``None``: for everyone). Call it once the write has
+    committed. Failures are logged, never raised into the write.
+    """
+    event = {'groups': sorted(groups), 'owners': None if owner_ids is None else sorted(
+        {owner_id for owner_id in owner_ids if owner_id is not None}
+    )}
+    try:
+        get_backend().publish(event)
+    except Exception:
+        logger.exception('Could not publish dashboard event %s', event)
+
+
+def publish_model_change(model, owner_ids):
+    publish(GROUPS_BY_MODEL[model], owner_ids)
+
+
+def scope_of(owner):
+    return ALL_OWNERS if owner is None else str(owner.pk)
+
+
+class Hub:
+    """Fans one worker's events out to its dashboard streams."""
+
+    def __init__(self, backend, interval):
+        self.backend = backend
+        self.interval = interval
+        self.streams = defaultdict(set)
+        self.pending = defaultdict(set)
+        self._listener = None
+        self._flush = None
+
+    @asynccontextmanager
+    async def subscription(self, scope):
+        """A queue of JSON messages (``{field: value}``) for the dashboards of ``scope``."""
+        queue = asyncio.Queue(STREAM_BACKLOG)
+        self.streams[scope].add(queue)
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+        try:
+            yield queue
+        finally:
+            self.streams[scope].discard(queue)
+            if not self.streams[scope]:
+                del self.streams[scope]
+            if not self.streams:
+                self._stop()
+
+    def _stop(self):
+        for task in (self._listener, self._flush):
+            if task is not None:
+                task.cancel()
+        self._listener = self._flush = None
+        self.pending.clear()
+
+    async def _listen(self):
+        try:
+            await self._receive()
+        except Exception:
+            logger.exception('Dashboard event backend failed')
+        finally:
+            # Whether the backend failed or its connection closed, the next
+            # subscription starts a new listener.
+            if self._listener is asyncio.current_task():
+                self._listener = None
+
+    async def _receive(self):
+        async for event in self.backend.listen():
+            owners = event.get('owners')
+            scopes = list(self.streams) if owners is None else [ALL_OWNERS, *map(str, owners)]
+            for scope in scopes:
+                if scope in self.streams:
+                    self.pending[scope].update(event['groups'])
+            if self.pending and (self._flush is None or self._flush.done()):
+                self._flush = asyncio.create_task(self._send_later())
+
+    async def _send_later(self):
+        # Let a burst of writes (an import, a billing run) settle into one
+        # refresh per scope.
+        await asyncio.sleep(self.interval)
+        while self.pending:
+            pending, self.pending = self.pending, defaultdict(set)
+            # Events arriving while this batch computes land in the new
+            # pending and are sent by the next round of the loop.
+            await self._send(pending)
+
+    async def _send(self, pending):
+        for scope, groups in pending.items():
+            if scope not in self.streams:
+                continue
+            owner = None if scope == ALL_OWNERS else int(scope)
+            try:
+                fields = await sync_to_async(compute_kpi_fields)(groups, owner=owner)
+            except Exception:
+                logger.exception('Could not refresh dashboard KPIs %s for %s', sorted(groups), scope)
+                continue
+            message = json.dumps(fields, cls=DjangoJSONEncoder)
+            for queue in list(self.streams.get(scope, ())):
+                try:
+                    queue.put_nowait(message)
+                except asyncio.QueueFull:
+                    pass
+
+
+_hubs = {}
+
+
+def get_hub():
+    """This event loop's ``Hub``."""
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        for closed in [other for other in _hubs if other.is_closed()]:
+            del _hubs[closed]
+        hub = _hubs[loop] = Hub(get_backend(), _setting('PMS_EVENTS_INTERVAL', 1.0))
+    return hub
+
+
+def sse(data, event=None):
+    lines = [f'event: {event}'] if event else []
+    lines += [f'data: {line}' for line in data.splitlines()]
+    return '\n'.join(lines) + '\n\n'
+
+
+async def event_stream(scope, snapshot=None, lifetime=None, keepalive=None):
+    """
+    The ``text/event-stream`` body for a dashboard of ``scope``: a ``kpis``
+    event per refresh, comments to keep proxies from timing out, and an end
+    after ``lifetime`` seconds. ``snapshot`` (a coroutine function returning
+    every field) is sent first, for a reconnecting client.
+    """
+    lifetime = _setting('PMS_EVENTS_STREAM_SECONDS', 300) if lifetime is None else lifetime
+    keepalive = _setting('PMS_EVENTS_KEEPALIVE', 15) if keepalive is None else keepalive
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + lifetime
+    async with get_hub().subscription(scope) as queue:
+        # The id makes a reconnecting browser send Last-Event-ID.
+        yield f'retry: {_setting("PMS_EVENTS_RETRY_MS", 3000)}\nid: 0\n\n'
+        if snapshot is not None:
+            yield sse(json.dumps(await snapshot(), cls=DjangoJSONEncoder), event='kpis')
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                message = await asyncio.wait_for(queue.get(), min(keepalive, remaining))
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+            else:
+                yield sse(message, event='kpis')
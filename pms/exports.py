@@ -0,0 +1,253 @@
+"""
+Streaming CSV / XLSX exports.
+
+Rows are read with ``values_list(...).iterator(chunk_size=...)`` and
+written to the response as they arrive, so an export holds one chunk of
+rows in memory however large the table is. The XLSX writer builds the
+workbook as a zip stream, flushing compressed bytes every chunk instead
+of assembling the file in memory.
+"""
+import csv
+import io
+import re
+import zipfile
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+
+from .models import Lease, Payment, Expense, Visitor
+from .timeseries import datetime_range
+
+CHUNK_SIZE = 2000
+
+XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+@dataclass(frozen=True)
+class ExportSpec:
+    model: type
+    columns: tuple  # (header, lookup) pairs passed to values_list()
+    date_field: str
+    property_field: str
+    ordering: tuple
+
+
+EXPORTS = {
+    'payments': ExportSpec(
+        model=Payment,
+        columns=(
+            ('Receipt', 'receipt_number'),
+            ('Date', 'date'),
+            ('Tenant First Name', 'tenant__first_name'),
+            ('Tenant Last Name', 'tenant__last_name'),
+            ('Amount', 'amount'),
+            ('Method', 'method'),
+            ('Property', 'lease__unit__property__name'),
+            ('Unit', 'lease__unit__unit_number'),
+            ('Notes', 'notes'),
+        ),
+        date_field='date',
+        property_field='lease__unit__property_id',
+        ordering=('date', 'id'),
+    ),
+    'leases': ExportSpec(
+        model=Lease,
+        columns=(
+            ('Lease ID', 'id'),
+            ('Tenant First Name', 'tenant__first_name'),
+            ('Tenant Last Name', 'tenant__last_name'),
+            ('Property', 'unit__property__name'),
+            ('Unit', 'unit__unit_number'),
+            ('Start Date', 'start_date'),
+            ('End Date', 'end_date'),
+            ('Monthly Rent', 'monthly_rent'),
+            ('Deposit', 'deposit_amount'),
+            ('Payment Frequency', 'payment_frequency'),
+            ('Status', 'status'),
+        ),
+        date_field='start_date',
+        property_field='unit__property_id',
+        ordering=('end_date', 'id'),
+    ),
+    'expenses': ExportSpec(
+        model=Expense,
+        columns=(
+            ('Date', 'date'),
+            ('Property', 'property__name'),
+            ('Category', 'category'),
+            ('Amount', 'amount'),
+            ('Description', 'description'),
+        ),
+        date_field='date',
+        property_field='property_id',
+        ordering=('date', 'id'),
+    ),
+    'visitors': ExportSpec(
+        model=Visitor,
+        columns=(
+            ('Name', 'name'),
+            ('Phone', 'phone'),
+            ('ID Number', 'id_number'),
+            ('Property', 'unit_visiting__property__name'),
+            ('Unit', 'unit_visiting__unit_number'),
+            ('Vehicle Plate', 'vehicle_plate'),
+            ('Entry Time', 'entry_time'),
+            ('Exit Time', 'exit_time'),
+            ('Security Guard', 'security_guard_name'),
+        ),
+        date_field='entry_time',
+        property_field='unit_visiting__property_id',
+        ordering=('-entry_time', '-id'),
+    ),
+}
+
+
+def export_rows(spec, start=None, end=None, property_id=None, chunk_size=CHUNK_SIZE):
+    """Yield ``values_list`` tuples for ``spec`` filtered by date range and property."""
+    queryset = spec.model.objects.all()
+    # Compare DateTimeFields against aware day bounds rather than __date so
+    # the range stays sargable on the column's index.
+    is_datetime = spec.model._meta.get_field(spec.date_field).get_internal_type() == 'DateTimeField'
+    if start is not None:
+        since = datetime_range(start, start)[0] if is_datetime else start
+        queryset = queryset.filter(**{f'{spec.date_field}__gte': since})
+    if end is not None:
+        if is_datetime:
+            queryset = queryset.filter(**{f'{spec.date_field}__lt': datetime_range(end, end)[1]})
+        else:
+            queryset = queryset.filter(**{f'{spec.date_field}__lte': end})
+    if property_id is not None:
+        queryset = queryset.filter(**{spec.property_field: property_id})
+    lookups = [lookup for _, lookup in spec.columns]
+    return queryset.order_by(*spec.ordering).values_list(*lookups).iterator(chunk_size=chunk_size)
+
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M:%S') if timezone.is_aware(value) else value.isoformat(' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    # Names and notes typed at the gate can carry control characters that
+    # XML 1.0 forbids; one of them makes the whole XLSX sheet unreadable.
+    return XML_ILLEGAL.sub('', str(value))
+
+
+# CSV
+
+class Echo:
+    """File-like object whose write() hands the line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_cell(value):
+    text = _cell_text(value)
+    # Spreadsheets run text starting with these as a formula (CSV
+    # injection); a leading quote keeps it text. Numbers are left alone.
+    if isinstance(value, str) and text.startswith(FORMULA_PREFIXES):
+        return "'" + text
+    return text
+
+
+def stream_csv(headers, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow([_csv_cell(value) for value in row])
+
+
+# XLSX
+
+class _ChunkBuffer(io.RawIOBase):
+    """Unseekable sink that collects what zipfile writes until drained."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_TAIL = '</sheetData></worksheet>'
+
+
+def _xlsx_row(values):
+    cells = []
+    for value in values:
+        if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+            cells.append(f'<c><v>{value}</v></c>')
+        else:
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{escape(_cell_text(value))}</t></is></c>')
+    return f'<row>{"".join(cells)}</row>'
+
+
+def stream_xlsx(headers, rows, sheet_name='Export', chunk_size=CHUNK_SIZE):
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        archive.writestr('_rels/.rels', _ROOT_RELS)
+        archive.writestr('xl/workbook.xml', _WORKBOOK.format(name=escape(sheet_name[:31])))
+        archive.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((_SHEET_HEAD + _xlsx_row(headers)).encode())
+            for count, row in enumerate(rows, start=1):
+                sheet.write(_xlsx_row(row).encode())
+                if count % chunk_size == 0:
+                    yield buffer.drain()
+            sheet.write(_SHEET_TAIL.encode())
+        yield buffer.drain()
+    yield buffer.drain()
@@ -0,0 +1,197 @@
+"""
+Gate mode: checking visitors in and out at the gate, and the number of
+visitors inside each property.
+
+The gate terminals post small JSON requests (``views.gate_check_in`` and
+``views.gate_check_out``, with the session's CSRF token like any other
+POST) instead of going through the visitor form page.
+A unit is picked by its property and unit number, which is one probe of
+the ``(property, unit_number, id)`` index.
+
+``Property.visitors_inside`` is kept equal to the property's open visits
+(``exit_time`` unset) with ``F()`` updates, as ``pms.balances`` keeps
+``Tenant.balance``. The Visitor signals in ``pms.signals`` adjust it for
+visits saved or deleted anywhere. ``check_out`` adjusts it for the
+``UPDATE`` that closes a visit. Dashboards and the gate read the counter
+instead of counting visits. ``manage.py reconcile_gate_counts`` checks the
+counters against the visits.
+
+Lookups of open visits go through the partial index
+``pms_visitor_open_idx`` (``exit_time IS NULL``). It stays as small as the
+crowd inside, however long the visit history grows.
+"""
+import json
+from collections import defaultdict
+
+from django import forms
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import caching, counters, events
+from .models import Property, Unit, Visitor
+
+OPEN_VISITS_SHOWN = 100
+
+
+def _adjust_inside(deltas):
+    """
+    Apply ``{property_id: delta}`` to ``Property.visitors_inside``. A pure
+    counter: ``updated_at`` stays, so gate traffic leaves the property
+    pages' ETags and cached fragments alone.
+    """
+    counters.adjust(Property, 'visitors_inside', deltas)
+
+
+def _visit_property(visitor):
+    unit_field = Visitor._meta.get_field('unit_visiting')
+    if unit_field.is_cached(visitor):
+        return visitor.unit_visiting.property_id
+    return Unit.objects.filter(pk=visitor.unit_visiting_id).values_list('property_id', flat=True).first()
+
+
+def stored_visit(visitor_id):
+    """``(property_id, open)`` of the saved visit ``visitor_id``, or None."""
+    row = Visitor.objects.filter(pk=visitor_id).values_list('unit_visiting__property_id', 'exit_time').first()
+    return None if row is None else (row[0], row[1] is None)
+
+
+def recount_visit(previous, visitor):
+    """Move ``visitor``'s visit from ``previous`` (``stored_visit`` before the save) to its saved state."""
+    deltas = defaultdict(int)
+    if previous is not None and previous[1]:
+        deltas[previous[0]] -= 1
+    if visitor.exit_time is None:
+        deltas[_visit_property(visitor)] += 1
+    _adjust_inside(deltas)
+
+
+def uncount_visit(previous):
+    """Take a deleted visit (its ``stored_visit``) off the counter."""
+    if previous is not None and previous[1]:
+        _adjust_inside({previous[0]: -1})
+
+
+# Check-in and check-out
+
+def request_data(request):
+    """The fields of a JSON or form-encoded POST."""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    return request.POST
+
+
+class CheckInForm(forms.Form):
+    unit = forms.IntegerField(required=False)
+    property = forms.IntegerField(required=False)
+    unit_number = forms.CharField(max_length=50, required=False)
+    name = forms.CharField(max_length=255)
+    phone = forms.CharField(max_length=20)
+    id_number = forms.CharField(max_length=50, required=False)
+    vehicle_plate = forms.CharField(max_length=20, required=False)
+    guard = forms.CharField(max_length=255, required=False)
+
+    def clean(self):
+        data = super().clean()
+        units = Unit.objects.all()
+        if data.get('unit'):
+            units = units.filter(pk=data['unit'])
+        elif data.get('property') and data.get('unit_number'):
+            units = units.filter(property_id=data['property'], unit_number=data['unit_number'])
+        else:
+            raise forms.ValidationError('Give the unit id, or the property id and unit number.')
+        unit = units.values('pk', 'property_id', 'unit_number').order_by('id').first()
+        if unit is None:
+            raise forms.ValidationError('No such unit.')
+        data['unit'] = unit
+        return data
+
+
+class CheckOutForm(forms.Form):
+    visitor = forms.IntegerField(required=False)
+    vehicle_plate = forms.CharField(max_length=20, required=False)
+
+    def clean(self):
+        data = super().clean()
+        if not data.get('visitor') and not data.get('vehicle_plate'):
+            raise forms.ValidationError('Give the visitor id or the vehicle plate.')
+        return data
+
+
+def check_in(unit_id, name, phone, id_number='', vehicle_plate='', guard='', now=None):
+    """Open a visit to ``unit_id``; the Visitor signals count it in."""
+    return Visitor.objects.create(
+        unit_visiting_id=unit_id, name=name, phone=phone, id_number=id_number,
+        vehicle_plate=vehicle_plate.strip().upper(), security_guard_name=guard, entry_time=now or timezone.now(),
+    )
+
+
+def check_out(visitor_id=None, vehicle_plate=None, now=None):
+    """
+    Close the open visit ``visitor_id``, or the latest open one of
+    ``vehicle_plate``. Returns ``{id, name, property_id, exit_time}``, or
+    None when there is no such open visit (already checked out, say).
+    """
+    now = now or timezone.now()
+    visits = Visitor.objects.filter(exit_time__isnull=True)
+    if visitor_id:
+        visits = visits.filter(pk=visitor_id)
+    else:
+        visits = visits.filter(vehicle_plate__iexact=vehicle_plate.strip())
+    with transaction.atomic():
+        visit = (
+            visits.order_by('-entry_time')
+            .values('pk', 'name', 'unit_visiting__property_id', 'unit_visiting__property__owner_id').first()
+        )
+        # The exit_time condition again, so a concurrent check-out of the
+        # same visit closes it (and counts it out) only once.
+        if visit is None or not Visitor.objects.filter(pk=visit['pk'], exit_time__isnull=True).update(exit_time=now, updated_at=now):
+            return None
+        property_id = visit['unit_visiting__property_id']
+        _adjust_inside({property_id: -1})
+        owner_id = visit['unit_visiting__property__owner_id']
+        transaction.on_commit(lambda: _dashboard_changed({owner_id}))
+    return {'id': visit['pk'], 'name': visit['name'], 'property_id': property_id, 'exit_time': now}
+
+
+def _dashboard_changed(owner_ids):
+    caching.invalidate_dashboard(owner_ids)
+    events.publish_model_change(Visitor, owner_ids)
+
+
+def visitors_inside(property_id):
+    return Property.objects.filter(pk=property_id).values_list('visitors_inside', flat=True).first()
+
+
+def open_visits(property_id, limit=OPEN_VISITS_SHOWN):
+    """The property's open visits, latest first, for picking whom to check out."""
+    return list(
+        Visitor.objects.filter(exit_time__isnull=True, unit_visiting__property_id=property_id)
+        .order_by('-entry_time')
+        .values('pk', 'name', 'phone', 'vehicle_plate', 'entry_time', 'unit_visiting__unit_number')[:limit]
+    )
+
+
+# Reconciliation
+
+def inside_drift(property_ids):
+    """
+    Return ``[(property_id, stored, open_visits)]`` for the properties in
+    ``property_ids`` whose counter differs from their open visits.
+    """
+    counted = dict(
+        Visitor.objects.filter(exit_time__isnull=True, unit_visiting__property_id__in=property_ids)
+        .values('unit_visiting__property_id').annotate(visitors=Count('id')).order_by()
+        .values_list('unit_visiting__property_id', 'visitors')
+    )
+    return counters.drift(Property, 'visitors_inside', property_ids, counted)
+
+
+def fix_inside_drift(drift):
+    """Reset drifted counters to their open visits."""
+    with transaction.atomic():
+        _adjust_inside({pk: counted - stored for pk, stored, counted in drift})
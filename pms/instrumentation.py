@@ -0,0 +1,168 @@
+"""
+Per-request SQL and template timing, used by ``RequestMetricsMiddleware``.
+
+The middleware puts a ``RequestMetrics`` in a context variable for the
+duration of a request. Two hooks then add to it, and both do nothing
+outside a request:
+
+* an execute wrapper, installed on every database connection as it
+  connects, counts queries and their time;
+* ``TimedDjangoTemplates``, the template backend, times top-level renders.
+
+Context variables follow a request into ``sync_to_async`` threads, so the
+async views are measured too. Template time includes any queries run while
+rendering, so the two figures overlap.
+
+Finished requests are aggregated per URL name in ``view_stats``, one table
+per process, and checked against the ``PMS_QUERY_BUDGETS`` setting.
+"""
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+current_metrics = ContextVar('pms_request_metrics', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+@dataclass
+class RequestMetrics:
+    started: float = field(default_factory=time.perf_counter)
+    queries: int = 0
+    sql_time: float = 0.0
+    template_time: float = 0.0
+    total_time: float = 0.0
+    rendering: bool = False
+
+    def finish(self):
+        self.total_time = time.perf_counter() - self.started
+
+    def server_timing(self):
+        """The ``Server-Timing`` header value, durations in milliseconds."""
+        return ', '.join([
+            f'sql;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'total;dur={self.total_time * 1000:.1f}',
+        ])
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.sql_time += time.perf_counter() - started
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    # Connection objects outlive their database connections, so a
+    # reconnect must not add the wrapper twice.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = current_metrics.get()
+        if metrics is None or metrics.rendering:
+            return super().render(context, request)
+        metrics.rendering = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+            metrics.rendering = False
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render time added to the request metrics."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+class ViewStats:
+    """Per-URL-name totals of finished requests, shared by this process's threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = {}
+
+    def record(self, name, metrics):
+        with self._lock:
+            row = self._rows.setdefault(name, {
+                'requests': 0, 'queries': 0, 'max_queries': 0, 'sql_ms': 0.0, 'template_ms': 0.0,
+                'total_ms': 0.0, 'max_ms': 0.0,
+            })
+            row['requests'] += 1
+            row['queries'] += metrics.queries
+            row['max_queries'] = max(row['max_queries'], metrics.queries)
+            row['sql_ms'] += metrics.sql_time * 1000
+            row['template_ms'] += metrics.template_time * 1000
+            row['total_ms'] += metrics.total_time * 1000
+            row['max_ms'] = max(row['max_ms'], metrics.total_time * 1000)
+
+    def rows(self):
+        """Per-view averages, slowest total time first."""
+        with self._lock:
+            rows = [(name, dict(row)) for name, row in self._rows.items()]
+        table = []
+        for name, row in rows:
+            requests = row['requests']
+            table.append({
+                'view': name,
+                'requests': requests,
+                'avg_queries': round(row['queries'] / requests, 1),
+                'max_queries': row['max_queries'],
+                'avg_sql_ms': round(row['sql_ms'] / requests, 1),
+                'avg_template_ms': round(row['template_ms'] / requests, 1),
+                'avg_ms': round(row['total_ms'] / requests, 1),
+                'max_ms': round(row['max_ms'], 1),
+                'budget': query_budget(name),
+            })
+        return sorted(table, key=lambda row: row['avg_ms'] * row['requests'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._rows.clear()
+
+
+view_stats = ViewStats()
+
+
+def query_budget(name):
+    return getattr(settings, 'PMS_QUERY_BUDGETS', {}).get(name)
+
+
+def check_query_budget(name, metrics):
+    """
+    Log (or, with ``PMS_QUERY_BUDGET_RAISE``, raise ``QueryBudgetExceeded``)
+    when a request of view ``name`` ran more queries than its budget.
+    """
+    budget = query_budget(name)
+    if budget is None or metrics.queries <= budget:
+        return
+    message = f'{name} ran {metrics.queries} queries; its budget is {budget}.'
+    if getattr(settings, 'PMS_QUERY_BUDGET_RAISE', False):
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
@@ -0,0 +1,238 @@
+"""
+Dashboard KPI engine.
+
+Every metric on the dashboard is computed with one conditional aggregate
+query per model (filtered ``Sum``/``Count``) instead of a query per number;
+revenue and expense figures are read from the ``PropertyMonthlyLedger``
+rollup rather than summed over every payment. The result is a plain
+dataclass so the dashboard view and any future API can share it.
+
+``acompute_dashboard_kpis`` issues the same queries through the async ORM
+for the ASGI views. Django 4.2 still runs each async query on the request's
+sync thread, so on a single connection they execute one after another; the
+gain is that the event loop is free while they run.
+"""
+import asyncio
+from dataclasses import asdict, dataclass
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import Property, Unit, Tenant, Lease, MaintenanceTicket, Visitor, PropertyMonthlyLedger
+from .occupancy import long_vacant_q
+
+ZERO = Decimal('0')
+
+
+@dataclass(frozen=True)
+class DashboardKPIs:
+    # Financials
+    total_rent_collected: Decimal
+    total_expenses: Decimal
+    net_income: Decimal
+    curr_month_revenue: Decimal
+    prev_month_revenue: Decimal
+    curr_month_expenses: Decimal
+    prev_month_expenses: Decimal
+    curr_net_profit: Decimal
+    prev_net_profit: Decimal
+    profit_trend: Decimal
+    outstanding_rent: Decimal
+
+    # Property stats
+    total_properties: int
+    total_units: int
+    occupied_units: int
+    occupancy_rate: float
+    vacant_units_count: int
+
+    # Action alerts
+    expiring_leases_count: int
+    overdue_tenants_count: int
+    urgent_tickets_count: int
+
+    # Visitors
+    visitors_today: int
+    currently_checked_in: int
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def month_bounds(now):
+    """Return (first day of current month, first day of previous month)."""
+    first_day_current_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    last_day_prev_month = first_day_current_month - timedelta(days=1)
+    first_day_prev_month = last_day_prev_month.replace(day=1)
+    return first_day_current_month, first_day_prev_month
+
+
+def _kpi_queries(now, owner=None):
+    """
+    Return ``{name: (queryset, aggregates)}`` for the dashboard's
+    independent aggregate queries.
+    """
+    today = now.date()
+    first_day_current_month, first_day_prev_month = month_bounds(now)
+
+    properties = Property.objects.all()
+    ledger = PropertyMonthlyLedger.objects.all()
+    leases = Lease.objects.all()
+    units = Unit.objects.all()
+    tenants = Tenant.objects.all()
+    tickets = MaintenanceTicket.objects.all()
+    visitors = Visitor.objects.all()
+    if owner is not None:
+        properties = properties.filter(owner=owner)
+        ledger = ledger.filter(property__owner=owner)
+        leases = leases.filter(unit__property__owner=owner)
+        units = units.filter(property__owner=owner)
+        # A subquery rather than a join, so tenants with several leases
+        # are not summed twice below.
+        tenants = tenants.filter(pk__in=Lease.objects.filter(unit__property__owner=owner).values('tenant_id'))
+        tickets = tickets.filter(unit__property__owner=owner)
+        visitors = visitors.filter(unit_visiting__property__owner=owner)
+
+    curr_period = Q(year=first_day_current_month.year, month=first_day_current_month.month)
+    prev_period = Q(year=first_day_prev_month.year, month=first_day_prev_month.month)
+    queries = {
+        # Visitors inside come from the per-property counters kept by
+        # pms.gate rather than a count of open visits.
+        'properties': (properties, dict(
+            total=Count('id'),
+            visitors_inside=Sum('visitors_inside'),
+        )),
+        'ledger': (ledger, dict(
+            total_revenue=Sum('revenue'),
+            total_expenses=Sum('expenses'),
+            curr_month_revenue=Sum('revenue', filter=curr_period),
+            prev_month_revenue=Sum('revenue', filter=prev_period),
+            curr_month_expenses=Sum('expenses', filter=curr_period),
+            prev_month_expenses=Sum('expenses', filter=prev_period),
+        )),
+        'leases': (leases, dict(
+            expiring=Count('id', filter=Q(status='expiring')),
+        )),
+        'units': (units, dict(
+            total=Count('id'),
+            occupied=Count('id', filter=Q(status='occupied')),
+            long_vacant=Count('id', filter=long_vacant_q(now=now)),
+        )),
+        'tenants': (tenants, dict(
+            overdue=Count('id', filter=Q(status='active', rent_due_date__lt=today, balance__gt=0)),
+            outstanding=Sum('balance', filter=Q(balance__gt=0)),
+        )),
+        'tickets': (tickets, dict(
+            urgent=Count('id', filter=Q(priority='high') & ~Q(status='closed')),
+        )),
+        'visitors': (visitors, dict(
+            today=Count('id', filter=Q(entry_time__date=today)),
+        )),
+    }
+    return queries
+
+
+def _ledger_fields(ledger):
+    total_rent_collected = ledger['total_revenue'] or ZERO
+    total_expenses = ledger['total_expenses'] or ZERO
+    curr_month_revenue = ledger['curr_month_revenue'] or ZERO
+    prev_month_revenue = ledger['prev_month_revenue'] or ZERO
+    curr_month_expenses = ledger['curr_month_expenses'] or ZERO
+    prev_month_expenses = ledger['prev_month_expenses'] or ZERO
+
+    curr_net_profit = curr_month_revenue - curr_month_expenses
+    prev_net_profit = prev_month_revenue - prev_month_expenses
+
+    profit_trend = ZERO
+    if prev_net_profit > 0:
+        profit_trend = ((curr_net_profit - prev_net_profit) / prev_net_profit) * 100
+    elif curr_net_profit > 0:
+        profit_trend = Decimal('100')
+
+    return dict(
+        total_rent_collected=total_rent_collected,
+        total_expenses=total_expenses,
+        net_income=total_rent_collected - total_expenses,
+        curr_month_revenue=curr_month_revenue,
+        prev_month_revenue=prev_month_revenue,
+        curr_month_expenses=curr_month_expenses,
+        prev_month_expenses=prev_month_expenses,
+        curr_net_profit=curr_net_profit,
+        prev_net_profit=prev_net_profit,
+        profit_trend=round(profit_trend, 1),
+    )
+
+
+def _units_fields(units):
+    total_units = units['total']
+    occupied_units = units['occupied']
+    occupancy_rate = (occupied_units / total_units * 100) if total_units > 0 else 0
+    return dict(
+        total_units=total_units,
+        occupied_units=occupied_units,
+        occupancy_rate=round(occupancy_rate, 1),
+        vacant_units_count=units['long_vacant'],
+    )
+
+
+# The KPI fields computed from each query of _kpi_queries.
+FIELD_BUILDERS = {
+    'properties': lambda row: dict(total_properties=row['total'], currently_checked_in=row['visitors_inside'] or 0),
+    'ledger': _ledger_fields,
+    'leases': lambda row: dict(expiring_leases_count=row['expiring']),
+    'units': _units_fields,
+    'tenants': lambda row: dict(outstanding_rent=row['outstanding'] or ZERO, overdue_tenants_count=row['overdue']),
+    'tickets': lambda row: dict(urgent_tickets_count=row['urgent']),
+    'visitors': lambda row: dict(visitors_today=row['today']),
+}
+
+
+def _kpi_fields(results):
+    fields = {}
+    for name, row in results.items():
+        fields.update(FIELD_BUILDERS[name](row))
+    return fields
+
+
+def _build_kpis(results):
+    return DashboardKPIs(**_kpi_fields(results))
+
+
+def compute_dashboard_kpis(now=None, owner=None):
+    """
+    Compute the dashboard KPIs, optionally restricted to the properties of
+    ``owner`` (a ``User``); ``owner=None`` covers the whole portfolio.
+    """
+    now = timezone.localtime(now or timezone.now())
+    queries = _kpi_queries(now, owner)
+    results = {name: queryset.aggregate(**aggregates) for name, (queryset, aggregates) in queries.items()}
+    return _build_kpis(results)
+
+
+async def acompute_dashboard_kpis(now=None, owner=None):
+    """
+    Async ``compute_dashboard_kpis``: the aggregates are independent, so
+    they are awaited together with ``asyncio.gather``.
+    """
+    now = timezone.localtime(now or timezone.now())
+    queries = _kpi_queries(now, owner)
+    aggregated = await asyncio.gather(
+        *(queryset.aaggregate(**aggregates) for queryset, aggregates in queries.values()),
+    )
+    return _build_kpis(dict(zip(queries, aggregated)))
+
+
+def compute_kpi_fields(groups, now=None, owner=None):
+    """
+    The KPI fields computed from only the ``groups`` (names of
+    ``_kpi_queries``) given, as ``{field: value}``: one aggregate query per
+    group, for refreshing the figures a change can have moved.
+    """
+    now = timezone.localtime(now or timezone.now())
+    queries = _kpi_queries(now, owner)
+    return _kpi_fields({
+        name: queryset.aggregate(**aggregates)
+        for name, (queryset, aggregates) in queries.items() if name in groups
+    })
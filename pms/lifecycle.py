@@ -0,0 +1,105 @@
+"""
+Lease lifecycle sweeper: active -> expiring -> terminated.
+
+Each pass selects a chunk of lease ids with an index range scan on
+(end_date, id) and moves them with a single ``update()``. Terminating a
+chunk also frees its units in the same transaction, recording each change
+in the unit status history. Read paths then filter on ``Lease.status``
+rather than recomputing end-date windows on every request, so
+``manage.py sweep_leases`` must be scheduled to run daily (cron or any
+other job scheduler). Migration 0016 applied the first sweep to existing
+leases, and ``sweep_lease`` moves a new lease without waiting for the
+next run.
+"""
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import caching, events
+from .models import Lease, Property, Unit, LeaseSweepRun
+from .occupancy import set_units_status
+
+EXPIRING_WITHIN_DAYS = 30
+CHUNK_SIZE = 1000
+
+
+@dataclass
+class SweepResult:
+    expiring: int = 0
+    terminated: int = 0
+    units_vacated: int = 0
+
+
+def _chunks(leases, chunk_size):
+    """
+    Yield lists of ``(lease_id, unit_id)`` from ``leases``. Each chunk is
+    re-queried after the previous one was updated out of the filter, so no
+    cursor is needed.
+    """
+    while True:
+        rows = list(leases.order_by('end_date', 'id').values_list('pk', 'unit_id')[:chunk_size])
+        if not rows:
+            return
+        yield rows
+
+
+def terminate_ended(today, result, chunk_size=CHUNK_SIZE, leases=None):
+    ended = (Lease.objects if leases is None else leases).filter(status__in=Lease.OPEN_STATUSES, end_date__lt=today)
+    for rows in _chunks(ended, chunk_size):
+        lease_ids = [pk for pk, _ in rows]
+        unit_ids = {unit_id for _, unit_id in rows}
+        with transaction.atomic():
+            result.terminated += Lease.objects.filter(pk__in=lease_ids).update(status='terminated', updated_at=timezone.now())
+            # A unit stays occupied if another lease on it is still open.
+            vacated = (
+                Unit.objects.filter(pk__in=unit_ids, status='occupied')
+                .exclude(leases__status__in=Lease.OPEN_STATUSES)
+                .values_list('pk', flat=True)
+            )
+            result.units_vacated += set_units_status(list(vacated), 'vacant', reason='lease_ended')
+
+
+def mark_expiring(today, result, within_days=EXPIRING_WITHIN_DAYS, chunk_size=CHUNK_SIZE, leases=None):
+    expiring = (Lease.objects if leases is None else leases).filter(status='active', end_date__lte=today + timedelta(days=within_days))
+    for rows in _chunks(expiring, chunk_size):
+        with transaction.atomic():
+            result.expiring += Lease.objects.filter(pk__in=[pk for pk, _ in rows]).update(status='expiring', updated_at=timezone.now())
+
+
+def sweep_leases(today=None, within_days=EXPIRING_WITHIN_DAYS, chunk_size=CHUNK_SIZE):
+    """
+    Terminate leases that ended before ``today`` and mark active leases ending
+    within ``within_days`` as expiring. Records and returns a ``SweepResult``.
+    """
+    today = today or timezone.localdate()
+    result = SweepResult()
+    terminate_ended(today, result, chunk_size)
+    mark_expiring(today, result, within_days, chunk_size)
+    LeaseSweepRun.objects.create(
+        as_of=today, expiring=result.expiring, terminated=result.terminated, units_vacated=result.units_vacated,
+    )
+    if result.expiring or result.terminated:
+        # update() sends no signals, so drop every cached dashboard here.
+        caching.invalidate_all_dashboards()
+        events.publish(['leases', 'units'])
+    return result
+
+
+def sweep_lease(lease_id, today=None, within_days=EXPIRING_WITHIN_DAYS):
+    """
+    Apply the sweep to one lease just saved, so a lease created
+    inside the expiring window (or already ended) does not wait for the next
+    daily run. Returns a ``SweepResult``; no ``LeaseSweepRun`` is recorded.
+    """
+    today = today or timezone.localdate()
+    result = SweepResult()
+    lease = Lease.objects.filter(pk=lease_id)
+    terminate_ended(today, result, leases=lease)
+    mark_expiring(today, result, within_days, leases=lease)
+    if result.expiring or result.terminated:
+        owner_ids = list(Property.objects.filter(units__leases=lease_id).values_list('owner_id', flat=True))
+        caching.invalidate_dashboard(owner_ids)
+        events.publish(['leases', 'units'], owner_ids)
+    return result
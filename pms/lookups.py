@@ -0,0 +1,67 @@
+"""
+Paginated prefix lookups backing the ``TypeaheadSelect`` widget.
+
+Each lookup returns ``{"results": [{"id", "text"}], "more": bool}`` and
+reads only the columns needed for the label.
+"""
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.db.models.lookups import GreaterThanOrEqual, LessThan
+from django.http import JsonResponse
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+
+# Upper bound appended to a prefix to turn it into a half-open range.
+PREFIX_END = '\U0010ffff'
+
+
+def prefix_q(fields, term):
+    """
+    Case-insensitive prefix match written as B-tree range scans.
+
+    ``istartswith`` compiles to ``LIKE``/``UPPER(...) LIKE``, which neither
+    SQLite nor Postgres can answer from a plain index. A range
+    ``LOWER(field) >= term AND LOWER(field) < term + U+10FFFF`` on the
+    lower-cased term can, from the ``Lower()`` expression indexes on the
+    looked-up fields, so "mcd" finds "McDonald" and "o'b" finds "O'Brien".
+    SQLite's ``LOWER()`` folds ASCII letters only; other letters match in
+    the case they were typed.
+    """
+    term = term.lower()
+    q = Q()
+    for field in fields:
+        q |= Q(GreaterThanOrEqual(Lower(field), term), LessThan(Lower(field), term + PREFIX_END))
+    return q
+
+
+def page_params(request):
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    try:
+        size = min(max(int(request.GET.get('page_size', PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        size = PAGE_SIZE
+    return page, size
+
+
+def int_param(request, name):
+    try:
+        return int(request.GET[name])
+    except (KeyError, ValueError):
+        return None
+
+
+def lookup_response(request, queryset, search_fields, ordering, fields, label):
+    term = request.GET.get('q', '').strip()
+    page, size = page_params(request)
+    if term:
+        queryset = queryset.filter(prefix_q(search_fields, term))
+    offset = (page - 1) * size
+    rows = list(queryset.order_by(*ordering).values('pk', *fields)[offset:offset + size + 1])
+    return JsonResponse({
+        'results': [{'id': row['pk'], 'text': label(row)} for row in rows[:size]],
+        'more': len(rows) > size,
+    })
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from pms.benchmarks import compare
+
+DEFAULT_VIEWS = ('dashboard', 'unit_list', 'tenant_list', 'lease_list', 'payment_list', 'ticket_list', 'visitor_list')
+
+
+class Command(BaseCommand):
+    help = 'Compare WSGI (sync views) and ASGI (async views) latency under concurrent load.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Path to request; repeat for several. Default: the dashboard and list views.')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per path and handler.')
+        parser.add_argument('--concurrency', type=int, default=20, help='Requests in flight at once.')
+        parser.add_argument('--use-cache', action='store_true', help='Keep the dashboard KPI cache enabled.')
+
+    def handle(self, *args, paths, requests, concurrency, use_cache, **options):
+        if requests < 1 or concurrency < 1:
+            raise CommandError('--requests and --concurrency must be at least 1.')
+        paths = paths or [reverse(name) for name in DEFAULT_VIEWS]
+
+        self.stdout.write(f"{'handler':<8}{'path':<16}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'errors':>8}")
+        for stats in compare(paths, requests, concurrency, use_cache):
+            self.stdout.write(
+                f'{stats.handler:<8}{stats.path:<16}{stats.mean_ms:>10.1f}{stats.p50_ms:>10.1f}'
+                f'{stats.p95_ms:>10.1f}{stats.p99_ms:>10.1f}{stats.throughput:>10.1f}{stats.errors:>8}'
+            )
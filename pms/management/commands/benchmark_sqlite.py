@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import override_settings
+
+from pms.benchmarks import sqlite_contention
+from pms.seeding import PortfolioSize, seed_portfolio
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure concurrent read/write throughput on SQLite with its default settings and with the '
+        'PMS_SQLITE_PROFILE tuning. Runs on a throwaway database file, never the configured one.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=10, help='Duration of each run.')
+        parser.add_argument('--writers', type=int, default=4, help='Writer threads (check-in plus payment).')
+        parser.add_argument('--readers', type=int, default=8, help='Reader threads (dashboard and visitor list).')
+        parser.add_argument('--scale', type=float, default=0.001, help='Size of the seeded portfolio.')
+
+    def handle(self, *args, seconds, writers, readers, scale, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('benchmark_sqlite needs a SQLite database.')
+        if seconds <= 0 or writers < 1 or readers < 0 or scale <= 0:
+            raise CommandError('--seconds, --writers and --scale must be positive.')
+        profile = getattr(settings, 'PMS_SQLITE_PROFILE', None) or 'production'
+
+        directory = tempfile.mkdtemp()
+        test_settings = connection.settings_dict['TEST']
+        original_test_name = test_settings.get('NAME')
+        test_settings['NAME'] = os.path.join(directory, 'contention.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            seed_portfolio(PortfolioSize().scaled(scale))
+            results = []
+            for label, run_profile in (('defaults', None), (profile, profile)):
+                with override_settings(PMS_SQLITE_PROFILE=run_profile):
+                    connections.close_all()
+                    if run_profile is None:
+                        # The journal mode is stored in the file; undo any earlier WAL switch.
+                        with connection.cursor() as cursor:
+                            cursor.execute('PRAGMA journal_mode = DELETE')
+                    results.append(sqlite_contention(label, seconds, writers, readers))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            test_settings['NAME'] = original_test_name
+            shutil.rmtree(directory, ignore_errors=True)
+
+        self.stdout.write(f"{'settings':<12}{'writes/s':>10}{'reads/s':>10}{'locked':>8}")
+        for stats in results:
+            self.stdout.write(
+                f'{stats.label:<12}{stats.writes_per_second:>10.1f}{stats.reads_per_second:>10.1f}{stats.locked:>8}'
+            )
+        before, after = results
+        if before.writes and before.reads:
+            self.stdout.write(self.style.SUCCESS(
+                f'{after.label}: writes x{after.writes / before.writes:.2f}, reads x{after.reads / before.reads:.2f}'
+            ))
@@ -0,0 +1,81 @@
+import json
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from pms.benchmarks import benchmark_urls, compare_reports, report_header
+from pms.seeding import PortfolioSize, seed_portfolio
+
+
+class Command(BaseCommand):
+    help = (
+        'Time and count the queries of every pms URL against seeded portfolios of several sizes, '
+        'and write a JSON report. Runs in a throwaway test database, never the configured one.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='0.001,0.01',
+                            help='Comma-separated portfolio scales (1 = 2k properties, 3M payments).')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed requests per URL.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the portfolios.')
+        parser.add_argument('--output', default='benchmark-report.json', help='Where to write the report.')
+        parser.add_argument('--baseline', help='A previous report; regressions against it are listed.')
+        parser.add_argument('--use-cache', action='store_true', help='Keep the dashboard KPI cache enabled.')
+
+    def handle(self, *args, scales, repeat, seed, output, baseline, use_cache, **options):
+        try:
+            scales = [float(scale) for scale in scales.split(',')]
+        except ValueError:
+            raise CommandError('--scales must be comma-separated numbers.')
+        if repeat < 1 or any(scale <= 0 for scale in scales):
+            raise CommandError('--repeat and every scale must be positive.')
+        if baseline:
+            with open(baseline) as handle:
+                baseline = json.load(handle)
+
+        report = report_header(repeat)
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            for scale in scales:
+                call_command('flush', interactive=False, verbosity=0)
+                size = PortfolioSize().scaled(scale)
+                started = time.perf_counter()
+                seed_portfolio(size, seed=seed)
+                seeded = time.perf_counter() - started
+                self.stdout.write(f'Scale {scale}: seeded in {seeded:.1f}s')
+
+                timings, skipped = benchmark_urls(repeat, use_cache)
+                for timing in timings:
+                    over = ' over budget' if timing.budget is not None and timing.queries > timing.budget else ''
+                    self.stdout.write(
+                        f'  {timing.path:<40} {timing.status} {timing.queries:>3} queries '
+                        f'{timing.median_ms:>9.1f}ms{over}'
+                    )
+                if skipped:
+                    self.stdout.write(f"  skipped (no sample arguments): {', '.join(skipped)}")
+                report['runs'].append({
+                    'scale': scale,
+                    'sizes': size.as_dict(),
+                    'seed_seconds': round(seeded, 1),
+                    'skipped': skipped,
+                    'results': [timing.as_dict() for timing in timings],
+                })
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        with open(output, 'w') as handle:
+            json.dump(report, handle, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {output}.'))
+
+        if baseline:
+            regressions = compare_reports(baseline, report)
+            for regression in regressions:
+                self.stdout.write(self.style.WARNING(regression))
+            if regressions:
+                raise CommandError(f'{len(regressions)} regressions against the baseline.')
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
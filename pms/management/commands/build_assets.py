@@ -0,0 +1,50 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from pms.assets import AssetBuildError, build_icons, build_stylesheet, template_files, used_icons
+
+
+def default_fontawesome_dir():
+    try:
+        import fontawesomefree
+    except ImportError:
+        return None
+    return Path(fontawesomefree.__file__).parent / 'static' / 'fontawesomefree'
+
+
+class Command(BaseCommand):
+    help = (
+        'Compile static/css/app.css with Tailwind and subset the Font Awesome icon font to the icons the '
+        'templates use. Run after adding Tailwind classes or icons, and commit the output.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tailwind', default=getattr(settings, 'PMS_TAILWIND_BIN', 'tailwindcss'),
+            help='Tailwind v4 CLI executable (default: PMS_TAILWIND_BIN or tailwindcss on PATH).',
+        )
+        parser.add_argument(
+            '--fontawesome', help='Font Awesome Free directory with metadata/ and webfonts/ (default: the fontawesomefree package).',
+        )
+
+    def handle(self, *args, tailwind, fontawesome, **options):
+        base_dir = Path(settings.BASE_DIR)
+        static_dir = base_dir / 'static'
+        fontawesome = Path(fontawesome) if fontawesome else default_fontawesome_dir()
+        if fontawesome is None or not (fontawesome / 'metadata' / 'icons.json').exists():
+            raise CommandError('Font Awesome Free not found: pip install fontawesomefree, or pass --fontawesome.')
+
+        try:
+            build_stylesheet(tailwind, base_dir / 'assets' / 'tailwind.css', static_dir / 'css' / 'app.css')
+            icons = used_icons(template_files(base_dir))
+            unknown = build_icons(fontawesome, static_dir, icons)
+        except AssetBuildError as exc:
+            raise CommandError(str(exc))
+
+        for name in ('css/app.css', 'css/icons.css', 'webfonts/fa-solid-900-subset.woff2'):
+            self.stdout.write(f'{name}: {(static_dir / name).stat().st_size / 1024:.1f} KiB')
+        if unknown:
+            self.stdout.write(self.style.WARNING(f'Unknown icon classes: {", ".join("fa-" + name for name in unknown)}'))
+        self.stdout.write(self.style.SUCCESS(f'Built {len(icons) - len(unknown)} icon classes.'))
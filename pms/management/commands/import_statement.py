@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from pms.models import Payment
+from pms.statements import BATCH_SIZE, StatementFormatError, import_statement, write_unmatched_report
+
+
+class Command(BaseCommand):
+    help = 'Import an M-Pesa or bank statement CSV as payments, matching rows to tenants by phone or ID number.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Statement CSV file.')
+        parser.add_argument('--method', choices=[value for value, _ in Payment.METHOD_CHOICES], default='mpesa',
+                            help='Payment method recorded on imported rows.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows inserted per transaction.')
+        parser.add_argument('--report', help='Write unmatched rows to this CSV file.')
+        parser.add_argument('--encoding', default='utf-8-sig')
+
+    def handle(self, *args, path, method, batch_size, report, encoding, **options):
+        try:
+            with open(path, newline='', encoding=encoding) as statement:
+                result = import_statement(statement, method=method, batch_size=batch_size)
+        except (OSError, StatementFormatError) as exc:
+            raise CommandError(str(exc))
+
+        if report and result.unmatched:
+            with open(report, 'w', newline='', encoding='utf-8') as stream:
+                write_unmatched_report(result, stream)
+            self.stdout.write(f'Wrote {result.unmatched_count} unmatched rows to {report}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.created} payments; {result.duplicates} duplicates, '
+            f'{result.skipped} debits skipped, {result.unmatched_count} unmatched.'
+        ))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from pms.models import Property
+from pms.rollups import rebuild_ledger
+
+
+class Command(BaseCommand):
+    help = 'Recompute the PropertyMonthlyLedger rollup from payments and expenses, a chunk of properties at a time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Properties recomputed per transaction.')
+        parser.add_argument('--property', type=int, action='append', dest='property_ids',
+                            help='Only rebuild the given property id (repeatable).')
+
+    def handle(self, *args, chunk_size, property_ids, **options):
+        rebuild_all = not property_ids
+        if rebuild_all:
+            property_ids = list(Property.objects.order_by('pk').values_list('pk', flat=True))
+        rows = 0
+        for start in range(0, len(property_ids), chunk_size):
+            chunk = property_ids[start:start + chunk_size]
+            rows += rebuild_ledger(chunk, include_unassigned=False)
+            self.stdout.write(f'Rebuilt {len(chunk)} properties ({start + len(chunk)}/{len(property_ids)})')
+        if rebuild_all:
+            rows += rebuild_ledger([], include_unassigned=True)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {rows} ledger rows.'))
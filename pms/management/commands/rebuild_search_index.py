@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from pms.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the full-text search index (SearchEntry) from tenants, visitors, maintenance tickets and '
+        'properties. Run after bulk loads (bulk_create, loaddata) that bypass the model signals.'
+    )
+
+    def handle(self, *args, **options):
+        counts = rebuild_index(log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {sum(counts.values())} rows.'))
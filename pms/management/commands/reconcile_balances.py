@@ -0,0 +1,20 @@
+from pms.balances import balance_drift, fix_drift
+from pms.counters import ReconcileCommand
+from pms.models import Tenant
+
+
+class Command(ReconcileCommand):
+    help = 'Check each Tenant.balance against the sum of its ledger entries, a chunk of tenants at a time.'
+    model = Tenant
+    noun = 'tenants'
+    fix_help = 'Reset drifted balances to their ledger totals.'
+    fixed = 'Balances reset to the ledger.'
+
+    def find_drift(self, pks):
+        return balance_drift(pks)
+
+    def fix_drift(self, drift):
+        fix_drift(drift)
+
+    def describe(self, pk, stored, ledger):
+        return f'Tenant {pk}: stored {stored}, ledger {ledger} (drift {stored - ledger})'
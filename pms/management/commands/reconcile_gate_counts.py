@@ -0,0 +1,21 @@
+from pms.counters import ReconcileCommand
+from pms.gate import fix_inside_drift, inside_drift
+from pms.models import Property
+
+
+class Command(ReconcileCommand):
+    help = 'Check each Property.visitors_inside against the property\'s open visits, a chunk of properties at a time.'
+    model = Property
+    default_chunk_size = 500
+    noun = 'properties'
+    fix_help = 'Reset drifted counters to the open visits.'
+    fixed = 'Counters reset to the open visits.'
+
+    def find_drift(self, pks):
+        return inside_drift(pks)
+
+    def fix_drift(self, drift):
+        fix_inside_drift(drift)
+
+    def describe(self, pk, stored, counted):
+        return f'Property {pk}: counter {stored}, open visits {counted}'
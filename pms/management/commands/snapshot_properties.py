@@ -0,0 +1,43 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from pms.snapshots import snapshot_range
+
+
+class Command(BaseCommand):
+    help = 'Write PropertyDailySnapshot rows for a day (default yesterday) or backfill a range of days.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Snapshot this day (YYYY-MM-DD).')
+        parser.add_argument('--start', help='First day to backfill (YYYY-MM-DD).')
+        parser.add_argument('--end', help='Last day to backfill (YYYY-MM-DD); default yesterday.')
+
+    def _date(self, value, option):
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise CommandError(f'{option} must be a date (YYYY-MM-DD).')
+        return day
+
+    def handle(self, *args, date, start, end, **options):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        if date:
+            if start or end:
+                raise CommandError('Use either --date or --start/--end.')
+            start = end = self._date(date, '--date')
+        else:
+            end = self._date(end, '--end') if end else yesterday
+            start = self._date(start, '--start') if start else end
+        if end < start:
+            raise CommandError('--end must not be before --start.')
+
+        total = 0
+        for day, rows in snapshot_range(start, end):
+            total += rows
+            self.stdout.write(f'{day}: {rows} properties')
+        self.stdout.write(self.style.SUCCESS(f'Wrote {total} snapshot rows.'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from pms.lifecycle import CHUNK_SIZE, EXPIRING_WITHIN_DAYS, sweep_leases
+
+
+class Command(BaseCommand):
+    help = 'Move leases from active to expiring to terminated by end date and free the units of ended leases.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--as-of', help='Sweep as if today were this date (YYYY-MM-DD).')
+        parser.add_argument('--within-days', type=int, default=EXPIRING_WITHIN_DAYS,
+                            help='Mark leases ending within this many days as expiring.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Leases updated per transaction.')
+
+    def handle(self, *args, as_of, within_days, chunk_size, **options):
+        if as_of is not None:
+            try:
+                as_of = parse_date(as_of)
+            except ValueError:
+                as_of = None
+            if as_of is None:
+                raise CommandError('--as-of must be a date (YYYY-MM-DD).')
+        result = sweep_leases(today=as_of, within_days=within_days, chunk_size=chunk_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'{result.expiring} leases now expiring, {result.terminated} terminated, '
+            f'{result.units_vacated} units vacated.'
+        ))
@@ -0,0 +1,30 @@
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from pms.routers import replica_alias
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the default SQLite database over the PMS_READ_REPLICA database, for trying out replica '
+        'routing locally. Run it again to let the replica catch up; between runs it lags like a real one.'
+    )
+
+    def handle(self, *args, **options):
+        alias = replica_alias()
+        if not alias or alias not in connections.databases:
+            raise CommandError('No replica database is configured; set PMS_REPLICA_DB.')
+        primary, replica = connections[DEFAULT_DB_ALIAS].settings_dict, connections[alias].settings_dict
+        if primary['ENGINE'] != 'django.db.backends.sqlite3' or replica['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('Only SQLite databases can be copied; use the server\'s replication for Postgres.')
+        connections[alias].close()
+        source = sqlite3.connect(str(primary['NAME']))
+        target = sqlite3.connect(str(replica['NAME']))
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        self.stdout.write(self.style.SUCCESS(f'Copied {primary["NAME"]} to {replica["NAME"]}.'))
@@ -0,0 +1,138 @@
+"""
+Request instrumentation middleware (see ``pms.instrumentation``) and the
+static file server.
+"""
+import mimetypes
+import os
+from urllib.parse import urlparse
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .instrumentation import RequestMetrics, check_query_budget, current_metrics, view_stats
+
+UNRESOLVED = '<unresolved>'
+
+
+class RequestMetricsMiddleware:
+    """
+    Measure each request's SQL queries, SQL time, template time and total
+    time. The figures are sent as a ``Server-Timing`` header, added to the
+    per-view stats table and checked against the view's query budget.
+
+    Works in sync and async stacks, so the async views keep running as
+    coroutines. List it first in ``MIDDLEWARE`` so the total covers the
+    other middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        metrics.finish()
+        match = getattr(request, 'resolver_match', None)
+        name = (match and match.view_name) or UNRESOLVED
+        view_stats.record(name, metrics)
+        if getattr(settings, 'PMS_SERVER_TIMING', True):
+            response['Server-Timing'] = metrics.server_timing()
+        check_query_budget(name, metrics)
+        return response
+
+
+class StaticFilesMiddleware:
+    """
+    Serve the files ``collectstatic`` wrote to ``STATIC_ROOT``, so the app
+    needs no separate web server (the gate terminals run it standalone).
+
+    The ``.br``/``.gz`` copies written by ``PrecompressedManifestStaticFilesStorage``
+    are sent to clients that accept them. Content-hashed names are cached
+    for ``PMS_STATIC_MAX_AGE`` and marked immutable; other names must be
+    revalidated. The file list is read once at startup, so restart after
+    ``collectstatic``. Does nothing with ``DEBUG`` on, where ``runserver``
+    serves the source files. List it first in ``MIDDLEWARE``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.files = {} if settings.DEBUG else static_files_index()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.serve(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self.serve(request) or await self.get_response(request)
+
+    def serve(self, request):
+        entry = self.files.get(request.path)
+        if entry is None or request.method not in ('GET', 'HEAD'):
+            return None
+        path, encodings, immutable = entry
+        accepted = {token.split(';')[0].strip() for token in request.headers.get('Accept-Encoding', '').split(',')}
+        encoding = next((name for name in ('br', 'gzip') if name in accepted and name in encodings), None)
+        with open(encodings[encoding] if encoding else path, 'rb') as source:
+            response = HttpResponse(source.read(), content_type=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        if encoding:
+            response['Content-Encoding'] = encoding
+        if encodings:
+            patch_vary_headers(response, ['Accept-Encoding'])
+        if immutable:
+            response['Cache-Control'] = f'public, max-age={getattr(settings, "PMS_STATIC_MAX_AGE", 31536000)}, immutable'
+        else:
+            response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+        return response
+
+
+def static_files_index():
+    """``{url path: (file path, {encoding: file path}, immutable)}`` for ``STATIC_ROOT``."""
+    root = settings.STATIC_ROOT
+    if not root or not os.path.isdir(root):
+        return {}
+    prefix = urlparse(settings.STATIC_URL).path
+    hashed = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+    files = {}
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            if name.endswith(('.gz', '.br')) and os.path.exists(path[:-3]):
+                continue
+            relative = os.path.relpath(path, root).replace(os.sep, '/')
+            encodings = {
+                encoding: path + suffix
+                for encoding, suffix in (('br', '.br'), ('gzip', '.gz'))
+                if os.path.exists(path + suffix)
+            }
+            files[prefix + relative] = (path, encodings, relative in hashed)
+    return files
@@ -0,0 +1,81 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def populate_ledger(apps, schema_editor):
+    Payment = apps.get_model('pms', 'Payment')
+    Expense = apps.get_model('pms', 'Expense')
+    PropertyMonthlyLedger = apps.get_model('pms', 'PropertyMonthlyLedger')
+
+    buckets = {}
+
+    def bucket(key):
+        return buckets.setdefault(key, {'revenue': 0, 'expenses': 0, 'payment_count': 0, 'expense_count': 0})
+
+    payments = (
+        Payment.objects
+        .annotate(y=ExtractYear('date'), m=ExtractMonth('date'))
+        .values('lease__unit__property_id', 'y', 'm')
+        .annotate(total=Sum('amount'), rows=Count('id'))
+        .order_by()
+    )
+    for row in payments:
+        entry = bucket((row['lease__unit__property_id'], row['y'], row['m']))
+        entry['revenue'] += row['total']
+        entry['payment_count'] += row['rows']
+
+    expenses = (
+        Expense.objects
+        .annotate(y=ExtractYear('date'), m=ExtractMonth('date'))
+        .values('property_id', 'y', 'm')
+        .annotate(total=Sum('amount'), rows=Count('id'))
+        .order_by()
+    )
+    for row in expenses:
+        entry = bucket((row['property_id'], row['y'], row['m']))
+        entry['expenses'] += row['total']
+        entry['expense_count'] += row['rows']
+
+    PropertyMonthlyLedger.objects.bulk_create([
+        PropertyMonthlyLedger(property_id=property_id, year=year, month=month, **totals)
+        for (property_id, year, month), totals in buckets.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pms', '0003_alter_property_owner'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropertyMonthlyLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('expenses', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('payment_count', models.IntegerField(default=0)),
+                ('expense_count', models.IntegerField(default=0)),
+                ('property', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='monthly_ledger', to='pms.property')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['year', 'month'], name='pms_propert_year_a450d5_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='propertymonthlyledger',
+            constraint=models.UniqueConstraint(fields=('property', 'year', 'month'), name='unique_property_month_ledger'),
+        ),
+        migrations.AddConstraint(
+            model_name='propertymonthlyledger',
+            constraint=models.UniqueConstraint(condition=models.Q(('property__isnull', True)), fields=('year', 'month'), name='unique_unassigned_month_ledger'),
+        ),
+        migrations.RunPython(populate_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pms', '0004_propertymonthlyledger'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['name'], name='pms_propert_name_d97371_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tenant',
+            index=models.Index(fields=['last_name', 'first_name'], name='pms_tenant_last_na_ba1985_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tenant',
+            index=models.Index(fields=['first_name'], name='pms_tenant_first_n_ffa727_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tenant',
+            index=models.Index(fields=['phone'], name='pms_tenant_phone_9a56a6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='unit',
+            index=models.Index(fields=['unit_number'], name='pms_unit_unit_nu_f4d574_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pms', '0005_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='lease',
+            name='pms_lease_end_dat_225ddb_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='payment',
+            name='pms_payment_date_233ddf_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='tenant',
+            name='pms_tenant_last_na_ba1985_idx',
+        ),
+        migrations.AddIndex(
+            model_name='lease',
+            index=models.Index(fields=['end_date', 'id'], name='pms_lease_end_dat_388f5e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='maintenanceticket',
+            index=models.Index(fields=['-created_at', '-id'], name='pms_mainten_created_13f954_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['-date', '-id'], name='pms_payment_date_d92946_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tenant',
+            index=models.Index(fields=['last_name', 'first_name', 'id'], name='pms_tenant_last_na_555611_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='unit',
+            index=models.Index(fields=['property', 'unit_number', 'id'], name='pms_unit_propert_a38715_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visitor',
+            index=models.Index(fields=['-entry_time', '-id'], name='pms_visitor_entry_t_a1ef7e_idx'),
+        ),
+    ]
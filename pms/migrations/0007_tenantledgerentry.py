@@ -0,0 +1,66 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+from django.db.models import Sum
+
+
+def populate_tenant_ledger(apps, schema_editor):
+    """
+    Post an entry for every existing payment, plus an opening-balance
+    adjustment so each tenant's entries add up to the balance already stored.
+    """
+    Tenant = apps.get_model('pms', 'Tenant')
+    Payment = apps.get_model('pms', 'Payment')
+    TenantLedgerEntry = apps.get_model('pms', 'TenantLedgerEntry')
+
+    entries = [
+        TenantLedgerEntry(
+            tenant_id=tenant_id, lease_id=lease_id, payment_id=pk, entry_type='payment',
+            amount=-amount, posted_at=date, description=f'Payment {receipt}',
+        )
+        for pk, tenant_id, lease_id, amount, date, receipt in Payment.objects.values_list(
+            'pk', 'tenant_id', 'lease_id', 'amount', 'date', 'receipt_number',
+        ).iterator(chunk_size=2000)
+    ]
+    TenantLedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+    paid = dict(Payment.objects.values('tenant_id').annotate(total=Sum('amount')).values_list('tenant_id', 'total'))
+    openings = []
+    for pk, balance in Tenant.objects.values_list('pk', 'balance').iterator(chunk_size=2000):
+        opening = balance + paid.get(pk, 0)
+        if opening:
+            openings.append(TenantLedgerEntry(
+                tenant_id=pk, entry_type='adjustment', amount=opening, description='Opening balance',
+            ))
+    TenantLedgerEntry.objects.bulk_create(openings, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pms', '0006_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TenantLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_type', models.CharField(choices=[('charge', 'Charge'), ('payment', 'Payment'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('due_date', models.DateField(blank=True, null=True)),
+                ('posted_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('lease', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='pms.lease')),
+                ('payment', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entry', to='pms.payment')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='pms.tenant')),
+            ],
+            options={
+                'verbose_name_plural': 'tenant ledger entries',
+                'indexes': [models.Index(fields=['tenant', 'entry_type', '-due_date'], name='pms_tenantl_tenant__7fc119_idx'), models.Index(fields=['tenant', '-posted_at', '-id'], name='pms_tenantl_tenant__23a2be_idx')],
+            },
+        ),
+        migrations.RunPython(populate_tenant_ledger, migrations.RunPython.noop),
+    ]
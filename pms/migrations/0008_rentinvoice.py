@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pms', '0007_tenantledgerentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RentInvoice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateField()),
+                ('period_end', models.DateField()),
+                ('due_date', models.DateField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('lease', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='invoices', to='pms.lease')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='invoices', to='pms.tenant')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='tenantledgerentry',
+            name='invoice',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entry', to='pms.rentinvoice'),
+        ),
+        migrations.AddIndex(
+            model_name='rentinvoice',
+            index=models.Index(fields=['period_start'], name='pms_rentinv_period__18f069_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='rentinvoice',
+            constraint=models.UniqueConstraint(fields=('lease', 'period_start'), name='unique_lease_invoice_period'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:09
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pms', '0008_rentinvoice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaseSweepRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ran_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('as_of', models.DateField()),
+                ('expiring', models.IntegerField(default=0)),
+                ('terminated', models.IntegerField(default=0)),
+                ('units_vacated', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-ran_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='lease',
+            index=models.Index(fields=['status', 'end_date'], name='pms_lease_status_b1ff64_idx'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+from datetime import datetime, time
+from django.db.models import Max
+from django.utils import timezone
+
+
+def backfill_vacancy(apps, schema_editor):
+    """
+    Seed one history row per unit with its current status. Vacant units are
+    dated from the end of their last lease, or from creation if they never
+    had one.
+    """
+    Unit = apps.get_model('pms', 'Unit')
+    UnitStatusChange = apps.get_model('pms', 'UnitStatusChange')
+    tz = timezone.get_current_timezone()
+
+    last_lease_end = dict(
+        Unit.objects.filter(status='vacant', leases__isnull=False)
+        .values('pk').annotate(last_end=Max('leases__end_date')).values_list('pk', 'last_end')
+    )
+    changes = []
+    for pk, status, created_at in Unit.objects.values_list('pk', 'status', 'created_at').iterator(chunk_size=2000):
+        since = created_at
+        if status == 'vacant' and pk in last_lease_end:
+            since = max(created_at, timezone.make_aware(datetime.combine(last_lease_end[pk], time.min), tz))
+        if status == 'vacant':
+            Unit.objects.filter(pk=pk).update(vacant_since=since)
+        changes.append(UnitStatusChange(unit_id=pk, to_status=status, changed_at=since, reason='initial'))
+    UnitStatusChange.objects.bulk_create(changes, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pms', '0009_lease_lifecycle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnitStatusChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(blank=True, max_length=20)),
+                ('to_status', models.CharField(choices=[('occupied', 'Occupied'), ('vacant', 'Vacant'), ('maintenance', 'Under Maintenance')], max_length=20)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('reason', models.CharField(blank=True, max_length=50)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='unit',
+            name='vacant_since',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='unit',
+            index=models.Index(fields=['status', 'vacant_since'], name='pms_unit_status_828358_idx'),
+        ),
+        migrations.AddField(
+            model_name='unitstatuschange',
+            name='unit',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_changes', to='pms.unit'),
+        ),
+        migrations.AddIndex(
+            model_name='unitstatuschange',
+            index=models.Index(fields=['unit', '-changed_at'], name='pms_unitsta_unit_id_28ec40_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='unitstatuschange',
+            index=models.Index(fields=['to_status', 'changed_at'], name='pms_unitsta_to_stat_8da313_idx'),
+        ),
+        migrations.RunPython(backfill_vacancy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pms', '0010_unit_status_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropertyDailySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('occupied_units', models.IntegerField(default=0)),
+                ('vacant_units', models.IntegerField(default=0)),
+                ('maintenance_units', models.IntegerField(default=0)),
+                ('expected_rent', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('collected_rent', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('open_tickets', models.IntegerField(default=0)),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_snapshots', to='pms.property')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date'], name='pms_propert_date_190abc_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='propertydailysnapshot',
+            constraint=models.UniqueConstraint(fields=('property', 'date'), name='unique_property_daily_snapshot'),
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:44
+
+from django.db import migrations, models
+
+SQLITE_INDEX = [
+    "CREATE VIRTUAL TABLE pms_search USING fts5("
+    "title, body, content='pms_searchentry', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER pms_searchentry_ai AFTER INSERT ON pms_searchentry BEGIN "
+    "INSERT INTO pms_search(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+    "CREATE TRIGGER pms_searchentry_ad AFTER DELETE ON pms_searchentry BEGIN "
+    "INSERT INTO pms_search(pms_search, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); END",
+    "CREATE TRIGGER pms_searchentry_au AFTER UPDATE ON pms_searchentry BEGIN "
+    "INSERT INTO pms_search(pms_search, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); "
+    "INSERT INTO pms_search(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+]
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS pms_searchentry_au',
+    'DROP TRIGGER IF EXISTS pms_searchentry_ad',
+    'DROP TRIGGER IF EXISTS pms_searchentry_ai',
+    'DROP TABLE IF EXISTS pms_search',
+]
+POSTGRES_INDEX = [
+    "CREATE INDEX pms_searchentry_document_idx ON pms_searchentry USING gin (("
+    "setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B')))",
+]
+POSTGRES_DROP = ['DROP INDEX IF EXISTS pms_searchentry_document_idx']
+
+SOURCES = {
+    'tenant': ('Tenant', ('first_name', 'last_name'), ('id_passport_number', 'phone', 'email')),
+    'visitor': ('Visitor', ('name',), ('phone', 'vehicle_plate')),
+    'ticket': ('MaintenanceTicket', ('category',), ('description',)),
+    'property': ('Property', ('name',), ('address',)),
+}
+
+
+def _run(schema_editor, statements):
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def create_search_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_INDEX, 'postgresql': POSTGRES_INDEX})
+
+
+def drop_search_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_DROP, 'postgresql': POSTGRES_DROP})
+
+
+def populate_search_index(apps, schema_editor):
+    SearchEntry = apps.get_model('pms', 'SearchEntry')
+
+    def join(row, fields):
+        return ' '.join(str(row[field]) for field in fields if row[field])
+
+    for kind, (model_name, title, body) in SOURCES.items():
+        rows = apps.get_model('pms', model_name).objects.values('pk', *title, *body)
+        SearchEntry.objects.bulk_create(
+            (SearchEntry(kind=kind, object_id=row['pk'], title=join(row, title)[:255], body=join(row, body)) for row in rows.iterator()),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pms', '0012_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('tenant', 'Tenant'), ('visitor', 'Visitor'), ('ticket', 'Maintenance ticket'), ('property', 'Property')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('body', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name_plural': 'search entries',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='searchentry',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_search_entry'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(populate_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:48
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_visitors_inside(apps, schema_editor):
+    Property = apps.get_model('pms', 'Property')
+    Visitor = apps.get_model('pms', 'Visitor')
+    inside = (
+        Visitor.objects.filter(exit_time__isnull=True)
+        .values('unit_visiting__property_id').annotate(visitors=Count('id')).order_by()
+    )
+    for row in inside:
+        Property.objects.filter(pk=row['unit_visiting__property_id']).update(visitors_inside=row['visitors'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pms', '0013_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='visitors_inside',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='visitor',
+            index=models.Index(condition=models.Q(('exit_time__isnull', True)), fields=['unit_visiting', '-entry_time'], name='pms_visitor_open_idx'),
+        ),
+        migrations.RunPython(count_visitors_inside, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:03
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pms', '0014_gate_mode'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='tenant',
+            name='pms_tenant_first_n_ffa727_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='tenant',
+            name='pms_tenant_phone_9a56a6_idx',
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='pms_property_name_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tenant',
+            index=models.Index(django.db.models.functions.text.Lower('first_name'), name='pms_tenant_first_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tenant',
+            index=models.Index(django.db.models.functions.text.Lower('last_name'), name='pms_tenant_last_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tenant',
+            index=models.Index(django.db.models.functions.text.Lower('id_passport_number'), name='pms_tenant_id_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tenant',
+            index=models.Index(django.db.models.functions.text.Lower('phone'), name='pms_tenant_phone_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='unit',
+            index=models.Index(django.db.models.functions.text.Lower('unit_number'), name='pms_unit_number_lower_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+from django.db import migrations
+from django.utils import timezone
+
+EXPIRING_WITHIN_DAYS = 30
+OPEN_STATUSES = ('active', 'expiring')
+
+
+def sweep_existing_leases(apps, schema_editor):
+    # The first run of pms.lifecycle.sweep_leases, for leases saved before it existed.
+    Lease = apps.get_model('pms', 'Lease')
+    Unit = apps.get_model('pms', 'Unit')
+    UnitStatusChange = apps.get_model('pms', 'UnitStatusChange')
+    today = timezone.localdate()
+    now = timezone.now()
+
+    ended = Lease.objects.filter(status__in=OPEN_STATUSES, end_date__lt=today)
+    unit_ids = set(ended.values_list('unit_id', flat=True))
+    ended.update(status='terminated', updated_at=now)
+    vacated = list(
+        Unit.objects.filter(pk__in=unit_ids, status='occupied')
+        .exclude(leases__status__in=OPEN_STATUSES)
+        .values_list('pk', flat=True)
+    )
+    Unit.objects.filter(pk__in=vacated).update(status='vacant', vacant_since=now, updated_at=now)
+    UnitStatusChange.objects.bulk_create([
+        UnitStatusChange(unit_id=pk, from_status='occupied', to_status='vacant', changed_at=now, reason='lease_ended')
+        for pk in vacated
+    ])
+
+    Lease.objects.filter(
+        status='active', end_date__lte=today + timedelta(days=EXPIRING_WITHIN_DAYS),
+    ).update(status='expiring', updated_at=now)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pms', '0015_lookup_lower_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(sweep_existing_leases, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,42 @@
 from django.db import models
+from django.db.models import Case, Count, DecimalField, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Lower
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+class PropertyQuerySet(models.QuerySet):
+    def with_unit_stats(self):
+        """
+        Annotate each property with unit counts by status, occupancy rate and
+        the expected monthly rent of its open leases, in a single grouped
+        query.
+        """
+        active_rent = (
+            Lease.objects
+            .filter(unit__property=OuterRef('pk'), status__in=Lease.OPEN_STATUSES)
+            .order_by()
+            .values('unit__property')
+            .annotate(total=Sum('monthly_rent'))
+            .values('total')
+        )
+        return self.annotate(
+            unit_count=Count('units'),
+            occupied_units=Count('units', filter=Q(units__status='occupied')),
+            vacant_units=Count('units', filter=Q(units__status='vacant')),
+            maintenance_units=Count('units', filter=Q(units__status='maintenance')),
+            expected_monthly_rent=Coalesce(
+                Subquery(active_rent, output_field=DecimalField(max_digits=14, decimal_places=2)),
+                Value(0),
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            ),
+        ).annotate(
+            occupancy_rate=Case(
+                When(unit_count=0, then=Value(0.0)),
+                default=F('occupied_units') * 100.0 / F('unit_count'),
+                output_field=FloatField(),
+            ),
+        )
+
 class Property(models.Model):
     STATUS_CHOICES = (
         ('active', 'Active'),
@@ -14,6 +49,19 @@ class Property(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Visitors checked in and not yet out. Kept equal to the open visits
+    # by pms.gate.
+    visitors_inside = models.IntegerField(default=0, editable=False)
+
+    objects = PropertyQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['name']),
+            models.Index(fields=['updated_at']),
+            # Case-insensitive prefix lookups (pms.lookups.prefix_q).
+            models.Index(Lower('name'), name='pms_property_name_lower_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -39,15 +87,41 @@ class Unit(models.Model):
     water_meter = models.CharField(max_length=100, blank=True)
     electricity_meter = models.CharField(max_length=100, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # When the unit last became vacant; None while it is not vacant. Kept in
+    # step with UnitStatusChange by pms.occupancy.
+    vacant_since = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         indexes = [
             models.Index(fields=['status']),
+            models.Index(fields=['unit_number']),
+            models.Index(Lower('unit_number'), name='pms_unit_number_lower_idx'),
+            models.Index(fields=['property', 'unit_number', 'id']),
+            models.Index(fields=['status', 'vacant_since']),
+            models.Index(fields=['updated_at']),
         ]
 
     def __str__(self):
         return f"{self.property.name} - {self.unit_number}"
 
+class UnitStatusChange(models.Model):
+    """One transition of ``Unit.status``; ``from_status`` is blank for a new unit."""
+    unit = models.ForeignKey(Unit, on_delete=models.CASCADE, related_name='status_changes')
+    from_status = models.CharField(max_length=20, blank=True)
+    to_status = models.CharField(max_length=20, choices=Unit.STATUS_CHOICES)
+    changed_at = models.DateTimeField(default=timezone.now)
+    reason = models.CharField(max_length=50, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['unit', '-changed_at']),
+            models.Index(fields=['to_status', 'changed_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.unit_id}: {self.from_status or 'new'} -> {self.to_status}"
+
 class Tenant(models.Model):
     STATUS_CHOICES = (
         ('active', 'Active'),
@@ -66,10 +140,17 @@ class Tenant(models.Model):
     rent_due_date = models.DateField(null=True, blank=True)
     balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         indexes = [
             models.Index(fields=['rent_due_date']),
+            models.Index(fields=['last_name', 'first_name', 'id']),
+            models.Index(Lower('first_name'), name='pms_tenant_first_lower_idx'),
+            models.Index(Lower('last_name'), name='pms_tenant_last_lower_idx'),
+            models.Index(Lower('id_passport_number'), name='pms_tenant_id_lower_idx'),
+            models.Index(Lower('phone'), name='pms_tenant_phone_lower_idx'),
+            models.Index(fields=['updated_at']),
         ]
 
     def __str__(self):
@@ -81,6 +162,8 @@ class Lease(models.Model):
         ('expiring', 'Expiring'),
         ('terminated', 'Terminated'),
     )
+    # Statuses of a lease that is still running (and billed).
+    OPEN_STATUSES = ('active', 'expiring')
     tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='leases')
     unit = models.ForeignKey(Unit, on_delete=models.CASCADE, related_name='leases')
     start_date = models.DateField()
@@ -90,10 +173,12 @@ class Lease(models.Model):
     payment_frequency = models.CharField(max_length=50, default='Monthly')
     lease_agreement = models.FileField(upload_to='leases/', blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         indexes = [
-            models.Index(fields=['end_date']),
+            models.Index(fields=['end_date', 'id']),
+            models.Index(fields=['status', 'end_date']),
         ]
 
     def __str__(self):
@@ -117,10 +202,12 @@ class Payment(models.Model):
     method = models.CharField(max_length=10, choices=METHOD_CHOICES)
     receipt_number = models.CharField(max_length=100, unique=True)
     notes = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         indexes = [
-            models.Index(fields=['date']),
+            models.Index(fields=['-date', '-id']),
+            models.Index(fields=['updated_at']),
         ]
 
     def __str__(self):
@@ -160,6 +247,11 @@ class MaintenanceTicket(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id']),
+        ]
+
     def __str__(self):
         return f"Ticket {self.id}: {self.category} at {self.unit.unit_number}"
 
@@ -172,6 +264,174 @@ class Visitor(models.Model):
     entry_time = models.DateTimeField(default=timezone.now)
     exit_time = models.DateTimeField(null=True, blank=True)
     security_guard_name = models.CharField(max_length=255, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-entry_time', '-id']),
+            models.Index(fields=['updated_at']),
+            # Only the visits still open: as small as the crowd inside,
+            # however long the visit history grows.
+            models.Index(
+                fields=['unit_visiting', '-entry_time'], condition=models.Q(exit_time__isnull=True),
+                name='pms_visitor_open_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"Visitor: {self.name} to {self.unit_visiting}"
+
+class PropertyMonthlyLedger(models.Model):
+    """
+    Per-property monthly rollup of payments and expenses.
+
+    Kept in sync incrementally by the signals in ``pms.signals``; payments
+    without a lease are booked against ``property=None``. Rebuild it from
+    scratch with ``manage.py rebuild_ledger``.
+    """
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='monthly_ledger', null=True, blank=True)
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    expenses = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payment_count = models.IntegerField(default=0)
+    expense_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['property', 'year', 'month'], name='unique_property_month_ledger'),
+            models.UniqueConstraint(
+                fields=['year', 'month'],
+                condition=models.Q(property__isnull=True),
+                name='unique_unassigned_month_ledger',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['year', 'month']),
+        ]
+
+    def __str__(self):
+        return f"{self.property or 'Unassigned'} {self.year}-{self.month:02d}"
+
+class RentInvoice(models.Model):
+    """
+    Rent billed to a lease for one billing period. Created by the billing
+    run in ``pms.billing``; the unique (lease, period_start) constraint is
+    what makes re-running it safe.
+    """
+    lease = models.ForeignKey(Lease, on_delete=models.CASCADE, related_name='invoices')
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='invoices')
+    period_start = models.DateField()
+    period_end = models.DateField()
+    due_date = models.DateField()
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['lease', 'period_start'], name='unique_lease_invoice_period'),
+        ]
+        indexes = [
+            models.Index(fields=['period_start']),
+        ]
+
+    def __str__(self):
+        return f"Invoice {self.lease_id} {self.period_start} - {self.amount}"
+
+class TenantLedgerEntry(models.Model):
+    """
+    One line of a tenant's account: a rent charge, a payment or a manual
+    adjustment. Amounts are signed from the tenant's side -- charges are
+    positive, payments negative -- so ``Tenant.balance`` always equals the
+    sum of the tenant's entries. See ``pms.balances``.
+    """
+    ENTRY_TYPES = (
+        ('charge', 'Charge'),
+        ('payment', 'Payment'),
+        ('adjustment', 'Adjustment'),
+    )
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='ledger_entries')
+    lease = models.ForeignKey(Lease, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries')
+    payment = models.OneToOneField(Payment, on_delete=models.CASCADE, null=True, blank=True, related_name='ledger_entry')
+    invoice = models.OneToOneField(RentInvoice, on_delete=models.CASCADE, null=True, blank=True, related_name='ledger_entry')
+    entry_type = models.CharField(max_length=20, choices=ENTRY_TYPES)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    due_date = models.DateField(null=True, blank=True)
+    posted_at = models.DateTimeField(default=timezone.now)
+    description = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'tenant ledger entries'
+        indexes = [
+            models.Index(fields=['tenant', 'entry_type', '-due_date']),
+            models.Index(fields=['tenant', '-posted_at', '-id']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_entry_type_display()} {self.amount} for {self.tenant}"
+
+class LeaseSweepRun(models.Model):
+    """Row counts from one run of the lease lifecycle sweeper (``pms.lifecycle``)."""
+    ran_at = models.DateTimeField(default=timezone.now)
+    as_of = models.DateField()
+    expiring = models.IntegerField(default=0)
+    terminated = models.IntegerField(default=0)
+    units_vacated = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['-ran_at']
+
+    def __str__(self):
+        return f"Sweep {self.as_of}: {self.expiring} expiring, {self.terminated} terminated"
+
+class PropertyDailySnapshot(models.Model):
+    """
+    End-of-day occupancy and rent figures for one property, written by
+    ``manage.py snapshot_properties`` so trend reports read stored rows
+    instead of recomputing history.
+    """
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='daily_snapshots')
+    date = models.DateField()
+    occupied_units = models.IntegerField(default=0)
+    vacant_units = models.IntegerField(default=0)
+    maintenance_units = models.IntegerField(default=0)
+    expected_rent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    collected_rent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    open_tickets = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['property', 'date'], name='unique_property_daily_snapshot'),
+        ]
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+
+    def __str__(self):
+        return f"{self.property} {self.date}"
+
+class SearchEntry(models.Model):
+    """
+    The searchable text of one tenant, visitor, maintenance ticket or
+    property, kept by the signals in ``pms.signals`` and indexed by the
+    database's full-text engine (``pms.search``).
+    """
+    KINDS = [
+        ('tenant', 'Tenant'),
+        ('visitor', 'Visitor'),
+        ('ticket', 'Maintenance ticket'),
+        ('property', 'Property'),
+    ]
+    kind = models.CharField(max_length=20, choices=KINDS)
+    object_id = models.BigIntegerField()
+    title = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name_plural = 'search entries'
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_entry'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.title}"
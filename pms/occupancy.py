@@ -0,0 +1,96 @@
+"""
+Unit status history and the vacancy queries built on it.
+
+Every change of ``Unit.status`` is recorded as a ``UnitStatusChange`` row,
+and ``Unit.vacant_since`` is set while a unit is vacant. Single-unit saves
+(forms, admin) are recorded by the ``Unit`` signals in ``pms.signals``.
+Set-based changes (lease start, the lease sweeper) go through
+``set_units_status``, which records the history for the whole set.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .models import Unit, UnitStatusChange
+
+
+def set_units_status(unit_ids, status, reason='', at=None):
+    """
+    Move the units in ``unit_ids`` that are not already in ``status`` to
+    ``status``, recording a history row for each. Returns the number of
+    units changed.
+    """
+    at = at or timezone.now()
+    with transaction.atomic():
+        current = list(
+            Unit.objects.filter(pk__in=unit_ids).exclude(status=status).values_list('pk', 'status')
+        )
+        if not current:
+            return 0
+        Unit.objects.filter(pk__in=[pk for pk, _ in current]).update(
+            status=status, vacant_since=at if status == 'vacant' else None, updated_at=timezone.now(),
+        )
+        UnitStatusChange.objects.bulk_create([
+            UnitStatusChange(unit_id=pk, from_status=previous, to_status=status, changed_at=at, reason=reason)
+            for pk, previous in current
+        ])
+    return len(current)
+
+
+def long_vacant_q(days=30, now=None):
+    """``Q`` for units vacant for at least ``days``; an index range on (status, vacant_since)."""
+    now = now or timezone.now()
+    return Q(status='vacant', vacant_since__lte=now - timedelta(days=days))
+
+
+def turnover(start, end, property_id=None):
+    """
+    Count move-ins (changes to occupied) and move-outs (occupied to anything
+    else) between the datetimes ``start`` and ``end``.
+    """
+    changes = UnitStatusChange.objects.filter(changed_at__gte=start, changed_at__lt=end)
+    if property_id is not None:
+        changes = changes.filter(unit__property_id=property_id)
+    return changes.aggregate(
+        move_ins=Count('id', filter=Q(to_status='occupied')),
+        move_outs=Count('id', filter=Q(from_status='occupied')),
+    )
+
+
+def _with_status_at(units, moment):
+    last_change = (
+        UnitStatusChange.objects
+        .filter(unit=OuterRef('pk'), changed_at__lte=moment)
+        .order_by('-changed_at', '-id')
+        .values('to_status')[:1]
+    )
+    return units.annotate(status_then=Subquery(last_change)).filter(status_then__isnull=False)
+
+
+def statuses_at(moment, property_id=None):
+    """
+    Return ``{status: unit_count}`` as of ``moment``, from each unit's last
+    history row at or before it. Each lookup is a seek on (unit, -changed_at).
+    Units created after ``moment`` are left out.
+    """
+    units = Unit.objects.all()
+    if property_id is not None:
+        units = units.filter(property_id=property_id)
+    rows = _with_status_at(units, moment).values('status_then').annotate(units=Count('id')).order_by()
+    return {row['status_then']: row['units'] for row in rows}
+
+
+def statuses_by_property_at(moment):
+    """Like ``statuses_at`` for every property at once: ``{property_id: {status: unit_count}}``."""
+    rows = (
+        _with_status_at(Unit.objects.all(), moment)
+        .values('property_id', 'status_then')
+        .annotate(units=Count('id'))
+        .order_by()
+    )
+    counts = {}
+    for row in rows:
+        counts.setdefault(row['property_id'], {})[row['status_then']] = row['units']
+    return counts
@@ -0,0 +1,158 @@
+"""
+Keyset (cursor) pagination for the list views.
+
+Instead of ``OFFSET n`` -- which makes the database walk and discard every
+earlier row -- each page is fetched with a ``WHERE (a, b) < (x, y)``
+predicate on the list's ordering columns, so page 1000 costs the same
+index range scan as page 1. The ordering must end in a unique column
+(normally ``id``) and should be backed by a matching composite index.
+"""
+import base64
+import json
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import Q
+
+PAGE_SIZE = 50
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _json_default(value):
+    # Full-precision isoformat: DjangoJSONEncoder truncates datetimes to
+    # milliseconds, which would skip or repeat rows sharing a millisecond.
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'Cannot encode {type(value).__name__} in a cursor')
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, default=_json_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursor(cursor) from exc
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor(cursor)
+    return values
+
+
+def _parse_ordering(ordering):
+    return [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+
+
+def keyset_filter(ordering, values, forward=True):
+    """
+    Build the ``Q`` selecting rows strictly after (``forward``) or before the
+    row whose ordering columns equal ``values``.
+    """
+    columns = _parse_ordering(ordering)
+    q = Q()
+    equal = {}
+    for (field, descending), value in zip(columns, values):
+        # Moving forward through a descending column means smaller values.
+        lookup = 'lt' if descending == forward else 'gt'
+        q |= Q(**equal, **{f'{field}__{lookup}': value})
+        equal[field] = value
+    # Redundant bound on the leading column so the planner can start an
+    # index range scan instead of evaluating the OR chain row by row.
+    field, descending = columns[0]
+    return Q(**{f"{field}__{'lte' if descending == forward else 'gte'}": values[0]}) & q
+
+
+class KeysetPage:
+    def __init__(self, object_list, ordering, params, has_next, has_previous):
+        self.object_list = object_list
+        self.ordering = ordering
+        self.params = params
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def _cursor(self, obj):
+        return encode_cursor([getattr(obj, field) for field, _ in _parse_ordering(self.ordering)])
+
+    def _query(self, **cursor):
+        params = self.params.copy()
+        params.pop('after', None)
+        params.pop('before', None)
+        params.update(cursor)
+        return params.urlencode()
+
+    @property
+    def next_query(self):
+        if not self.has_next:
+            return ''
+        return self._query(after=self._cursor(self.object_list[-1]))
+
+    @property
+    def previous_query(self):
+        if not self.has_previous:
+            return ''
+        return self._query(before=self._cursor(self.object_list[0]))
+
+    @property
+    def first_query(self):
+        return self._query()
+
+
+def _page_queryset(request, queryset, ordering):
+    after = before = None
+    try:
+        if 'after' in request.GET:
+            after = decode_cursor(request.GET['after'], len(ordering))
+        elif 'before' in request.GET:
+            before = decode_cursor(request.GET['before'], len(ordering))
+    except InvalidCursor:
+        after = before = None
+
+    if before is not None:
+        reverse = [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+        queryset = queryset.filter(keyset_filter(ordering, before, forward=False)).order_by(*reverse)
+    else:
+        queryset = queryset.order_by(*ordering)
+        if after is not None:
+            queryset = queryset.filter(keyset_filter(ordering, after))
+    return queryset, after, before
+
+
+def _page(request, rows, ordering, per_page, after, before):
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if before is None:
+        return KeysetPage(rows, ordering, request.GET, has_next=more, has_previous=after is not None)
+    rows.reverse()
+    return KeysetPage(rows, ordering, request.GET, has_next=True, has_previous=more)
+
+
+def keyset_paginate(request, queryset, ordering, per_page=PAGE_SIZE):
+    """
+    Return a ``KeysetPage`` of ``queryset`` ordered by ``ordering`` (a
+    sequence of attribute names, ``-`` prefixed for descending), positioned
+    by the ``after``/``before`` cursor in ``request.GET``. Invalid cursors
+    fall back to the first page.
+    """
+    queryset, after, before = _page_queryset(request, queryset, ordering)
+    return _page(request, list(queryset[:per_page + 1]), ordering, per_page, after, before)
+
+
+async def akeyset_paginate(request, queryset, ordering, per_page=PAGE_SIZE):
+    """Async ``keyset_paginate``, fetching the page with the async ORM."""
+    queryset, after, before = _page_queryset(request, queryset, ordering)
+    rows = [row async for row in queryset[:per_page + 1]]
+    return _page(request, rows, ordering, per_page, after, before)
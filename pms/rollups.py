@@ -0,0 +1,209 @@
+"""
+Incremental maintenance of the ``PropertyMonthlyLedger`` rollup.
+
+Payments and expenses are booked into the ledger as signed deltas applied
+with ``F()`` expressions, so concurrent writers never lose an update and
+the dashboard can read a handful of monthly rows instead of summing every
+payment.
+"""
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+from django.utils import timezone
+
+from .models import Lease, Payment, Expense, PropertyMonthlyLedger
+
+ZERO = Decimal('0')
+
+
+def period_of(value):
+    """Return the (year, month) a payment datetime or expense date falls in."""
+    if isinstance(value, datetime) and timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.year, value.month
+
+
+def apply_delta(property_id, year, month, revenue=ZERO, expenses=ZERO, payment_count=0, expense_count=0):
+    """Add the given deltas to one ledger row, creating the row if needed."""
+    changes = {
+        'revenue': F('revenue') + revenue,
+        'expenses': F('expenses') + expenses,
+        'payment_count': F('payment_count') + payment_count,
+        'expense_count': F('expense_count') + expense_count,
+    }
+    rows = PropertyMonthlyLedger.objects.filter(property_id=property_id, year=year, month=month)
+    with transaction.atomic():
+        if rows.update(**changes):
+            return
+        if payment_count < 0 or expense_count < 0:
+            # Nothing to reverse: the row went away with its property.
+            return
+        try:
+            with transaction.atomic():
+                PropertyMonthlyLedger.objects.create(
+                    property_id=property_id, year=year, month=month,
+                    revenue=revenue, expenses=expenses,
+                    payment_count=payment_count, expense_count=expense_count,
+                )
+        except IntegrityError:
+            # A concurrent writer created the row between our update and insert.
+            rows.update(**changes)
+
+
+# Payments
+
+def payment_entry(payment):
+    """Return the (property_id, year, month, amount) a payment is booked under."""
+    property_id = None
+    if payment.lease_id:
+        property_id = Lease.objects.filter(pk=payment.lease_id).values_list('unit__property_id', flat=True).first()
+    year, month = period_of(payment.date)
+    return property_id, year, month, payment.amount
+
+
+def stored_payment_entry(pk):
+    """Return the ledger entry for the payment as currently stored, or None."""
+    row = Payment.objects.filter(pk=pk).values('amount', 'date', 'lease__unit__property_id').first()
+    if row is None:
+        return None
+    year, month = period_of(row['date'])
+    return row['lease__unit__property_id'], year, month, row['amount']
+
+
+def book_payment(entry, sign=1):
+    property_id, year, month, amount = entry
+    apply_delta(property_id, year, month, revenue=sign * amount, payment_count=sign)
+
+
+def unbook_deleted_payment(entry, lease_id):
+    """
+    Take a deleted payment off the ledger. ``entry`` and ``lease_id`` were
+    read before the delete. If a cascade deleted its lease first,
+    ``unassign_payments`` has already moved it to the unassigned rows.
+    """
+    if lease_id is not None and not Lease.objects.filter(pk=lease_id).exists():
+        entry = (None, *entry[1:])
+    book_payment(entry, sign=-1)
+
+
+def rebook_payment(previous, current):
+    """Move a payment from its previous ledger entry to its current one."""
+    if previous == current:
+        return
+    with transaction.atomic():
+        if previous is not None:
+            book_payment(previous, sign=-1)
+        book_payment(current)
+
+
+def stored_lease_payments(lease_id):
+    """Return the property a lease's payments are booked under and their ids, before the lease is deleted."""
+    property_id = Lease.objects.filter(pk=lease_id).values_list('unit__property_id', flat=True).first()
+    return property_id, list(Payment.objects.filter(lease_id=lease_id).values_list('pk', flat=True))
+
+
+def unassign_payments(property_id, payment_ids):
+    """
+    Move the payments of a deleted lease from its property's rows to the
+    unassigned ones, where ``rebuild_ledger`` books them. Deleting a lease
+    nulls ``Payment.lease`` with an UPDATE that sends no save signals.
+    Payments the same cascade deletes are moved too if they still exist;
+    ``unbook_deleted_payment`` then takes them off the unassigned rows.
+    """
+    if not payment_ids:
+        return
+    totals = _grouped_totals(Payment.objects.filter(pk__in=payment_ids), 'lease_id', 'date')
+    with transaction.atomic():
+        for row in totals:
+            year, month = row['ledger_year'], row['ledger_month']
+            apply_delta(property_id, year, month, revenue=-row['total'], payment_count=-row['rows'])
+            apply_delta(None, year, month, revenue=row['total'], payment_count=row['rows'])
+
+
+# Expenses
+
+def expense_entry(expense):
+    year, month = period_of(expense.date)
+    return expense.property_id, year, month, expense.amount
+
+
+def stored_expense_entry(pk):
+    row = Expense.objects.filter(pk=pk).values('property_id', 'date', 'amount').first()
+    if row is None:
+        return None
+    year, month = period_of(row['date'])
+    return row['property_id'], year, month, row['amount']
+
+
+def book_expense(entry, sign=1):
+    property_id, year, month, amount = entry
+    apply_delta(property_id, year, month, expenses=sign * amount, expense_count=sign)
+
+
+def rebook_expense(previous, current):
+    if previous == current:
+        return
+    with transaction.atomic():
+        if previous is not None:
+            book_expense(previous, sign=-1)
+        book_expense(current)
+
+
+# Full rebuild
+
+def _grouped_totals(queryset, property_field, date_field, amount_field='amount'):
+    return (
+        queryset
+        .annotate(ledger_year=ExtractYear(date_field), ledger_month=ExtractMonth(date_field))
+        .values(property_field, 'ledger_year', 'ledger_month')
+        .annotate(total=Sum(amount_field), rows=Count('id'))
+        .order_by()
+    )
+
+
+def rebuild_ledger(property_ids=None, include_unassigned=True):
+    """
+    Recompute the ledger rows for ``property_ids`` (and, optionally, for
+    payments without a lease) with one grouped query per model.
+
+    Returns the number of ledger rows written.
+    """
+    buckets = defaultdict(lambda: {
+        'revenue': ZERO, 'expenses': ZERO, 'payment_count': 0, 'expense_count': 0,
+    })
+    payments = Payment.objects.filter(lease__isnull=False)
+    expenses = Expense.objects.all()
+    if property_ids is not None:
+        payments = payments.filter(lease__unit__property_id__in=property_ids)
+        expenses = expenses.filter(property_id__in=property_ids)
+    unassigned = Payment.objects.filter(lease__isnull=True) if include_unassigned else Payment.objects.none()
+
+    for row in _grouped_totals(payments, 'lease__unit__property_id', 'date'):
+        bucket = buckets[(row['lease__unit__property_id'], row['ledger_year'], row['ledger_month'])]
+        bucket['revenue'] += row['total']
+        bucket['payment_count'] += row['rows']
+    for row in _grouped_totals(unassigned, 'lease_id', 'date'):
+        bucket = buckets[(None, row['ledger_year'], row['ledger_month'])]
+        bucket['revenue'] += row['total']
+        bucket['payment_count'] += row['rows']
+    for row in _grouped_totals(expenses, 'property_id', 'date'):
+        bucket = buckets[(row['property_id'], row['ledger_year'], row['ledger_month'])]
+        bucket['expenses'] += row['total']
+        bucket['expense_count'] += row['rows']
+
+    with transaction.atomic():
+        stale = PropertyMonthlyLedger.objects.filter(property__isnull=False)
+        if property_ids is not None:
+            stale = stale.filter(property_id__in=property_ids)
+        stale.delete()
+        if include_unassigned:
+            PropertyMonthlyLedger.objects.filter(property__isnull=True).delete()
+        PropertyMonthlyLedger.objects.bulk_create([
+            PropertyMonthlyLedger(property_id=property_id, year=year, month=month, **totals)
+            for (property_id, year, month), totals in buckets.items()
+        ])
+    return len(buckets)
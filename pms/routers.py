@@ -0,0 +1,122 @@
+"""
+Read-replica routing for the read-only views.
+
+``ReplicaRoutingMiddleware`` marks GET and HEAD requests to the views
+named in ``PMS_REPLICA_VIEWS``; ``ReplicaRouter`` then sends their reads to
+the ``PMS_READ_REPLICA`` database alias. Everything else, and every write,
+uses ``default``.
+
+A replica lags the primary, so reads stay on the primary:
+
+* for the rest of a request once it has written anything;
+* inside a transaction;
+* for the auth and session tables, so a fresh login is seen at once;
+* for ``PMS_REPLICA_STICKY_SECONDS`` after a client's last write, tracked by
+  a cookie, so users see their own changes on the next page.
+
+With ``PMS_READ_REPLICA`` unset the router does nothing.
+"""
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+STICKY_COOKIE = 'pms_primary_until'
+PRIMARY_APPS = {'auth', 'contenttypes', 'sessions'}
+
+current_routing = ContextVar('pms_replica_routing', default=None)
+
+
+@dataclass
+class RoutingState:
+    sticky: bool = False
+    use_replica: bool = False
+    wrote: bool = False
+
+
+def replica_alias():
+    return getattr(settings, 'PMS_READ_REPLICA', None)
+
+
+def is_sticky(request):
+    """True while the client is inside the sticky window after a write."""
+    try:
+        return int(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = current_routing.get()
+        alias = replica_alias()
+        if not alias or state is None or not state.use_replica or state.sticky or state.wrote:
+            return None
+        if model._meta.app_label in PRIMARY_APPS or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        state = current_routing.get()
+        if state is not None:
+            state.wrote = True
+        # Explicit, or Django would save an instance read from the replica
+        # back to the replica.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Decide per request whether ``ReplicaRouter`` may use the replica, and
+    start the client's sticky window when the request wrote. Works in sync
+    and async stacks.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RoutingState(sticky=is_sticky(request))
+        token = current_routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        return self.finish(response, state)
+
+    async def __acall__(self, request):
+        state = RoutingState(sticky=is_sticky(request))
+        token = current_routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        return self.finish(response, state)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = current_routing.get()
+        if state is not None and request.method in ('GET', 'HEAD'):
+            state.use_replica = request.resolver_match.url_name in getattr(settings, 'PMS_REPLICA_VIEWS', ())
+
+    def finish(self, response, state):
+        if state.wrote and replica_alias():
+            seconds = getattr(settings, 'PMS_REPLICA_STICKY_SECONDS', 10)
+            response.set_cookie(
+                STICKY_COOKIE, str(int(time.time()) + seconds), max_age=seconds, httponly=True, samesite='Lax',
+            )
+        return response
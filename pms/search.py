@@ -0,0 +1,171 @@
+"""
+Full-text search over tenants, visitors, maintenance tickets and properties.
+
+Each searchable row has one ``SearchEntry``: its kind and primary key, a
+``title`` (the name shown in results) and a ``body`` with the other
+searched fields (see ``SOURCES``). The signals in ``pms.signals`` rewrite a
+row's entry when it is saved and drop it when it is deleted. ``manage.py
+rebuild_search_index`` rebuilds them all, e.g. after ``bulk_create`` or
+``loaddata``, which send no signals.
+
+The entries are indexed by the database's own full-text engine, so a
+search reads an index instead of running ``LIKE '%x%'`` over every table:
+
+* SQLite: the FTS5 table ``pms_search``, an external-content index over
+  ``pms_searchentry`` kept in step by triggers (migration 0013). Ranked
+  with ``bm25()``, title matches above body matches.
+* Postgres: a GIN index on the entries' weighted ``tsvector``, ranked with
+  ``ts_rank``.
+* Other databases fall back to unranked ``icontains``.
+
+Every word of a query must match the start of a word of the entry, so
+``kel apa`` finds "Kelvin Apartments" and part of a plate or phone number
+is enough.
+"""
+import re
+
+from django.db import connections, transaction
+from django.db.models import Q
+from django.http import JsonResponse
+from django.urls import reverse
+
+from .lookups import page_params
+from .models import MaintenanceTicket, Property, SearchEntry, Tenant, Visitor
+
+# kind: (model, title fields, body fields)
+SOURCES = {
+    'tenant': (Tenant, ('first_name', 'last_name'), ('id_passport_number', 'phone', 'email')),
+    'visitor': (Visitor, ('name',), ('phone', 'vehicle_plate')),
+    'ticket': (MaintenanceTicket, ('category',), ('description',)),
+    'property': (Property, ('name',), ('address',)),
+}
+KIND_BY_MODEL = {model: kind for kind, (model, _, _) in SOURCES.items()}
+
+FTS_TABLE = 'pms_search'
+# bm25() weights of the title and body columns.
+FTS_WEIGHTS = (10.0, 1.0)
+# Must match the expression of the GIN index, or Postgres will not use it.
+PG_DOCUMENT = "setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B')"
+MAX_TERMS = 8
+BATCH_SIZE = 1000
+
+TERM = re.compile(r'[^\W_]+')
+
+
+def terms(query):
+    return TERM.findall(query.lower())[:MAX_TERMS]
+
+
+def _join(obj, fields):
+    return ' '.join(str(value) for value in (getattr(obj, field) for field in fields) if value)
+
+
+def entry_for(obj):
+    """The unsaved ``SearchEntry`` of ``obj``, a model instance listed in ``SOURCES``."""
+    kind = KIND_BY_MODEL[type(obj)]
+    _, title, body = SOURCES[kind]
+    return SearchEntry(kind=kind, object_id=obj.pk, title=_join(obj, title)[:255], body=_join(obj, body))
+
+
+def _write(entries):
+    # One INSERT ... ON CONFLICT DO UPDATE per batch, which fires the FTS
+    # triggers like a plain insert or update would.
+    SearchEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, update_conflicts=True,
+        unique_fields=['kind', 'object_id'], update_fields=['title', 'body'],
+    )
+
+
+def index_object(obj):
+    _write([entry_for(obj)])
+
+
+def unindex_object(obj):
+    SearchEntry.objects.filter(kind=KIND_BY_MODEL[type(obj)], object_id=obj.pk).delete()
+
+
+def rebuild_index(log=None):
+    """Replace every ``SearchEntry`` with one built from the current rows; returns ``{kind: entries}``."""
+    counts = {}
+    with transaction.atomic():
+        SearchEntry.objects.all().delete()
+        for kind, (model, title, body) in SOURCES.items():
+            batch = []
+            counts[kind] = 0
+            for obj in model.objects.only('pk', *title, *body).iterator(chunk_size=BATCH_SIZE):
+                batch.append(entry_for(obj))
+                if len(batch) == BATCH_SIZE:
+                    _write(batch)
+                    counts[kind] += len(batch)
+                    batch = []
+            _write(batch)
+            counts[kind] += len(batch)
+            if log:
+                log(f'{counts[kind]} {kind} entries')
+    connection = connections[SearchEntry.objects.db]
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            # Merge the index segments the bulk inserts left behind.
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return counts
+
+
+def search(query, kinds=None, limit=20, offset=0):
+    """
+    The ``SearchEntry`` rows matching every word of ``query``, best match
+    first, optionally only those of ``kinds``.
+    """
+    words = terms(query)
+    if not words:
+        return []
+    entries = SearchEntry.objects.all()
+    vendor = connections[entries.db].vendor
+    table = SearchEntry._meta.db_table
+    kind_sql, kind_params = '', []
+    if kinds:
+        kind_sql = f" AND e.kind IN ({', '.join(['%s'] * len(kinds))})"
+        kind_params = list(kinds)
+
+    if vendor == 'sqlite':
+        match = ' '.join(f'"{word}"*' for word in words)
+        sql = (
+            f'SELECT e.id, e.kind, e.object_id, e.title, e.body FROM {FTS_TABLE} '
+            f'JOIN {table} e ON e.id = {FTS_TABLE}.rowid '
+            f'WHERE {FTS_TABLE} MATCH %s{kind_sql} '
+            f'ORDER BY bm25({FTS_TABLE}, {", ".join(map(str, FTS_WEIGHTS))}), e.id LIMIT %s OFFSET %s'
+        )
+        return list(entries.raw(sql, [match, *kind_params, limit, offset]))
+    if vendor == 'postgresql':
+        tsquery = ' & '.join(f'{word}:*' for word in words)
+        sql = (
+            f"SELECT e.id, e.kind, e.object_id, e.title, e.body FROM {table} e "
+            f"WHERE ({PG_DOCUMENT}) @@ to_tsquery('simple', %s){kind_sql} "
+            f"ORDER BY ts_rank({PG_DOCUMENT}, to_tsquery('simple', %s)) DESC, e.id LIMIT %s OFFSET %s"
+        )
+        return list(entries.raw(sql, [tsquery, *kind_params, tsquery, limit, offset]))
+
+    if kinds:
+        entries = entries.filter(kind__in=kinds)
+    for word in words:
+        entries = entries.filter(Q(title__icontains=word) | Q(body__icontains=word))
+    return list(entries.order_by('title', 'id')[offset:offset + limit])
+
+
+def result_url(entry):
+    if entry.kind == 'property':
+        return reverse('property_detail', args=[entry.object_id])
+    return reverse({'tenant': 'tenant_list', 'visitor': 'visitor_list', 'ticket': 'ticket_list'}[entry.kind])
+
+
+def search_response(request):
+    """``{"results": [{"kind", "id", "title", "text", "url"}], "more": bool}`` for ``?q=``, paginated like the lookups."""
+    page, size = page_params(request)
+    kinds = [kind for kind in request.GET.getlist('kind') if kind in SOURCES]
+    entries = search(request.GET.get('q', ''), kinds, limit=size + 1, offset=(page - 1) * size)
+    return JsonResponse({
+        'results': [
+            {'kind': entry.kind, 'id': entry.object_id, 'title': entry.title, 'text': entry.body, 'url': result_url(entry)}
+            for entry in entries[:size]
+        ],
+        'more': len(entries) > size,
+    })
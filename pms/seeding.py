@@ -0,0 +1,312 @@
+"""
+Synthetic portfolio generator for load testing (``manage.py seed_portfolio``).
+
+Rows are built in Python and written with ``bulk_create`` in batches, one
+transaction per batch, so no model signals run. The derived data those
+signals would keep is written directly instead, so the seeded database
+passes the same checks as a real one:
+
+* every unit gets a ``UnitStatusChange`` row, and vacant units get a
+  ``vacant_since``;
+* each lease is charged monthly for its past billing periods (anchored on
+  its start date, as ``pms.billing`` does) and each paid charge gets a
+  payment. Both are posted to the tenant ledger, and ``Tenant.balance`` and
+  ``rent_due_date`` are set to what ``pms.balances`` would compute. Periods
+  from the current one on are left for ``manage.py bill_rent``;
+* ``Property.visitors_inside`` counts the visits left open;
+* the ``PropertyMonthlyLedger`` rollup and the search index are rebuilt at
+  the end.
+
+The generator is seeded, so the same sizes and seed give the same shape of
+data. Unique values embed a per-run tag, so a portfolio can be added to a
+database that already holds one.
+"""
+import random
+import uuid
+from dataclasses import dataclass, fields
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from . import caching
+from .balances import add_months, next_due_date
+from .gate import fix_inside_drift, inside_drift
+from .models import (
+    Property, Unit, UnitStatusChange, Tenant, Lease, Payment, Expense, MaintenanceTicket, Visitor, TenantLedgerEntry,
+)
+from .rollups import rebuild_ledger
+from .search import rebuild_index
+
+BATCH_SIZE = 5000
+OCCUPANCY = 0.85
+UNDER_MAINTENANCE = 0.02
+IN_ARREARS = 0.1
+PROPERTIES_PER_OWNER = 100
+
+ESTATES = ('Kelvin', 'Riverside', 'Acacia', 'Baobab', 'Jacaranda', 'Savannah', 'Highview', 'Lakeside', 'Cedar', 'Milimani')
+STREETS = ('Ngong Road', 'Moi Avenue', 'Kenyatta Avenue', 'Waiyaki Way', 'Thika Road', 'Mombasa Road', 'Langata Road')
+TOWNS = ('Nairobi', 'Mombasa', 'Kisumu', 'Nakuru', 'Eldoret', 'Thika')
+FIRST_NAMES = ('Jane', 'John', 'Mary', 'Peter', 'Grace', 'James', 'Faith', 'David', 'Mercy', 'Brian', 'Ann', 'Kevin')
+LAST_NAMES = ('Wanjiku', 'Otieno', 'Kamau', 'Achieng', 'Mwangi', 'Njeri', 'Kiprop', 'Wambui', 'Omondi', 'Chebet')
+UNIT_RENTS = {'studio': 8000, '1BR': 15000, '2BR': 25000, 'commercial': 60000}
+RENT_FACTORS = (Decimal('0.8'), Decimal('1'), Decimal('1.2'), Decimal('1.5'))
+EXPENSE_CATEGORIES = ('Repairs', 'Security', 'Cleaning', 'Water', 'Electricity', 'Garbage')
+TICKET_CATEGORIES = ('Plumbing', 'Electrical', 'Painting', 'Roofing', 'Pest control', 'Doors and locks')
+TICKET_PRIORITIES = ('low', 'medium', 'medium', 'high', 'emergency')
+TICKET_STATUSES = ('open', 'in_progress', 'resolved', 'closed', 'closed', 'closed')
+METHODS = ('mpesa', 'mpesa', 'mpesa', 'bank', 'cash')
+
+
+@dataclass
+class PortfolioSize:
+    properties: int = 2000
+    units: int = 100000
+    tenants: int = 150000
+    payments: int = 3000000
+    visitors: int = 1000000
+    tickets: int = 25000
+    expenses: int = 48000
+
+    def scaled(self, scale):
+        return PortfolioSize(**{f.name: max(1, round(getattr(self, f.name) * scale)) for f in fields(self)})
+
+    def as_dict(self):
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class PortfolioSeeder:
+    def __init__(self, size, seed=0, batch_size=BATCH_SIZE, log=None):
+        self.size = size
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.tag = uuid.uuid4().hex[:6]
+        self.now = timezone.now()
+        self.today = timezone.localdate(self.now)
+        # Leases cover about as many months as needed to reach the payment volume.
+        self.months = max(1, round(size.payments / size.tenants))
+        self.history_start = self._at(add_months(self.today.replace(day=1), -(self.months + 12)), 0)
+        self.counts = {}
+
+    def _at(self, day, seconds):
+        moment = timezone.make_aware(datetime.combine(day, time()) + timedelta(seconds=seconds))
+        return min(moment, self.now)
+
+    def _phone(self):
+        return f'07{self.rng.randrange(10 ** 8):08d}'
+
+    def _name(self):
+        return self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+
+    def _create(self, model, objects):
+        created = []
+        for batch in _batches(objects, self.batch_size):
+            with transaction.atomic():
+                created.extend(model.objects.bulk_create(batch))
+        self.counts[model._meta.model_name] = self.counts.get(model._meta.model_name, 0) + len(objects)
+        return created
+
+    def run(self):
+        """Seed the whole portfolio; returns ``{model_name: rows_created}``."""
+        properties = self.seed_properties()
+        units = self.seed_units(properties)
+        self.seed_tenants(units)
+        self.seed_expenses(properties)
+        self.seed_tickets(units)
+        self.seed_visitors(units)
+        fix_inside_drift(inside_drift(properties))
+        self.log('Rebuilding the monthly ledger rollup')
+        rebuild_ledger()
+        self.log('Rebuilding the search index')
+        rebuild_index()
+        caching.invalidate_all_dashboards()
+        return self.counts
+
+    def seed_properties(self):
+        owners = []
+        for n in range(max(1, self.size.properties // PROPERTIES_PER_OWNER)):
+            first_name, last_name = self._name()
+            owners.append(User(username=f'owner-{self.tag}-{n}', first_name=first_name, last_name=last_name))
+        owners = self._create(User, owners)
+        properties = self._create(Property, [
+            Property(
+                name=f"{self.rng.choice(ESTATES)} {self.rng.choice(('Apartments', 'Court', 'Heights', 'Plaza'))} {n}",
+                address=f'{self.rng.randrange(1, 400)} {self.rng.choice(STREETS)}, {self.rng.choice(TOWNS)}',
+                owner=owners[n % len(owners)],
+            )
+            for n in range(self.size.properties)
+        ])
+        # created_at is auto_now_add; backdate it so history queries see the properties.
+        Property.objects.filter(pk__in=[p.pk for p in properties]).update(created_at=self.history_start)
+        self.log(f'{len(properties)} properties')
+        return [p.pk for p in properties]
+
+    def seed_units(self, property_ids):
+        """Create the units and their initial history; returns ``[(pk, rent, status)]``."""
+        per_property, extra = divmod(self.size.units, len(property_ids))
+        units = []
+        occupied = 0
+        for index, property_id in enumerate(property_ids):
+            for n in range(per_property + (index < extra)):
+                unit_type = self.rng.choice(tuple(UNIT_RENTS))
+                roll = self.rng.random()
+                if roll < OCCUPANCY and occupied < self.size.tenants:
+                    status, occupied = 'occupied', occupied + 1
+                elif OCCUPANCY <= roll < OCCUPANCY + UNDER_MAINTENANCE:
+                    status = 'maintenance'
+                else:
+                    status = 'vacant'
+                units.append(Unit(
+                    property_id=property_id, unit_number=f"{'ABCDEFGH'[n % 8]}{n // 8 + 1}", unit_type=unit_type,
+                    rent_amount=UNIT_RENTS[unit_type] * self.rng.choice(RENT_FACTORS),
+                    deposit_amount=Decimal(UNIT_RENTS[unit_type]), status=status,
+                    vacant_since=self.now - timedelta(days=self.rng.randrange(1, 180)) if status == 'vacant' else None,
+                ))
+        units = self._create(Unit, units)
+        self._create(UnitStatusChange, [
+            UnitStatusChange(
+                unit_id=unit.pk, from_status='', to_status=unit.status,
+                changed_at=unit.vacant_since or self.history_start, reason='seeded',
+            )
+            for unit in units
+        ])
+        self.log(f'{len(units)} units, {occupied} occupied')
+        return [(unit.pk, unit.rent_amount, unit.status) for unit in units]
+
+    def _lease_plan(self, unit, active):
+        """Return ``(lease fields, charge due dates, paid charge count)`` for one tenant."""
+        unit_id, rent, _ = unit
+        if active:
+            start = add_months(self.today.replace(day=1), -self.months) + timedelta(days=self.rng.randrange(28))
+            end = add_months(start, 12 * (self.months // 12 + 1)) - timedelta(days=1)
+            if end <= self.today:
+                end = add_months(end, 12)
+            status = 'expiring' if end <= self.today + timedelta(days=30) else 'active'
+            # Periods before the one containing today.
+            dues = [add_months(start, k) for k in range(self.months + 1) if add_months(start, k + 1) <= self.today]
+        else:
+            end = self.today - timedelta(days=self.rng.randrange(31, 720))
+            start = add_months(end, -self.months) + timedelta(days=1)
+            status = 'terminated'
+            dues = [add_months(start, k) for k in range(self.months) if add_months(start, k) <= end]
+        paid = len(dues) - (1 if active and dues and self.rng.random() < IN_ARREARS else 0)
+        lease = dict(
+            unit_id=unit_id, start_date=start, end_date=end, monthly_rent=rent, deposit_amount=rent,
+            payment_frequency='Monthly', status=status,
+        )
+        return lease, dues, paid
+
+    def seed_tenants(self, units):
+        occupied = [unit for unit in units if unit[2] == 'occupied']
+        chunk = max(1, self.batch_size // (self.months + 1))
+        receipt = 0
+        for first in range(0, self.size.tenants, chunk):
+            plans = []
+            for index in range(first, min(first + chunk, self.size.tenants)):
+                active = index < len(occupied)
+                plans.append((index, active, *self._lease_plan(
+                    occupied[index] if active else self.rng.choice(units), active,
+                )))
+
+            with transaction.atomic():
+                tenants = []
+                for index, active, lease, dues, paid in plans:
+                    first_name, last_name = self._name()
+                    owing = paid < len(dues)
+                    if not dues:
+                        due = None
+                    elif owing:
+                        due = dues[-1]
+                    else:
+                        due = next_due_date(dues[-1], 'Monthly')
+                    tenants.append(Tenant(
+                        first_name=first_name, last_name=last_name, id_passport_number=f'{self.tag}-{index}',
+                        phone=self._phone(), email=f'{first_name}.{last_name}.{index}@example.com'.lower(),
+                        status='active' if active else 'past', rent_due_date=due,
+                        balance=lease['monthly_rent'] if owing else Decimal('0'),
+                    ))
+                tenants = Tenant.objects.bulk_create(tenants, batch_size=self.batch_size)
+                leases = Lease.objects.bulk_create([
+                    Lease(tenant_id=tenant.pk, **plan[2]) for tenant, plan in zip(tenants, plans)
+                ], batch_size=self.batch_size)
+
+                payments, entries = [], []
+                for tenant, lease, (_, _, _, dues, paid) in zip(tenants, leases, plans):
+                    for n, due in enumerate(dues):
+                        entries.append(TenantLedgerEntry(
+                            tenant_id=tenant.pk, lease_id=lease.pk, entry_type='charge', amount=lease.monthly_rent,
+                            due_date=due, posted_at=self._at(due, 0), description=f'Rent {due:%b %Y}',
+                        ))
+                        if n < paid:
+                            receipt += 1
+                            payments.append(Payment(
+                                tenant_id=tenant.pk, lease_id=lease.pk, amount=lease.monthly_rent,
+                                date=self._at(due, self.rng.randrange(10 * 86400)), method=self.rng.choice(METHODS),
+                                receipt_number=f'{self.tag}-{receipt}',
+                            ))
+                payments = Payment.objects.bulk_create(payments, batch_size=self.batch_size)
+                entries.extend(
+                    TenantLedgerEntry(
+                        tenant_id=payment.tenant_id, lease_id=payment.lease_id, payment_id=payment.pk,
+                        entry_type='payment', amount=-payment.amount, posted_at=payment.date,
+                        description=f'Payment {payment.receipt_number}',
+                    )
+                    for payment in payments
+                )
+                TenantLedgerEntry.objects.bulk_create(entries, batch_size=self.batch_size)
+
+            for model, rows in ((Tenant, tenants), (Lease, leases), (Payment, payments), (TenantLedgerEntry, entries)):
+                self.counts[model._meta.model_name] = self.counts.get(model._meta.model_name, 0) + len(rows)
+            self.log(f"{self.counts['tenant']} tenants, {self.counts['payment']} payments")
+
+    def seed_expenses(self, property_ids):
+        self._create(Expense, [
+            Expense(
+                property_id=self.rng.choice(property_ids), category=self.rng.choice(EXPENSE_CATEGORIES),
+                amount=Decimal(self.rng.randrange(5, 500) * 100),
+                date=self.today - timedelta(days=self.rng.randrange(730)),
+            )
+            for _ in range(self.size.expenses)
+        ])
+        self.log(f'{self.size.expenses} expenses')
+
+    def seed_tickets(self, units):
+        self._create(MaintenanceTicket, [
+            MaintenanceTicket(
+                unit_id=self.rng.choice(units)[0], category=self.rng.choice(TICKET_CATEGORIES),
+                description='Reported by the tenant', priority=self.rng.choice(TICKET_PRIORITIES),
+                status=self.rng.choice(TICKET_STATUSES),
+            )
+            for _ in range(self.size.tickets)
+        ])
+        self.log(f'{self.size.tickets} tickets')
+
+    def seed_visitors(self, units):
+        window = 365 * 86400
+        for first in range(0, self.size.visitors, self.batch_size):
+            visitors = []
+            for _ in range(first, min(first + self.batch_size, self.size.visitors)):
+                entry = self.now - timedelta(seconds=self.rng.randrange(window))
+                # Visitors from the last few hours may still be inside.
+                still_inside = entry > self.now - timedelta(hours=4) and self.rng.random() < 0.5
+                visitors.append(Visitor(
+                    name=' '.join(self._name()), phone=self._phone(), unit_visiting_id=self.rng.choice(units)[0],
+                    entry_time=entry,
+                    exit_time=None if still_inside else entry + timedelta(minutes=self.rng.randrange(10, 360)),
+                    security_guard_name=self.rng.choice(FIRST_NAMES),
+                ))
+            self._create(Visitor, visitors)
+        self.log(f'{self.size.visitors} visitors')
+
+
+def seed_portfolio(size=None, seed=0, batch_size=BATCH_SIZE, log=None):
+    """Generate a portfolio of ``size`` (default: ``PortfolioSize()``); returns rows created per model."""
+    return PortfolioSeeder(size or PortfolioSize(), seed, batch_size, log).run()
@@ -0,0 +1,234 @@
+"""
+Model signal handlers for the ``pms`` app.
+
+Connected in ``PmsConfig.ready``.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import balances, caching, events, gate, rollups, search
+from .models import (
+    Property, Unit, Tenant, Lease, Payment, Expense, MaintenanceTicket, Visitor, TenantLedgerEntry, UnitStatusChange,
+)
+
+
+# Monthly ledger rollup
+
+@receiver(pre_save, sender=Payment)
+def remember_payment_entry(sender, instance, raw=False, **kwargs):
+    instance._ledger_entry = None if raw or instance.pk is None else rollups.stored_payment_entry(instance.pk)
+
+
+@receiver(post_save, sender=Payment)
+def book_payment(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    rollups.rebook_payment(getattr(instance, '_ledger_entry', None), rollups.payment_entry(instance))
+
+
+@receiver(pre_delete, sender=Payment)
+def remember_deleted_payment_entry(sender, instance, **kwargs):
+    # Captured before deletion so cascades that remove the lease first still
+    # resolve the property the payment was booked under.
+    instance._ledger_entry = rollups.stored_payment_entry(instance.pk)
+
+
+@receiver(post_delete, sender=Payment)
+def unbook_payment(sender, instance, **kwargs):
+    entry = getattr(instance, '_ledger_entry', None)
+    if entry is not None:
+        rollups.unbook_deleted_payment(entry, instance.lease_id)
+
+
+@receiver(pre_delete, sender=Lease)
+def remember_lease_payments(sender, instance, **kwargs):
+    instance._ledger_payments = rollups.stored_lease_payments(instance.pk)
+
+
+@receiver(post_delete, sender=Lease)
+def unassign_lease_payments(sender, instance, **kwargs):
+    payments = getattr(instance, '_ledger_payments', None)
+    if payments is not None:
+        rollups.unassign_payments(*payments)
+
+
+@receiver(pre_save, sender=Expense)
+def remember_expense_entry(sender, instance, raw=False, **kwargs):
+    instance._ledger_entry = None if raw or instance.pk is None else rollups.stored_expense_entry(instance.pk)
+
+
+@receiver(post_save, sender=Expense)
+def book_expense(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    rollups.rebook_expense(getattr(instance, '_ledger_entry', None), rollups.expense_entry(instance))
+
+
+@receiver(post_delete, sender=Expense)
+def unbook_expense(sender, instance, **kwargs):
+    rollups.book_expense(rollups.expense_entry(instance), sign=-1)
+
+
+# Tenant balances
+
+@receiver(pre_save, sender=Payment)
+def remember_payment_balance(sender, instance, raw=False, **kwargs):
+    instance._balance_entry = None
+    if not raw and instance.pk is not None:
+        instance._balance_entry = Payment.objects.filter(pk=instance.pk).values_list('tenant_id', 'amount').first()
+
+
+@receiver(post_save, sender=Payment)
+def post_payment_to_balance(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    balances.repost_payment(instance, getattr(instance, '_balance_entry', None))
+
+
+@receiver(post_delete, sender=TenantLedgerEntry)
+def reverse_ledger_entry(sender, instance, **kwargs):
+    # Covers entries removed by cascade from a deleted payment or invoice.
+    balances.unpost_entry(instance.tenant_id, instance.amount)
+
+
+# Unit status history
+
+@receiver(pre_save, sender=Unit)
+def track_unit_status(sender, instance, raw=False, **kwargs):
+    instance._status_change = None
+    if raw:
+        return
+    previous = None
+    if instance.pk is not None:
+        previous = Unit.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+    if previous != instance.status:
+        now = timezone.now()
+        instance.vacant_since = now if instance.status == 'vacant' else None
+        instance._status_change = (previous or '', now)
+
+
+@receiver(post_save, sender=Unit)
+def record_unit_status(sender, instance, created=False, raw=False, **kwargs):
+    change = getattr(instance, '_status_change', None)
+    if change is None:
+        return
+    previous, changed_at = change
+    UnitStatusChange.objects.create(
+        unit=instance, from_status=previous, to_status=instance.status, changed_at=changed_at,
+        reason='created' if created else 'edited',
+    )
+    instance._status_change = None
+
+
+# Visitors inside
+
+@receiver(pre_save, sender=Visitor)
+def remember_visit(sender, instance, raw=False, **kwargs):
+    instance._gate_visit = None if raw or instance.pk is None else gate.stored_visit(instance.pk)
+
+
+@receiver(post_save, sender=Visitor)
+def count_visit(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    gate.recount_visit(getattr(instance, '_gate_visit', None), instance)
+
+
+@receiver(pre_delete, sender=Visitor)
+def remember_deleted_visit(sender, instance, **kwargs):
+    # Before deletion, while a cascade from the unit can still resolve the property.
+    instance._gate_visit = gate.stored_visit(instance.pk)
+
+
+@receiver(post_delete, sender=Visitor)
+def uncount_visit(sender, instance, **kwargs):
+    gate.uncount_visit(getattr(instance, '_gate_visit', None))
+
+
+# Dashboard cache invalidation
+
+def _affected_properties(instance):
+    """Return a Property queryset covering the properties ``instance`` touches."""
+    if isinstance(instance, (Unit, Expense)):
+        return Property.objects.filter(pk=instance.property_id)
+    if isinstance(instance, (Lease, MaintenanceTicket)):
+        return Property.objects.filter(units=instance.unit_id)
+    if isinstance(instance, Visitor):
+        return Property.objects.filter(units=instance.unit_visiting_id)
+    if isinstance(instance, Payment):
+        if instance.lease_id:
+            return Property.objects.filter(units__leases=instance.lease_id)
+        return Property.objects.filter(units__leases__tenant=instance.tenant_id)
+    if isinstance(instance, Tenant):
+        return Property.objects.filter(units__leases__tenant=instance.pk)
+    return Property.objects.none()
+
+
+# The fields ``_affected_properties`` reads, for loading a row's stored state.
+OWNER_FIELDS = {
+    Property: ('owner_id',),
+    Unit: ('property_id',),
+    Expense: ('property_id',),
+    Lease: ('unit_id',),
+    MaintenanceTicket: ('unit_id',),
+    Visitor: ('unit_visiting_id',),
+    Payment: ('lease_id', 'tenant_id'),
+}
+
+
+def _owner_ids(instance):
+    if isinstance(instance, Property):
+        return {instance.owner_id}
+    return set(_affected_properties(instance).values_list('owner_id', flat=True))
+
+
+def remember_dashboard_owners(sender, instance, raw=False, **kwargs):
+    # A save can move the row to another owner (a property changing hands,
+    # a unit or lease moving); the previous owner's dashboard changes too.
+    instance._dashboard_owners = set()
+    if raw or instance.pk is None:
+        return
+    stored = sender.objects.filter(pk=instance.pk).only(*OWNER_FIELDS[sender]).first()
+    if stored is not None:
+        instance._dashboard_owners = _owner_ids(stored)
+
+
+def invalidate_dashboard_cache(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    owner_ids = _owner_ids(instance) | getattr(instance, '_dashboard_owners', set())
+    # Invalidate once the write is visible, so a concurrent request cannot
+    # re-cache the old numbers under the new generation, and open
+    # dashboards refresh from committed rows.
+    def changed():
+        caching.invalidate_dashboard(owner_ids)
+        events.publish_model_change(sender, owner_ids)
+
+    transaction.on_commit(changed)
+
+
+for model in (Property, Unit, Tenant, Lease, Payment, Expense, MaintenanceTicket, Visitor):
+    if model in OWNER_FIELDS:
+        # A tenant's owners come from its leases, which saving it leaves alone.
+        pre_save.connect(remember_dashboard_owners, sender=model, dispatch_uid=f'pms_dashboard_owners_{model.__name__}')
+    post_save.connect(invalidate_dashboard_cache, sender=model, dispatch_uid=f'pms_dashboard_cache_save_{model.__name__}')
+    post_delete.connect(invalidate_dashboard_cache, sender=model, dispatch_uid=f'pms_dashboard_cache_delete_{model.__name__}')
+
+
+# Search index
+
+def index_search_entry(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_object(instance)
+
+
+def unindex_search_entry(sender, instance, **kwargs):
+    search.unindex_object(instance)
+
+
+for model in search.KIND_BY_MODEL:
+    post_save.connect(index_search_entry, sender=model, dispatch_uid=f'pms_search_save_{model.__name__}')
+    post_delete.connect(unindex_search_entry, sender=model, dispatch_uid=f'pms_search_delete_{model.__name__}')
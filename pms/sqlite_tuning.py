@@ -0,0 +1,61 @@
+"""
+SQLite tuning profile, applied to every new SQLite connection.
+
+With the ``PMS_SQLITE_PROFILE`` setting on, the ``connection_created``
+hook below runs the profile's PRAGMAs, with overrides from
+``PMS_SQLITE_PRAGMAS``:
+
+* ``journal_mode=WAL``: readers no longer block the writer, nor it them.
+  The mode is stored in the database file; the other pragmas last for the
+  connection only.
+* ``synchronous=NORMAL``: fsync at checkpoints rather than every commit.
+  In WAL mode this cannot corrupt the database; at worst a power cut loses
+  the last commits.
+* ``busy_timeout``: wait this many milliseconds for a lock instead of
+  failing at once with "database is locked".
+* ``temp_store=MEMORY``, ``mmap_size`` and ``cache_size``: keep temporary
+  tables, and more of the database, in memory.
+
+WAL still allows only one writer at a time, and a transaction that reads
+before it writes can fail without waiting when another writer got in first.
+Keep write transactions short.
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+PROFILES = {
+    'production': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'temp_store': 'MEMORY',
+        'mmap_size': 256 * 1024 * 1024,
+        # Negative sizes are in KiB: 64 MB of page cache per connection.
+        'cache_size': -64000,
+    },
+}
+
+
+def sqlite_pragmas():
+    """The PRAGMAs the settings ask for, as ``{name: value}``; empty when tuning is off."""
+    profile = getattr(settings, 'PMS_SQLITE_PROFILE', None)
+    if not profile:
+        return {}
+    if profile not in PROFILES:
+        raise ImproperlyConfigured(f'Unknown PMS_SQLITE_PROFILE {profile!r}; expected one of {sorted(PROFILES)}.')
+    pragmas = dict(PROFILES[profile])
+    pragmas.update(getattr(settings, 'PMS_SQLITE_PRAGMAS', {}))
+    return pragmas
+
+
+def apply_pragmas(connection, pragmas):
+    for name, value in pragmas.items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        apply_pragmas(connection, sqlite_pragmas())
@@ -0,0 +1,329 @@
+"""
+Bulk import of M-Pesa and bank statement CSVs as ``Payment`` rows.
+
+The file is parsed as a stream and processed a batch at a time. Each batch
+costs one query to find receipt numbers already on record and one
+``bulk_create``, all inside a transaction. Tenants are matched through
+phone and ID-number indexes that are built once up front, so matching a
+row never needs a query. ``bulk_create`` skips model signals, so each
+batch posts its payments to the tenant ledger and books its totals into
+``PropertyMonthlyLedger`` itself, and the affected dashboards are
+invalidated when the import finishes.
+
+Rows that cannot be matched, whose amount or date cannot be parsed, or
+whose amount or receipt does not fit the ``Payment`` columns are collected
+in ``ImportResult.unmatched`` for the report.
+"""
+import csv
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import ROUND_DOWN, Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import balances, caching, events
+from .models import Tenant, Lease, Payment, Property
+from .rollups import apply_delta
+
+BATCH_SIZE = 1000
+
+# Accepted (lower-cased) header names for each column we read. M-Pesa
+# statements use the first spelling, bank statements the later ones.
+COLUMN_ALIASES = {
+    'receipt': ('receipt no.', 'receipt no', 'receipt', 'receipt_number', 'transaction id', 'reference', 'ref'),
+    'date': ('completion time', 'transaction date', 'date', 'value date', 'initiation time'),
+    'amount': ('paid in', 'credit', 'amount', 'deposit'),
+    'phone': ('phone', 'phone number', 'msisdn', 'mobile'),
+    'id_number': ('id number', 'id_number', 'account', 'a/c no.', 'account no.', 'account number', 'bill ref'),
+    'details': ('other party info', 'details', 'description', 'narrative'),
+}
+
+DATE_FORMATS = (
+    '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d',
+    '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y',
+    '%d-%m-%Y %H:%M:%S', '%d-%m-%Y', '%d %b %Y',
+)
+
+PHONE_IN_TEXT = re.compile(r'(?:\+?254|0)?([17]\d{8})\b')
+
+
+class StatementFormatError(ValueError):
+    pass
+
+
+@dataclass
+class UnmatchedRow:
+    line: int
+    reason: str
+    receipt: str
+    amount: str
+    date: str
+    phone: str
+    id_number: str
+    details: str
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    duplicates: int = 0
+    skipped: int = 0
+    unmatched: list = field(default_factory=list)
+
+    @property
+    def unmatched_count(self):
+        return len(self.unmatched)
+
+
+def normalize_phone(value):
+    """Reduce a Kenyan phone number to its last nine digits (``712345678``)."""
+    digits = re.sub(r'\D', '', value or '')
+    return digits[-9:] if len(digits) >= 9 else ''
+
+
+def normalize_id(value):
+    return re.sub(r'\s', '', value or '').upper()
+
+
+def parse_amount(value):
+    """The amount as a finite Decimal, or None (NaN and Infinity parse, but are no amount)."""
+    try:
+        amount = Decimal((value or '').replace(',', '').strip())
+    except InvalidOperation:
+        return None
+    return amount if amount.is_finite() else None
+
+
+def amount_problem(amount):
+    """
+    Why ``amount`` does not fit ``Payment.amount``, or None. ``bulk_create``
+    would fail the whole batch on too many digits, and round away extra
+    decimal places without notice.
+    """
+    field = Payment._meta.get_field('amount')
+    if amount.adjusted() + 1 > field.max_digits - field.decimal_places:
+        return f'Amount has more than {field.max_digits} digits'
+    if amount != amount.quantize(Decimal(1).scaleb(-field.decimal_places), rounding=ROUND_DOWN):
+        return f'Amount has more than {field.decimal_places} decimal places'
+    return None
+
+
+def receipt_problem(receipt):
+    """Why ``receipt`` cannot be a ``Payment.receipt_number``, or None."""
+    if not receipt:
+        return 'Missing receipt number'
+    max_length = Payment._meta.get_field('receipt_number').max_length
+    if len(receipt) > max_length:
+        return f'Receipt number longer than {max_length} characters'
+    return None
+
+
+class DateParser:
+    """
+    Parse statement timestamps as local time. The format that matched last
+    is tried first, since every row of a statement uses the same one.
+    """
+
+    def __init__(self, tz=None):
+        self.tz = tz or timezone.get_current_timezone()
+        self.formats = list(DATE_FORMATS)
+
+    def __call__(self, value):
+        """Return ``(aware_datetime, (year, month))`` or None."""
+        value = (value or '').strip()
+        for position, fmt in enumerate(self.formats):
+            try:
+                parsed = datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+            if position:
+                self.formats.insert(0, self.formats.pop(position))
+            return timezone.make_aware(parsed, self.tz), (parsed.year, parsed.month)
+        return None
+
+
+class TenantIndex:
+    """
+    In-memory lookups from normalised phone and ID number to tenant, and from
+    tenant to the property and lease their payments are booked under.
+
+    Phones shared by more than one tenant are left out so a payment is
+    never credited to the wrong person.
+    """
+
+    def __init__(self):
+        self.by_phone = {}
+        self.by_id = {}
+        ambiguous = set()
+        for pk, phone, id_number in Tenant.objects.values_list('pk', 'phone', 'id_passport_number').iterator(chunk_size=5000):
+            phone = normalize_phone(phone)
+            if phone:
+                if phone in self.by_phone and self.by_phone[phone] != pk:
+                    ambiguous.add(phone)
+                self.by_phone[phone] = pk
+            if id_number:
+                self.by_id[normalize_id(id_number)] = pk
+        for phone in ambiguous:
+            del self.by_phone[phone]
+
+        # The most recently started active lease wins for tenants with several.
+        self.leases = {}
+        active = (
+            Lease.objects.filter(status__in=Lease.OPEN_STATUSES)
+            .order_by('tenant_id', 'start_date', 'pk')
+            .values_list('tenant_id', 'pk', 'unit__property_id')
+        )
+        for tenant_id, lease_id, property_id in active.iterator(chunk_size=5000):
+            self.leases[tenant_id] = (lease_id, property_id)
+
+    def match(self, phone, id_number, details):
+        """Return the tenant id for a statement row, or None."""
+        if id_number:
+            tenant_id = self.by_id.get(normalize_id(id_number))
+            if tenant_id is not None:
+                return tenant_id
+        for candidate in (phone, *PHONE_IN_TEXT.findall(details or '')):
+            tenant_id = self.by_phone.get(normalize_phone(candidate))
+            if tenant_id is not None:
+                return tenant_id
+        return None
+
+
+def _column_map(header):
+    names = [name.strip().lower() for name in header]
+    columns = {}
+    for key, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in names:
+                columns[key] = names.index(alias)
+                break
+    return columns
+
+
+def read_statement(lines):
+    """
+    Yield ``(line_number, record)`` for each data row of a statement, where
+    ``record`` maps the keys of ``COLUMN_ALIASES`` to raw strings.
+
+    Lines before the header (statement preambles) are skipped.
+    """
+    reader = csv.reader(lines)
+    columns = None
+    for row in reader:
+        columns = _column_map(row)
+        if {'receipt', 'date', 'amount'} <= columns.keys():
+            break
+    else:
+        raise StatementFormatError('No header row with receipt, date and amount columns was found.')
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        yield reader.line_num, {
+            key: row[index].strip() if index < len(row) else ''
+            for key, index in columns.items()
+        }
+
+
+def _batches(records, size):
+    batch = []
+    for item in records:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_statement(lines, method='mpesa', batch_size=BATCH_SIZE, index=None):
+    """
+    Import the statement CSV in ``lines`` (any iterable of text lines, such
+    as an open file) as ``Payment`` rows with the given ``method``.
+
+    Returns an ``ImportResult``. Receipt numbers already stored, or repeated
+    within the file, are counted as duplicates. Debits and zero amounts are
+    counted as skipped.
+    """
+    index = index or TenantIndex()
+    parse_datetime = DateParser()
+    result = ImportResult()
+    seen = set()
+    touched_properties = set()
+
+    for batch in _batches(read_statement(lines), batch_size):
+        receipts = {record['receipt'] for _, record in batch if record['receipt']}
+        existing = set(Payment.objects.filter(receipt_number__in=receipts).values_list('receipt_number', flat=True))
+
+        payments = []
+        ledger = defaultdict(lambda: [Decimal('0'), 0])
+        for line, record in batch:
+            receipt = record['receipt']
+            if receipt in existing or receipt in seen:
+                result.duplicates += 1
+                continue
+            if not record.get('amount'):
+                # Debit lines leave the credit ("Paid In") column empty.
+                result.skipped += 1
+                continue
+            amount = parse_amount(record['amount'])
+            parsed = parse_datetime(record.get('date'))
+            reason = receipt_problem(receipt)
+            if reason is None:
+                if amount is None or parsed is None:
+                    reason = 'Unreadable amount or date'
+                elif amount <= 0:
+                    result.skipped += 1
+                    continue
+                else:
+                    reason = amount_problem(amount)
+            tenant_id = None
+            if reason is None:
+                tenant_id = index.match(record.get('phone'), record.get('id_number'), record.get('details'))
+                if tenant_id is None:
+                    reason = 'No tenant with this phone or ID number'
+            if reason is not None:
+                result.unmatched.append(UnmatchedRow(
+                    line=line, reason=reason, receipt=receipt,
+                    amount=record.get('amount', ''), date=record.get('date', ''),
+                    phone=record.get('phone', ''), id_number=record.get('id_number', ''),
+                    details=record.get('details', ''),
+                ))
+                continue
+
+            seen.add(receipt)
+            paid_at, period = parsed
+            lease_id, property_id = index.leases.get(tenant_id, (None, None))
+            payments.append(Payment(
+                tenant_id=tenant_id, lease_id=lease_id, amount=amount, date=paid_at,
+                method=method, receipt_number=receipt, notes=record.get('details', ''),
+            ))
+            totals = ledger[(property_id, *period)]
+            totals[0] += amount
+            totals[1] += 1
+            touched_properties.add(property_id)
+
+        with transaction.atomic():
+            Payment.objects.bulk_create(payments, batch_size=batch_size)
+            balances.post_payments(payments)
+            for (property_id, year, month), (revenue, count) in ledger.items():
+                apply_delta(property_id, year, month, revenue=revenue, payment_count=count)
+        result.created += len(payments)
+
+    if touched_properties:
+        owner_ids = Property.objects.filter(pk__in=touched_properties - {None}).values_list('owner_id', flat=True)
+        caching.invalidate_dashboard(set(owner_ids))
+        events.publish(events.GROUPS_BY_MODEL[Payment], set(owner_ids))
+    return result
+
+
+def write_unmatched_report(result, stream):
+    """Write ``result.unmatched`` as CSV to the text ``stream``."""
+    writer = csv.writer(stream)
+    writer.writerow(['Line', 'Reason', 'Receipt', 'Amount', 'Date', 'Phone', 'ID Number', 'Details'])
+    for row in result.unmatched:
+        writer.writerow([
+            row.line, row.reason, row.receipt, row.amount, row.date, row.phone, row.id_number, row.details,
+        ])
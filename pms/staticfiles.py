@@ -0,0 +1,58 @@
+"""
+Static file storage for ``collectstatic`` and ``StaticFilesMiddleware``.
+
+``PrecompressedManifestStaticFilesStorage`` is Django's manifest storage,
+so ``{% static %}`` links to content-hashed names such as
+``css/app.3f2a9c.css`` that can be cached forever. After hashing it writes
+``.gz`` and, when the ``brotli`` package is installed, ``.br`` copies of
+every compressible file. The server then sends those copies as they are,
+instead of compressing on every request.
+"""
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.map', '.txt', '.xml', '.ttf', '.otf', '.eot')
+# Keep a compressed copy only when it saves at least this fraction.
+MIN_SAVING = 0.05
+
+
+def compressors():
+    yield '.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield '.br', lambda data: brotli.compress(data, quality=11)
+
+
+class PrecompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def stored_name(self, name):
+        # Until collectstatic has written a manifest (development, tests),
+        # link to the unhashed files rather than failing.
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in {*paths, *self.hashed_files.values()}:
+            if name.endswith(COMPRESSIBLE) and self.exists(name):
+                self.compress(name)
+
+    def compress(self, name):
+        path = self.path(name)
+        with open(path, 'rb') as source:
+            data = source.read()
+        for suffix, compress in compressors():
+            compressed = compress(data)
+            if len(compressed) <= len(data) * (1 - MIN_SAVING):
+                with open(path + suffix, 'wb') as target:
+                    target.write(compressed)
+            elif os.path.exists(path + suffix):
+                os.remove(path + suffix)
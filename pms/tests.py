@@ -1,3 +1,1340 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import io
+import json
+import re
+import tempfile
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from importlib import import_module
+from unittest import mock
+from xml.etree import ElementTree
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, connections
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.template import engines
+from django.utils import timezone
+from django.utils.http import http_date
+
+from .assets import template_files, used_icons
+from .balances import balance_drift, post_charge
+from .benchmarks import benchmark_urls, compare_reports
+from .billing import billing_period, run_billing
+from .caching import dashboard_cache_stats, get_dashboard_kpis
+from .events import event_stream, publish, scope_of
+from .gate import inside_drift, open_visits
+from . import views
+from .kpis import acompute_dashboard_kpis, compute_dashboard_kpis, compute_kpi_fields
+from .instrumentation import QueryBudgetExceeded, view_stats
+from .middleware import StaticFilesMiddleware
+from .lifecycle import sweep_leases
+from .lookups import prefix_q
+from .occupancy import statuses_at, turnover
+from .pagination import keyset_paginate
+from .models import (
+    Property, Unit, Tenant, Lease, Payment, Expense, MaintenanceTicket, Visitor, PropertyMonthlyLedger,
+    RentInvoice, LeaseSweepRun, UnitStatusChange, PropertyDailySnapshot, SearchEntry,
+)
+from .rollups import rebuild_ledger
+from .routers import STICKY_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware
+from .search import search
+from .seeding import PortfolioSize, seed_portfolio
+from .snapshots import snapshot_day, snapshot_series
+from .sqlite_tuning import sqlite_pragmas
+from .statements import import_statement
+
+
+def create_portfolio():
+    """One property of four 1,000 units: three let and paid this month, one vacant."""
+    today = timezone.now().date()
+    prop = Property.objects.create(name='Kelvin Apartments', address='Nairobi')
+    units = [
+        Unit.objects.create(
+            property=prop, unit_number=f'A{i}', unit_type='1BR',
+            rent_amount=Decimal('1000'), deposit_amount=Decimal('1000'),
+            status='occupied' if i < 3 else 'vacant',
+        )
+        for i in range(4)
+    ]
+    for i, unit in enumerate(units[:3]):
+        tenant = Tenant.objects.create(
+            first_name='Tenant', last_name=str(i), id_passport_number=f'ID{i}',
+            phone=f'0700000{i}', email=f't{i}@example.com',
+        )
+        lease = Lease.objects.create(
+            tenant=tenant, unit=unit, start_date=today - timedelta(days=300),
+            end_date=today + timedelta(days=10 if i == 0 else 200),
+            monthly_rent=Decimal('1000'), deposit_amount=Decimal('1000'),
+        )
+        Payment.objects.create(
+            tenant=tenant, lease=lease, amount=Decimal('1000'),
+            method='mpesa', receipt_number=f'R{i}',
+        )
+    Expense.objects.create(property=prop, category='Repairs', amount=Decimal('500'), date=today)
+    MaintenanceTicket.objects.create(unit=units[0], category='Plumbing', description='Leak', priority='high')
+    Visitor.objects.create(name='Guest', phone='0711', unit_visiting=units[0])
+    sweep_leases()
+    return prop, units
+
+
+class DashboardKPITests(TestCase):
+    # One aggregate per model plus the property count.
+    MAX_KPI_QUERIES = 7
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.property, cls.units = create_portfolio()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_kpis_use_bounded_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            kpis = compute_dashboard_kpis()
+        self.assertLessEqual(len(ctx.captured_queries), self.MAX_KPI_QUERIES)
+
+        self.assertEqual(kpis.total_rent_collected, Decimal('3000'))
+        self.assertEqual(kpis.total_expenses, Decimal('500'))
+        self.assertEqual(kpis.curr_net_profit, Decimal('2500'))
+        self.assertEqual(kpis.outstanding_rent, Decimal('0'))
+        self.assertEqual(kpis.total_properties, 1)
+        self.assertEqual(kpis.total_units, 4)
+        self.assertEqual(kpis.occupied_units, 3)
+        self.assertEqual(kpis.occupancy_rate, 75.0)
+        self.assertEqual(kpis.expiring_leases_count, 1)
+        self.assertEqual(kpis.urgent_tickets_count, 1)
+        self.assertEqual(kpis.visitors_today, 1)
+        self.assertEqual(kpis.currently_checked_in, 1)
+
+    def test_dashboard_view_query_count(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(ctx.captured_queries), self.MAX_KPI_QUERIES + 1)
+
+    async def test_async_dashboard_matches_sync(self):
+        self.assertEqual(await acompute_dashboard_kpis(), await sync_to_async(compute_dashboard_kpis)())
+
+        request = AsyncRequestFactory().get(reverse('dashboard'))
+        request.user = AnonymousUser()
+        response = await views.adashboard(request)
+        self.assertContains(response, 'Urgent')
+
+        request = AsyncRequestFactory().get(reverse('payment_list'))
+        request.user = AnonymousUser()
+        self.assertContains(await views.apayment_list(request), 'R2')
+
+    def test_owner_dashboard_lists_only_their_tickets(self):
+        owner = User.objects.create_user('owner', password='pw')
+        prop = Property.objects.create(name='Riverside Court', address='Mombasa', owner=owner)
+        unit = Unit.objects.create(
+            property=prop, unit_number='B1', unit_type='1BR', rent_amount=Decimal('1000'), deposit_amount=Decimal('1000'),
+        )
+        ticket = MaintenanceTicket.objects.create(unit=unit, category='Power', description='Outage')
+        self.client.force_login(owner)
+        self.assertEqual(list(self.client.get(reverse('dashboard')).context['recent_tickets']), [ticket])
+
+        request = AsyncRequestFactory().get(reverse('dashboard'))
+        request.user = owner
+        with mock.patch('pms.views._dashboard_context', wraps=views._dashboard_context) as context:
+            async_to_sync(views.adashboard)(request)
+        self.assertEqual(list(context.call_args.args[1]), [ticket])
+
+    def test_dashboard_modal_forms_do_not_render_choices(self):
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'data-lookup-url="%s"' % reverse('tenant_lookup'))
+        self.assertNotContains(response, 'Tenant 2</option>')
+
+    def test_reassigned_property_refreshes_the_previous_owner(self):
+        seller, buyer = User.objects.create_user('seller'), User.objects.create_user('buyer')
+        prop = Property.objects.create(name='Riverside Court', address='Mombasa', owner=seller)
+        self.assertEqual(get_dashboard_kpis(owner=seller).total_properties, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            prop.owner = buyer
+            prop.save()
+        self.assertEqual(get_dashboard_kpis(owner=seller).total_properties, 0)
+        self.assertEqual(get_dashboard_kpis(owner=buyer).total_properties, 1)
+
+    def test_dashboard_cache_hits_until_write(self):
+        get_dashboard_kpis()
+        with self.assertNumQueries(0):
+            kpis = get_dashboard_kpis()
+        self.assertEqual(kpis.visitors_today, 1)
+        self.assertEqual(dashboard_cache_stats()['hits'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Visitor.objects.create(name='Courier', phone='0722', unit_visiting=self.units[1])
+        self.assertEqual(get_dashboard_kpis().visitors_today, 2)
+        self.assertEqual(dashboard_cache_stats()['misses'], 2)
+
+
+class PropertyMonthlyLedgerTests(TestCase):
+    def setUp(self):
+        self.property = Property.objects.create(name='Kelvin Apartments', address='Nairobi')
+        unit = Unit.objects.create(
+            property=self.property, unit_number='A1', unit_type='1BR',
+            rent_amount=Decimal('1000'), deposit_amount=Decimal('1000'),
+        )
+        self.tenant = Tenant.objects.create(
+            first_name='Jane', last_name='Doe', id_passport_number='ID1', phone='0700', email='j@example.com',
+        )
+        self.lease = Lease.objects.create(
+            tenant=self.tenant, unit=unit, start_date=timezone.now().date(), end_date=timezone.now().date(),
+            monthly_rent=Decimal('1000'), deposit_amount=Decimal('1000'),
+        )
+
+    def ledger_rows(self):
+        rows = PropertyMonthlyLedger.objects.values_list(
+            'property_id', 'year', 'month', 'revenue', 'expenses', 'payment_count', 'expense_count',
+        )
+        return sorted(rows, key=lambda row: (row[0] or 0, row[1], row[2]))
+
+    def test_signals_match_rebuild(self):
+        payment = Payment.objects.create(
+            tenant=self.tenant, lease=self.lease, amount=Decimal('1000'), method='cash', receipt_number='R1',
+        )
+        Payment.objects.create(tenant=self.tenant, amount=Decimal('50'), method='cash', receipt_number='R2')
+        expense = Expense.objects.create(
+            property=self.property, category='Repairs', amount=Decimal('300'), date=timezone.now().date(),
+        )
+        payment.amount = Decimal('800')
+        payment.date = timezone.now() - timedelta(days=40)
+        payment.save()
+        expense.delete()
+
+        incremental = self.ledger_rows()
+        rebuild_ledger()
+        rebuilt = self.ledger_rows()
+        self.assertEqual(
+            [row for row in incremental if row[5] or row[6]],
+            [row for row in rebuilt if row[5] or row[6]],
+        )
+        self.assertEqual(sum(row[3] for row in rebuilt), Decimal('850'))
+
+    def assert_matches_rebuild(self):
+        incremental = [row for row in self.ledger_rows() if row[5] or row[6]]
+        rebuild_ledger()
+        self.assertEqual(incremental, [row for row in self.ledger_rows() if row[5] or row[6]])
+
+    def test_deleting_a_lease_unassigns_its_payments(self):
+        for i, days_ago in enumerate([0, 40]):
+            Payment.objects.create(
+                tenant=self.tenant, lease=self.lease, amount=Decimal('1000'), method='cash',
+                receipt_number=f'R{i}', date=timezone.now() - timedelta(days=days_ago),
+            )
+        self.lease.delete()
+        self.assertFalse(PropertyMonthlyLedger.objects.filter(property=self.property, payment_count__gt=0).exists())
+        self.assert_matches_rebuild()
+
+    def test_deleting_a_tenant_with_lease_and_payments(self):
+        Payment.objects.create(tenant=self.tenant, lease=self.lease, amount=Decimal('1000'), method='cash', receipt_number='R1')
+        self.tenant.delete()
+        self.assertFalse(PropertyMonthlyLedger.objects.filter(payment_count__gt=0).exists())
+        self.assert_matches_rebuild()
+
+
+class LookupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i, (first, last) in enumerate([('Tenant', '0'), ('Tenant', '1'), ('Tenant', '2'), ('Ronald', 'McDonald'), ("Siobhan", "O'Brien")]):
+            Tenant.objects.create(
+                first_name=first, last_name=last, id_passport_number=f'ID{i}',
+                phone=f'0700000{i}', email=f't{i}@example.com',
+            )
+
+    def lookup(self, term, **params):
+        return self.client.get(reverse('tenant_lookup'), {'q': term, **params}).json()
+
+    def test_tenant_lookup_prefix_search(self):
+        data = self.lookup('ten', page_size=2)
+        self.assertEqual([row['text'] for row in data['results']], ['Tenant 0', 'Tenant 1'])
+        self.assertTrue(data['more'])
+
+    def test_prefix_match_ignores_case(self):
+        for term in ('mcd', 'MCDO', 'o\'b', "O'BRI", 'id3'):
+            with self.subTest(term=term):
+                self.assertEqual(len(self.lookup(term)['results']), 1)
+
+    def test_prefix_match_uses_the_lower_indexes(self):
+        plan = Tenant.objects.filter(prefix_q(['first_name', 'last_name'], 'Mc')).explain()
+        self.assertIn('pms_tenant_first_lower_idx', plan)
+        self.assertIn('pms_tenant_last_lower_idx', plan)
+
+
+class FinancialTrendTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_portfolio()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_financial_trend_buckets_in_sql(self):
+        today = timezone.localdate()
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('financial_trend'), {
+                'start': today.isoformat(), 'end': today.isoformat(), 'bucket': 'month',
+            })
+        series = response.json()['series']
+        self.assertEqual(len(series), 1)
+        self.assertEqual(Decimal(series[0]['revenue']), Decimal('3000'))
+        self.assertEqual(Decimal(series[0]['net_profit']), Decimal('2500'))
+
+        response = self.client.get(reverse('financial_trend'), {'bucket': 'hour'})
+        self.assertEqual(response.status_code, 400)
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        tenant = Tenant.objects.create(
+            first_name='Jane', last_name='Doe', id_passport_number='ID1', phone='0700', email='j@example.com',
+        )
+        same_time = timezone.now()
+        for i in range(7):
+            Payment.objects.create(
+                tenant=tenant, amount=Decimal('10'), method='cash', receipt_number=f'R{i}',
+                date=same_time if i % 2 else same_time - timedelta(days=i),
+            )
+
+    def walk(self, params=None):
+        request = RequestFactory().get('/', params or {})
+        return keyset_paginate(request, Payment.objects.all(), ('-date', '-id'), per_page=3)
+
+    def test_pages_cover_every_row_once_in_order(self):
+        expected = list(Payment.objects.order_by('-date', '-id').values_list('pk', flat=True))
+        seen, pages = [], []
+        page = self.walk()
+        while True:
+            pages.append(page)
+            seen.extend(p.pk for p in page)
+            if not page.has_next:
+                break
+            page = self.walk(dict(pair.split('=') for pair in page.next_query.split('&')))
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(pages), 3)
+
+        previous = self.walk(dict(pair.split('=') for pair in pages[2].previous_query.split('&')))
+        self.assertEqual([p.pk for p in previous], [p.pk for p in pages[1]])
+
+    def test_list_views_render_with_filters(self):
+        for name, query in [
+            ('payment_list', ''), ('visitor_list', ''), ('tenant_list', '?filter=overdue'),
+            ('lease_list', '?filter=expiring'), ('ticket_list', '?filter=urgent'), ('unit_list', '?filter=long_vacant'),
+        ]:
+            response = self.client.get(reverse(name) + query + '&after=bogus' if query else reverse(name))
+            self.assertEqual(response.status_code, 200, name)
+
+
+class PropertyUnitStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_portfolio()
+
+    def test_property_unit_stats(self):
+        Property.objects.create(name='Empty Court', address='Mombasa')
+        stats = {p.name: p for p in Property.objects.with_unit_stats()}
+        kelvin = stats['Kelvin Apartments']
+        self.assertEqual((kelvin.unit_count, kelvin.occupied_units, kelvin.vacant_units), (4, 3, 1))
+        self.assertEqual(kelvin.occupancy_rate, 75.0)
+        self.assertEqual(kelvin.expected_monthly_rent, Decimal('3000'))
+        self.assertEqual(stats['Empty Court'].occupancy_rate, 0.0)
+
+        with self.assertNumQueries(1):
+            self.client.get(reverse('property_list'))
+        response = self.client.get(reverse('property_detail', args=[kelvin.pk]))
+        self.assertContains(response, '75%')
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='x', is_staff=True)
+        today = timezone.now().date()
+        cls.property = Property.objects.create(name='Kelvin Apartments', address='Nairobi')
+        unit = Unit.objects.create(
+            property=cls.property, unit_number='A1', unit_type='1BR',
+            rent_amount=Decimal('1000'), deposit_amount=Decimal('1000'),
+        )
+        tenant = Tenant.objects.create(
+            first_name='Jane', last_name='Doe, Jr.', id_passport_number='ID1', phone='0700', email='j@example.com',
+        )
+        lease = Lease.objects.create(
+            tenant=tenant, unit=unit, start_date=today, end_date=today + timedelta(days=365),
+            monthly_rent=Decimal('1000'), deposit_amount=Decimal('1000'),
+        )
+        Payment.objects.create(tenant=tenant, lease=lease, amount=Decimal('1000'), method='mpesa', receipt_number='R1')
+        Payment.objects.create(
+            tenant=tenant, lease=lease, amount=Decimal('5'), method='cash', receipt_number='OLD',
+            date=timezone.now() - timedelta(days=60),
+        )
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def test_csv_export_streams_filtered_rows(self):
+        start = (timezone.localdate() - timedelta(days=7)).isoformat()
+        response = self.client.get(reverse('export_data', args=['payments']), {'start': start})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[0], 'Receipt')
+        self.assertEqual(len(lines), 2)
+        self.assertIn('"Doe, Jr."', lines[1])
+
+    def test_xlsx_export_is_a_valid_workbook(self):
+        response = self.client.get(reverse('export_data', args=['leases']), {'format': 'xlsx'})
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        sheet = archive.read('xl/worksheets/sheet1.xml').decode()
+        self.assertIn('Kelvin Apartments', sheet)
+        self.assertEqual(sheet.count('<row>'), 2)
+
+    def test_csv_cells_cannot_become_formulas(self):
+        unit = Unit.objects.get()
+        Visitor.objects.create(name='=HYPERLINK("http://evil.example","x")', phone='+254700', unit_visiting=unit)
+        response = self.client.get(reverse('export_data', args=['visitors']))
+        row = next(csv.reader(b''.join(response.streaming_content).decode().splitlines()[1:]))
+        self.assertEqual(row[:2], ['\'=HYPERLINK("http://evil.example","x")', "'+254700"])
+        payments = self.client.get(reverse('export_data', args=['payments']))
+        amounts = [line[4] for line in csv.reader(b''.join(payments.streaming_content).decode().splitlines()[1:])]
+        self.assertEqual(sorted(amounts), ['1000.00', '5.00'])
+
+    def test_xlsx_drops_xml_illegal_characters(self):
+        Visitor.objects.create(name='Guest\x0bOne\x1f', phone='0711', unit_visiting=Unit.objects.get())
+        response = self.client.get(reverse('export_data', args=['visitors']), {'format': 'xlsx'})
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        texts = [node.text for node in sheet.iter('{http://schemas.openxmlformats.org/spreadsheetml/2006/main}t')]
+        self.assertIn('GuestOne', texts)
+
+    def test_unknown_dataset_and_bad_dates(self):
+        self.assertEqual(self.client.get(reverse('export_data', args=['units'])).status_code, 404)
+        response = self.client.get(reverse('export_data', args=['expenses']), {'end': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_payment_list_does_not_query_per_row(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('payment_list'))
+        # The page's validator reads MAX(updated_at) of the whole table, once.
+        tenant_queries = [q for q in ctx.captured_queries if 'FROM "pms_tenant" WHERE' in q['sql']]
+        self.assertEqual(tenant_queries, [])
+
+
+class StatementImportTests(TestCase):
+    STATEMENT = (
+        'M-PESA STATEMENT\n'
+        'Customer Name:,Kodi Properties\n'
+        'Receipt No.,Completion Time,Details,Paid In,Withdrawn,Other Party Info,A/C No.\n'
+        'QA1,2024-03-05 10:00:00,Pay Bill,"1,000.00",,254712345678 - JANE DOE,\n'
+        'QA2,2024-03-06 11:00:00,Pay Bill,500.00,,0799999999 - STRANGER,id2\n'
+        'QA3,2024-03-07 12:00:00,Pay Bill,250.00,,0799999999 - STRANGER,\n'
+        'QA1,2024-03-05 10:00:00,Pay Bill,1000.00,,254712345678 - JANE DOE,\n'
+        'QA4,2024-03-08 12:00:00,Withdrawal,,300.00,,\n'
+        'EXISTING,2024-03-09 12:00:00,Pay Bill,10.00,,254712345678 - JANE DOE,\n'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.property = Property.objects.create(name='Kelvin Apartments', address='Nairobi')
+        unit = Unit.objects.create(
+            property=cls.property, unit_number='A1', unit_type='1BR',
+            rent_amount=Decimal('1000'), deposit_amount=Decimal('1000'),
+        )
+        cls.jane = Tenant.objects.create(
+            first_name='Jane', last_name='Doe', id_passport_number='ID1', phone='0712 345 678', email='j@example.com',
+        )
+        cls.john = Tenant.objects.create(
+            first_name='John', last_name='Roe', id_passport_number='ID2', phone='0700000000', email='r@example.com',
+        )
+        today = timezone.now().date()
+        cls.lease = Lease.objects.create(
+            tenant=cls.jane, unit=unit, start_date=today, end_date=today + timedelta(days=365),
+            monthly_rent=Decimal('1000'), deposit_amount=Decimal('1000'),
+        )
+        Payment.objects.create(tenant=cls.jane, amount=Decimal('10'), method='mpesa', receipt_number='EXISTING')
+
+    def test_import_matches_dedupes_and_reports(self):
+        result = import_statement(self.STATEMENT.splitlines(), batch_size=2)
+        self.assertEqual(result.created, 2)
+        self.assertEqual(result.duplicates, 2)
+        self.assertEqual(result.skipped, 1)
+        self.assertEqual([row.receipt for row in result.unmatched], ['QA3'])
+
+        by_phone = Payment.objects.get(receipt_number='QA1')
+        self.assertEqual((by_phone.tenant, by_phone.lease, by_phone.amount), (self.jane, self.lease, Decimal('1000')))
+        by_id = Payment.objects.get(receipt_number='QA2')
+        self.assertEqual((by_id.tenant, by_id.lease), (self.john, None))
+
+        ledger = PropertyMonthlyLedger.objects.get(property=self.property, year=2024, month=3)
+        self.assertEqual((ledger.revenue, ledger.payment_count), (Decimal('1000'), 1))
+
+    def test_non_finite_amounts_are_unreadable_rows(self):
+        header = self.STATEMENT.splitlines()[:3]
+        rows = [
+            f'QN{i},2024-03-05 10:00:00,Pay Bill,{amount},,254712345678 - JANE DOE,'
+            for i, amount in enumerate(['NaN', 'Infinity', 'sNaN', '-inf'])
+        ]
+        result = import_statement(header + rows)
+        self.assertEqual(result.created, 0)
+        self.assertEqual([row.reason for row in result.unmatched], ['Unreadable amount or date'] * 4)
+
+    def test_rows_that_do_not_fit_the_payment_columns_are_reported(self):
+        header = self.STATEMENT.splitlines()[:3]
+        cases = [
+            ('QB1', '1e20', 'Amount has more than 12 digits'),
+            ('QB2', '99999999999.00', 'Amount has more than 12 digits'),
+            ('QB3', '12.345', 'Amount has more than 2 decimal places'),
+            ('R' * 150, '100.00', 'Receipt number longer than 100 characters'),
+        ]
+        rows = [f'{receipt},2024-03-05 10:00:00,Pay Bill,{amount},,254712345678 - JANE DOE,' for receipt, amount, _ in cases]
+        good = 'QB4,2024-03-05 10:00:00,Pay Bill,1234567890.12,,254712345678 - JANE DOE,'
+        result = import_statement(header + rows + [good])
+        self.assertEqual([row.reason for row in result.unmatched], [reason for _, _, reason in cases])
+        self.assertEqual(result.created, 1)
+        self.assertEqual(Payment.objects.get(receipt_number='QB4').amount, Decimal('1234567890.12'))
+
+    def test_upload_view(self):
+        staff = User.objects.create_user('staff', password='x', is_staff=True)
+        self.client.force_login(staff)
+        upload = SimpleUploadedFile('statement.csv', self.STATEMENT.encode())
+        response = self.client.post(reverse('payment_import'), {'statement': upload, 'method': 'mpesa'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['result'].created, 2)
+
+        bad = SimpleUploadedFile('statement.csv', b'nothing,useful\n1,2\n')
+        response = self.client.post(reverse('payment_import'), {'statement': bad, 'method': 'bank'})
+        self.assertIsNone(response.context['result'])
+        self.assertTrue(response.context['form'].errors)
+
+
+class TenantBalanceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        prop = Property.objects.create(name='Kelvin Apartments', address='Nairobi')
+        unit = Unit.objects.create(
+            property=prop, unit_number='A1', unit_type='1BR', rent_amount=Decimal('1000'), deposit_amount=Decimal('1000'),
+        )
+        cls.tenant = Tenant.objects.create(
+            first_name='Jane', last_name='Doe', id_passport_number='ID1', phone='0700', email='j@example.com',
+        )
+        cls.lease = Lease.objects.create(
+            tenant=cls.tenant, unit=unit, start_date=timezone.now().date(),
+            end_date=timezone.now().date() + timedelta(days=365),
+            monthly_rent=Decimal('1000'), deposit_amount=Decimal('1000'), payment_frequency='Quarterly',
+        )
+
+    def balance(self):
+        self.tenant.refresh_from_db()
+        return self.tenant.balance, self.tenant.rent_due_date
+
+    def test_charges_and_payments_move_balance_and_due_date(self):
+        post_charge(self.tenant.pk, Decimal('1000'), date(2024, 1, 1), lease_id=self.lease.pk)
+        post_charge(self.tenant.pk, Decimal('1000'), date(2024, 4, 1), lease_id=self.lease.pk)
+        self.assertEqual(self.balance(), (Decimal('2000'), date(2024, 1, 1)))
+
+        payment = Payment.objects.create(
+            tenant=self.tenant, lease=self.lease, amount=Decimal('1500'), method='cash', receipt_number='R1',
+        )
+        self.assertEqual(self.balance(), (Decimal('500'), date(2024, 4, 1)))
+
+        payment.amount = Decimal('2000')
+        payment.save()
+        self.assertEqual(self.balance(), (Decimal('0'), date(2024, 7, 1)))
+
+        payment.delete()
+        self.assertEqual(self.balance()[0], Decimal('2000'))
+        self.assertEqual(balance_drift([self.tenant.pk]), [])
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        Payment.objects.create(tenant=self.tenant, amount=Decimal('300'), method='cash', receipt_number='R2')
+        Tenant.objects.filter(pk=self.tenant.pk).update(balance=Decimal('99'))
+        out = io.StringIO()
+        call_command('reconcile_balances', chunk_size=1, stdout=out)
+        self.assertIn('1 drifted', out.getvalue())
+        call_command('reconcile_balances', fix=True, stdout=io.StringIO())
+        self.assertEqual(self.balance()[0], Decimal('-300'))
+
+
+class BillingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        prop = Property.objects.create(name='Kelvin Apartments', address='Nairobi')
+        cls.leases = []
+        for i, frequency in enumerate(['Monthly', 'Quarterly', 'Monthly']):
+            unit = Unit.objects.create(
+                property=prop, unit_number=f'A{i}', unit_type='1BR',
+                rent_amount=Decimal('1000'), deposit_amount=Decimal('1000'),
+            )
+            tenant = Tenant.objects.create(
+                first_name='Tenant', last_name=str(i), id_passport_number=f'ID{i}', phone=f'070{i}', email='t@example.com',
+            )
+            cls.leases.append(Lease.objects.create(
+                tenant=tenant, unit=unit, start_date=date(2024, 1, 31), end_date=date(2024, 12, 31),
+                monthly_rent=Decimal('1000'), deposit_amount=Decimal('1000'), payment_frequency=frequency,
+                status='terminated' if i == 2 else 'active',
+            ))
+
+    def test_billing_period_anchors_on_lease_start(self):
+        self.assertEqual(billing_period(date(2024, 1, 31), 'Monthly', date(2024, 3, 15)), (date(2024, 2, 29), date(2024, 3, 30)))
+        self.assertEqual(billing_period(date(2024, 1, 31), 'Monthly', date(2024, 3, 31)), (date(2024, 3, 31), date(2024, 4, 29)))
+        self.assertEqual(billing_period(date(2024, 1, 31), 'Quarterly', date(2024, 5, 1)), (date(2024, 4, 30), date(2024, 7, 30)))
+        self.assertEqual(billing_period(date(2024, 1, 1), 'Weekly', date(2024, 1, 9)), (date(2024, 1, 8), date(2024, 1, 14)))
+        self.assertIsNone(billing_period(date(2024, 1, 31), 'Monthly', date(2024, 1, 1)))
+
+    def test_run_is_idempotent_and_charges_tenants(self):
+        result = run_billing(as_of=date(2024, 3, 15), chunk_size=1)
+        self.assertEqual((result.leases, result.invoices), (2, 2))
+        self.assertEqual(run_billing(as_of=date(2024, 3, 15)).invoices, 0)
+
+        quarterly = RentInvoice.objects.get(lease=self.leases[1])
+        self.assertEqual((quarterly.period_start, quarterly.amount), (date(2024, 1, 31), Decimal('3000')))
+        tenant = Tenant.objects.get(pk=self.leases[1].tenant_id)
+        self.assertEqual((tenant.balance, tenant.rent_due_date), (Decimal('3000'), date(2024, 1, 31)))
+        self.assertEqual(compute_dashboard_kpis().outstanding_rent, Decimal('4000'))
+
+        quarterly.delete()
+        tenant.refresh_from_db()
+        self.assertEqual(tenant.balance, Decimal('0'))
+
+
+class LeaseSweepTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        prop = Property.objects.create(name='Kelvin Apartments', address='Nairobi')
+        tenant = Tenant.objects.create(
+            first_name='Jane', last_name='Doe', id_passport_number='ID1', phone='0700', email='j@example.com',
+        )
+        cls.units = [
+            Unit.objects.create(
+                property=prop, unit_number=f'A{i}', unit_type='1BR', status='occupied',
+                rent_amount=Decimal('1000'), deposit_amount=Decimal('1000'),
+            )
+            for i in range(3)
+        ]
+        cls.today = date(2024, 6, 15)
+        ends = [date(2024, 6, 14), date(2024, 7, 1), date(2025, 1, 1)]
+        cls.leases = [
+            Lease.objects.create(
+                tenant=tenant, unit=unit, start_date=date(2024, 1, 1), end_date=end,
+                monthly_rent=Decimal('1000'), deposit_amount=Decimal('1000'),
+            )
+            for unit, end in zip(cls.units, ends)
+        ]
+        # A renewal on the first unit keeps it occupied.
+        Lease.objects.create(
+            tenant=tenant, unit=cls.units[0], start_date=date(2024, 6, 15), end_date=date(2025, 6, 14),
+            monthly_rent=Decimal('1000'), deposit_amount=Decimal('1000'),
+        )
+
+    def test_sweep_moves_leases_and_frees_units(self):
+        Lease.objects.filter(pk=self.leases[1].pk).update(status='expiring', end_date=date(2024, 6, 1))
+        result = sweep_leases(today=self.today, chunk_size=1)
+        self.assertEqual((result.terminated, result.expiring, result.units_vacated), (2, 0, 1))
+        self.assertEqual(
+            [lease.status for lease in Lease.objects.filter(pk__in=[l.pk for l in self.leases]).order_by('pk')],
+            ['terminated', 'terminated', 'active'],
+        )
+        self.assertEqual(
+            list(Unit.objects.order_by('pk').values_list('status', flat=True)),
+            ['occupied', 'vacant', 'occupied'],
+        )
+        self.assertEqual(LeaseSweepRun.objects.get().terminated, 2)
+
+    def test_sweep_marks_expiring_once(self):
+        result = sweep_leases(today=self.today)
+        self.assertEqual((result.terminated, result.expiring), (1, 1))
+        self.assertEqual(Lease.objects.get(pk=self.leases[1].pk).status, 'expiring')
+        self.assertEqual(sweep_leases(today=self.today).expiring, 0)
+
+    def test_lease_created_inside_the_window_is_expiring(self):
+        today = timezone.localdate()
+        self.client.post(reverse('lease_create'), {
+            'tenant': self.leases[0].tenant_id, 'unit': self.units[2].pk, 'start_date': today - timedelta(days=300),
+            'end_date': today + timedelta(days=10), 'monthly_rent': '1000', 'deposit_amount': '1000',
+            'payment_frequency': 'Monthly', 'status': 'active',
+        })
+        self.assertEqual(Lease.objects.latest('pk').status, 'expiring')
+        self.assertFalse(LeaseSweepRun.objects.exists())
+
+    def test_migration_sweeps_existing_leases(self):
+        today = timezone.localdate()
+        Lease.objects.filter(pk=self.leases[1].pk).update(end_date=today + timedelta(days=10))
+        Lease.objects.filter(pk=self.leases[2].pk).update(end_date=today + timedelta(days=60))
+        Lease.objects.exclude(pk__in=[self.leases[1].pk, self.leases[2].pk]).update(end_date=today - timedelta(days=1))
+        backfill = import_module('pms.migrations.0016_backfill_lease_status')
+        backfill.sweep_existing_leases(django_apps, None)
+        self.assertEqual(
+            [lease.status for lease in Lease.objects.filter(pk__in=[l.pk for l in self.leases]).order_by('pk')],
+            ['terminated', 'expiring', 'active'],
+        )
+        self.assertEqual(
+            list(Unit.objects.order_by('pk').values_list('status', flat=True)),
+            ['vacant', 'occupied', 'occupied'],
+        )
+        self.assertEqual(
+            list(UnitStatusChange.objects.filter(reason='lease_ended').values_list('unit_id', flat=True)),
+            [self.units[0].pk],
+        )
+
+
+class UnitStatusHistoryTests(TestCase):
+    def setUp(self):
+        self.property = Property.objects.create(name='Kelvin Apartments', address='Nairobi')
+        self.unit = Unit.objects.create(
+            property=self.property, unit_number='A1', unit_type='1BR',
+            rent_amount=Decimal('1000'), deposit_amount=Decimal('1000'),
+        )
+        self.tenant = Tenant.objects.create(
+            first_name='Jane', last_name='Doe', id_passport_number='ID1', phone='0700', email='j@example.com',
+        )
+
+    def history(self):
+        return list(self.unit.status_changes.order_by('changed_at', 'id').values_list('from_status', 'to_status', 'reason'))
+
+    def test_lease_lifecycle_is_recorded(self):
+        self.assertIsNotNone(self.unit.vacant_since)
+        before_lease = timezone.now()
+        today = timezone.localdate()
+        self.client.post(reverse('lease_create'), {
+            'tenant': self.tenant.pk, 'unit': self.unit.pk, 'start_date': today - timedelta(days=30),
+            'end_date': today + timedelta(days=90), 'monthly_rent': '1000', 'deposit_amount': '1000',
+            'payment_frequency': 'Monthly', 'status': 'active',
+        })
+        self.unit.refresh_from_db()
+        self.assertEqual((self.unit.status, self.unit.vacant_since), ('occupied', None))
+
+        sweep_leases(today=today + timedelta(days=120))
+        self.unit.refresh_from_db()
+        self.assertEqual(self.unit.status, 'vacant')
+        self.assertEqual(self.history(), [
+            ('', 'vacant', 'created'), ('vacant', 'occupied', 'lease_started'), ('occupied', 'vacant', 'lease_ended'),
+        ])
+        self.assertEqual(statuses_at(before_lease), {'vacant': 1})
+        self.assertEqual(turnover(before_lease, timezone.now() + timedelta(seconds=1)), {'move_ins': 1, 'move_outs': 1})
+
+    def test_form_edit_is_recorded_and_long_vacant_uses_vacant_since(self):
+        self.unit.status = 'maintenance'
+        self.unit.save()
+        self.unit.status = 'vacant'
+        self.unit.save()
+        self.assertEqual([row[1] for row in self.history()], ['vacant', 'maintenance', 'vacant'])
+
+        # An old unit that only just became vacant is not long vacant.
+        Unit.objects.filter(pk=self.unit.pk).update(created_at=timezone.now() - timedelta(days=90))
+        self.assertEqual(compute_dashboard_kpis().vacant_units_count, 0)
+        Unit.objects.filter(pk=self.unit.pk).update(vacant_since=timezone.now() - timedelta(days=45))
+        self.assertEqual(compute_dashboard_kpis().vacant_units_count, 1)
+        response = self.client.get(reverse('unit_list') + '?filter=long_vacant')
+        self.assertEqual(len(response.context['units'].object_list), 1)
+
+
+class PropertyDailySnapshotTests(TestCase):
+    def setUp(self):
+        self.property = Property.objects.create(name='Kelvin Apartments', address='Nairobi')
+        units = [
+            Unit.objects.create(
+                property=self.property, unit_number=f'A{n}', unit_type='1BR',
+                rent_amount=Decimal('1000'), deposit_amount=Decimal('1000'),
+            )
+            for n in range(3)
+        ]
+        tenant = Tenant.objects.create(
+            first_name='Jane', last_name='Doe', id_passport_number='ID1', phone='0700', email='j@example.com',
+        )
+        today = timezone.localdate()
+        lease = Lease.objects.create(
+            tenant=tenant, unit=units[0], start_date=today - timedelta(days=10), end_date=today + timedelta(days=100),
+            monthly_rent=Decimal('1000'), deposit_amount=Decimal('1000'), payment_frequency='Monthly', status='active',
+        )
+        units[0].status = 'occupied'
+        units[0].save()
+        units[1].status = 'maintenance'
+        units[1].save()
+        Payment.objects.create(
+            tenant=tenant, lease=lease, amount=Decimal('600'), method='cash', receipt_number='R1',
+        )
+        MaintenanceTicket.objects.create(unit=units[1], category='Plumbing', description='Leak')
+        MaintenanceTicket.objects.create(unit=units[1], category='Paint', description='Walls', status='closed')
+
+    def test_backfill_is_idempotent(self):
+        today = timezone.localdate()
+        args = ['snapshot_properties', '--start', str(today - timedelta(days=1)), '--end', str(today)]
+        call_command(*args, stdout=io.StringIO())
+        call_command(*args, stdout=io.StringIO())
+
+        # The property did not exist yesterday, so only today is written.
+        snapshot = PropertyDailySnapshot.objects.get()
+        self.assertEqual(snapshot.date, today)
+        self.assertEqual(
+            (snapshot.occupied_units, snapshot.vacant_units, snapshot.maintenance_units, snapshot.open_tickets),
+            (1, 1, 1, 1),
+        )
+        self.assertEqual((snapshot.expected_rent, snapshot.collected_rent), (Decimal('1000'), Decimal('600')))
+
+    def test_series_sums_properties(self):
+        other = Property.objects.create(name='Riverside', address='Nairobi')
+        Unit.objects.create(
+            property=other, unit_number='B1', unit_type='2BR', rent_amount=Decimal('2000'), deposit_amount=Decimal('2000'),
+        )
+        today = timezone.localdate()
+        self.assertEqual(snapshot_day(today), 2)
+        series = snapshot_series(today, today)
+        self.assertEqual(len(series), 1)
+        self.assertEqual((series[0]['vacant_units'], series[0]['occupied_units']), (2, 1))
+        self.assertEqual(len(snapshot_series(today, today, property_id=other.pk)), 1)
+
+
+class RequestMetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('admin', password='pw', is_staff=True)
+        prop = Property.objects.create(name='Kelvin Apartments', address='Nairobi')
+        for i in range(3):
+            unit = Unit.objects.create(
+                property=prop, unit_number=f'A{i}', unit_type='1BR',
+                rent_amount=Decimal('1000'), deposit_amount=Decimal('1000'),
+            )
+            tenant = Tenant.objects.create(
+                first_name='Tenant', last_name=str(i), id_passport_number=f'ID{i}',
+                phone=f'0700000{i}', email=f't{i}@example.com',
+            )
+            Payment.objects.create(tenant=tenant, amount=Decimal('100'), method='cash', receipt_number=f'R{i}')
+            Visitor.objects.create(name='Guest', phone='0711', unit_visiting=unit)
+            MaintenanceTicket.objects.create(unit=unit, tenant=tenant, category='Plumbing', description='Leak')
+
+    def setUp(self):
+        view_stats.reset()
+        self.client.force_login(self.staff)
+
+    @override_settings(PMS_QUERY_BUDGET_RAISE=True)
+    def test_views_stay_within_budget_and_are_recorded(self):
+        for name in ('property_list', 'unit_list', 'tenant_list', 'lease_list', 'payment_list', 'ticket_list', 'visitor_list'):
+            response = self.client.get(reverse(name))
+            self.assertEqual(response.status_code, 200)
+        self.assertIn('sql;dur=', response['Server-Timing'])
+        self.assertIn('desc="7 queries"', response['Server-Timing'])
+
+        rows = {row['view']: row for row in self.client.get(reverse('request_stats')).json()['views']}
+        self.assertEqual((rows['payment_list']['requests'], rows['payment_list']['max_queries']), (1, 6))
+        self.assertEqual(rows['payment_list']['budget'], 6)
+        self.assertGreater(rows['payment_list']['avg_template_ms'], 0)
+
+    def test_budget_overrun_logs_or_raises(self):
+        with override_settings(PMS_QUERY_BUDGETS={'payment_list': 1}):
+            with self.assertLogs('pms.instrumentation', 'WARNING'):
+                self.client.get(reverse('payment_list'))
+            with override_settings(PMS_QUERY_BUDGET_RAISE=True), self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('payment_list'))
+
+    def test_stats_are_staff_only(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('request_stats')).status_code, 302)
+
+
+class SeedPortfolioTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.counts = seed_portfolio(PortfolioSize(
+            properties=2, units=10, tenants=12, payments=60, visitors=20, tickets=3, expenses=4,
+        ), seed=1)
+
+    def test_seeded_portfolio_is_consistent(self):
+        self.assertEqual(
+            (self.counts['property'], self.counts['unit'], self.counts['tenant'], self.counts['visitor']),
+            (2, 10, 12, 20),
+        )
+        self.assertEqual(balance_drift(list(Tenant.objects.values_list('pk', flat=True))), [])
+        self.assertEqual(UnitStatusChange.objects.count(), 10)
+        self.assertEqual(
+            Unit.objects.filter(status='occupied').count(),
+            Lease.objects.filter(status__in=Lease.OPEN_STATUSES).count(),
+        )
+        ledger = PropertyMonthlyLedger.objects.aggregate(total=Sum('revenue'))['total']
+        self.assertEqual(ledger, Payment.objects.aggregate(total=Sum('amount'))['total'])
+        # Seeded charges stop before the current period, which billing adds.
+        self.assertEqual(run_billing().invoices, Lease.objects.filter(status__in=Lease.OPEN_STATUSES).count())
+
+    def test_benchmark_covers_every_url(self):
+        timings, skipped = benchmark_urls(repeat=1)
+        self.assertEqual(skipped, [])
+        by_name = {timing.name: timing for timing in timings}
+        self.assertEqual([timing.name for timing in timings if timing.budget and timing.status != 200], [])
+        self.assertEqual(by_name['property_detail'].status, 200)
+        self.assertEqual(by_name['payment_list'].queries, by_name['payment_list'].budget)
+
+        baseline = {'runs': [{'scale': 1, 'results': [timing.as_dict() for timing in timings]}]}
+        current = {'runs': [{'scale': 1, 'results': [dict(row) for row in baseline['runs'][0]['results']]}]}
+        self.assertEqual(compare_reports(baseline, current), [])
+        current['runs'][0]['results'][0]['queries'] += 1
+        self.assertEqual(len(compare_reports(baseline, current)), 1)
+
+
+class SQLiteTuningTests(TestCase):
+    @override_settings(PMS_SQLITE_PROFILE='production', PMS_SQLITE_PRAGMAS={'cache_size': -4000})
+    def test_profile_pragmas_are_applied_to_new_connections(self):
+        self.assertEqual(sqlite_pragmas()['journal_mode'], 'WAL')
+        # A fresh connection, outside the test transaction, runs the hook.
+        fresh = connections.create_connection('default')
+        try:
+            with fresh.cursor() as cursor:
+                cursor.execute('PRAGMA temp_store')
+                self.assertEqual(cursor.fetchone()[0], 2)  # MEMORY
+                cursor.execute('PRAGMA cache_size')
+                self.assertEqual(cursor.fetchone()[0], -4000)
+        finally:
+            fresh.close()
+
+    def test_profile_setting(self):
+        with override_settings(PMS_SQLITE_PROFILE=None):
+            self.assertEqual(sqlite_pragmas(), {})
+        with override_settings(PMS_SQLITE_PROFILE='turbo'), self.assertRaises(ImproperlyConfigured):
+            sqlite_pragmas()
+
+
+@override_settings(PMS_READ_REPLICA='replica')
+class ReplicaRoutingTests(SimpleTestCase):
+    def route(self, method, path, cookies=None, write=False):
+        """The alias a Unit read would use in the request, and the response."""
+        request = RequestFactory().generic(method, path)
+        request.COOKIES.update(cookies or {})
+        request.resolver_match = resolve(path)
+        router = ReplicaRouter()
+        routed = []
+
+        def get_response(request):
+            middleware.process_view(request, None, (), {})
+            if write:
+                router.db_for_write(Visitor)
+            routed.append(router.db_for_read(Unit))
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        response = middleware(request)
+        return routed[0], response
+
+    def test_read_only_views_use_the_replica(self):
+        self.assertEqual(self.route('GET', reverse('unit_list'))[0], 'replica')
+        self.assertEqual(self.route('GET', reverse('export_data', args=['payments']))[0], 'replica')
+        self.assertIsNone(self.route('GET', reverse('unit_create', args=[1]))[0])
+        self.assertIsNone(self.route('POST', reverse('unit_list'))[0])
+        with override_settings(PMS_READ_REPLICA=None):
+            self.assertIsNone(self.route('GET', reverse('unit_list'))[0])
+
+    def test_writes_stick_to_the_primary(self):
+        alias, response = self.route('POST', reverse('visitor_create'), write=True)
+        self.assertIsNone(alias)
+        sticky = response.cookies[STICKY_COOKIE]
+        self.assertEqual(sticky['max-age'], 10)
+        self.assertIsNone(self.route('GET', reverse('visitor_list'), cookies={STICKY_COOKIE: sticky.value})[0])
+        self.assertEqual(self.route('GET', reverse('visitor_list'), cookies={STICKY_COOKIE: '1'})[0], 'replica')
+        # A write inside a read-only view moves its later reads to the primary.
+        self.assertIsNone(self.route('GET', reverse('visitor_list'), write=True)[0])
+        self.assertEqual(ReplicaRouter().db_for_write(Visitor), 'default')
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('admin', password='pw', is_staff=True)
+        cls.prop = Property.objects.create(name='Kelvin Apartments', address='Nairobi')
+        cls.unit = Unit.objects.create(
+            property=cls.prop, unit_number='A1', unit_type='1BR',
+            rent_amount=Decimal('1000'), deposit_amount=Decimal('1000'),
+        )
+        cls.tenant = Tenant.objects.create(
+            first_name='Tenant', last_name='One', id_passport_number='ID1', phone='0700', email='t@example.com',
+        )
+        cls.lease = Lease.objects.create(
+            tenant=cls.tenant, unit=cls.unit, start_date=date(2024, 1, 1), end_date=date(2024, 12, 31),
+            monthly_rent=Decimal('1000'), deposit_amount=Decimal('1000'),
+        )
+        Payment.objects.create(tenant=cls.tenant, amount=Decimal('100'), method='cash', receipt_number='R1')
+        Visitor.objects.create(name='Guest', phone='0711', unit_visiting=cls.unit)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def assertRevalidates(self, url, change):
+        """``url`` answers 304 until ``change()`` runs, then 200 with a new ETag."""
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('no-cache', first['Cache-Control'])
+        with self.assertTemplateNotUsed('base.html'):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['ETag'], first['ETag'])
+        self.assertNotIn('Last-Modified', first)
+        change()
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+    def test_payment_list(self):
+        def rename_tenant():
+            self.tenant.last_name = 'Two'
+            self.tenant.save()
+
+        self.assertRevalidates(reverse('payment_list'), rename_tenant)
+        self.assertRevalidates(reverse('payment_list'), lambda: Payment.objects.filter(receipt_number='R1').delete())
+
+    def test_deletion_is_not_hidden_by_if_modified_since(self):
+        url = reverse('payment_list')
+        since = http_date(timezone.now().timestamp() + 60)
+        Payment.objects.filter(receipt_number='R1').delete()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'R1')
+
+    def test_visitor_list(self):
+        def rename_property():
+            self.prop.name = 'Kelvin Towers'
+            self.prop.save()
+
+        self.assertRevalidates(reverse('visitor_list'), rename_property)
+        self.assertRevalidates(
+            reverse('visitor_list'), lambda: Visitor.objects.create(name='Other', phone='0712', unit_visiting=self.unit),
+        )
+
+    def test_property_detail(self):
+        url = reverse('property_detail', args=[self.prop.pk])
+        self.assertRevalidates(url, lambda: sweep_leases(today=date(2025, 1, 1)))
+        self.assertEqual(self.client.get(reverse('property_detail', args=[0])).status_code, 404)
+
+    def test_etag_is_per_user(self):
+        first = self.client.get(reverse('payment_list'))
+        self.client.force_login(User.objects.create_user('clerk', password='pw'))
+        self.assertEqual(self.client.get(reverse('payment_list'), HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    async def test_async_view(self):
+        request = AsyncRequestFactory().get(reverse('visitor_list'))
+        request.user = AnonymousUser()
+        response = await views.avisitor_list(request)
+        self.assertContains(response, 'Guest')
+        request = AsyncRequestFactory().get(reverse('visitor_list'), headers={'If-None-Match': response['ETag']})
+        request.user = AnonymousUser()
+        self.assertEqual((await views.avisitor_list(request)).status_code, 304)
+
+
+class StaticAssetTests(TestCase):
+    def test_pages_use_self_hosted_assets(self):
+        response = self.client.get(reverse('property_list'))
+        self.assertContains(response, '/static/css/app.css')
+        self.assertContains(response, '/static/css/icons.css')
+        self.assertNotContains(response, 'cdn.tailwindcss.com')
+        self.assertNotContains(response, 'font-awesome')
+
+    def test_icon_subset_covers_the_templates(self):
+        # Fails when a template gains an icon without `manage.py build_assets`.
+        icons_css = (settings.BASE_DIR / 'static' / 'css' / 'icons.css').read_text()
+        built = set(re.findall(r'\.fa-([a-z0-9-]+)', icons_css))
+        self.assertEqual(used_icons(template_files()) - built, set())
+
+    def test_collected_files_are_hashed_precompressed_and_served(self):
+        # The project's own files only; the admin's would just slow this down.
+        finders = ['django.contrib.staticfiles.finders.FileSystemFinder']
+        with tempfile.TemporaryDirectory() as root, override_settings(STATIC_ROOT=root, STATICFILES_FINDERS=finders):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            url = re.search(r'href="(/static/css/app\.[0-9a-f]{12}\.css)"', self.client.get(reverse('property_list')).content.decode())[1]
+            middleware = StaticFilesMiddleware(lambda request: HttpResponse('app'))
+
+            response = middleware(RequestFactory().get(url, HTTP_ACCEPT_ENCODING='gzip, deflate'))
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(response['Content-Type'], 'text/css')
+            self.assertIn('immutable', response['Cache-Control'])
+            self.assertEqual(response['Vary'], 'Accept-Encoding')
+            with open(f'{root}/{url.removeprefix("/static/")}', 'rb') as source:
+                self.assertEqual(gzip.decompress(response.content), source.read())
+
+            response = middleware(RequestFactory().get('/static/css/app.css'))
+            self.assertNotIn('Content-Encoding', response)
+            self.assertNotIn('immutable', response['Cache-Control'])
+            self.assertEqual(middleware(RequestFactory().get('/static/missing.css')).content, b'app')
+
+
+class FragmentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('admin', password='pw', is_staff=True)
+        cls.tenant = Tenant.objects.create(
+            first_name='Tenant', last_name='One', id_passport_number='ID1', phone='0700', email='t@example.com',
+        )
+        cls.other = Tenant.objects.create(
+            first_name='Tenant', last_name='Two', id_passport_number='ID2', phone='0701', email='u@example.com',
+        )
+        cls.payment = Payment.objects.create(tenant=cls.tenant, amount=Decimal('100'), method='cash', receipt_number='R1')
+        Payment.objects.create(tenant=cls.other, amount=Decimal('200'), method='cash', receipt_number='R2')
+
+    def setUp(self):
+        caches[settings.PMS_FRAGMENT_CACHE].clear()
+        self.client.force_login(self.staff)
+
+    def rendered_rows(self):
+        response = self.client.get(reverse('payment_list'))
+        self.assertEqual(response.status_code, 200)
+        return response, [t.name for t in response.templates].count('pms/_payment_row.html')
+
+    def test_unchanged_rows_come_from_the_cache(self):
+        first, rendered = self.rendered_rows()
+        self.assertEqual(rendered, 2)
+        second, rendered = self.rendered_rows()
+        self.assertEqual(rendered, 0)
+        self.assertEqual(second.content, first.content)
+
+    def test_changed_row_and_related_object_rerender(self):
+        self.rendered_rows()
+        self.payment.receipt_number = 'R1-CHANGED'
+        self.payment.save()
+        response, rendered = self.rendered_rows()
+        self.assertEqual(rendered, 1)
+        self.assertContains(response, 'R1-CHANGED')
+
+        self.other.first_name = 'Renamed'
+        self.other.save()
+        response, rendered = self.rendered_rows()
+        self.assertEqual(rendered, 1)
+        self.assertContains(response, 'Renamed')
+
+    def test_empty_list_and_template_loader(self):
+        Payment.objects.all().delete()
+        response, rendered = self.rendered_rows()
+        self.assertEqual(rendered, 0)
+        self.assertContains(response, "No payments found")
+        loader = engines.all()[0].engine.loaders[0]
+        self.assertEqual(loader[0], 'django.template.loaders.cached.Loader')
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.prop = Property.objects.create(name='Kelvin Apartments', address='Ngong Road, Nairobi')
+        cls.other = Property.objects.create(name='Riverside Court', address='Kelvin Lane, Mombasa')
+        cls.unit = Unit.objects.create(
+            property=cls.prop, unit_number='A1', unit_type='1BR',
+            rent_amount=Decimal('1000'), deposit_amount=Decimal('1000'),
+        )
+        cls.tenant = Tenant.objects.create(
+            first_name='Wanjiru', last_name='Kamau', id_passport_number='A1234567', phone='0712345678',
+            email='wanjiru@example.com',
+        )
+        cls.visitor = Visitor.objects.create(name='Otieno', phone='0722000111', vehicle_plate='KDA 123X', unit_visiting=cls.unit)
+        cls.ticket = MaintenanceTicket.objects.create(unit=cls.unit, category='Plumbing', description='Kitchen sink is leaking')
+
+    def found(self, query, **kwargs):
+        return [(entry.kind, entry.object_id) for entry in search(query, **kwargs)]
+
+    def test_saved_rows_are_found_by_word_prefixes(self):
+        self.assertEqual(self.found('wanj kam'), [('tenant', self.tenant.pk)])
+        self.assertEqual(self.found('A12345'), [('tenant', self.tenant.pk)])
+        self.assertEqual(self.found('kda 123'), [('visitor', self.visitor.pk)])
+        self.assertEqual(self.found('0722'), [('visitor', self.visitor.pk)])
+        self.assertEqual(self.found('sink leak'), [('ticket', self.ticket.pk)])
+        self.assertEqual(self.found('"sink" OR*'), [])
+        self.assertEqual(self.found('  '), [])
+
+    def test_title_matches_rank_first_and_kinds_filter(self):
+        self.assertEqual(self.found('kelvin'), [('property', self.prop.pk), ('property', self.other.pk)])
+        self.assertEqual(self.found('kelvin', kinds=['tenant']), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.tenant.last_name = 'Njoroge'
+        self.tenant.save()
+        self.assertEqual(self.found('kamau'), [])
+        self.assertEqual(self.found('njoroge'), [('tenant', self.tenant.pk)])
+        self.visitor.delete()
+        self.assertEqual(self.found('otieno'), [])
+        self.assertFalse(SearchEntry.objects.filter(kind='visitor').exists())
+
+    def test_rebuild_command_restores_the_index(self):
+        SearchEntry.objects.all().delete()
+        self.assertEqual(self.found('wanjiru'), [])
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(SearchEntry.objects.count(), 5)
+        self.assertEqual(self.found('wanjiru'), [('tenant', self.tenant.pk)])
+
+    def test_endpoint_is_ranked_and_paginated(self):
+        response = self.client.get(reverse('search'), {'q': 'kelvin', 'page_size': 1})
+        self.assertEqual(response.json(), {
+            'results': [{
+                'kind': 'property', 'id': self.prop.pk, 'title': 'Kelvin Apartments',
+                'text': 'Ngong Road, Nairobi', 'url': reverse('property_detail', args=[self.prop.pk]),
+            }],
+            'more': True,
+        })
+        response = self.client.get(reverse('search'), {'q': 'kelvin', 'page_size': 1, 'page': 2})
+        self.assertEqual([row['id'] for row in response.json()['results']], [self.other.pk])
+        self.assertFalse(response.json()['more'])
+        response = self.client.get(reverse('search'), {'q': 'plumb', 'kind': ['ticket', 'bogus']})
+        self.assertEqual(response.json()['results'][0]['url'], reverse('ticket_list'))
+
+
+class GateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.guard = User.objects.create_user('guard', password='pw', first_name='Juma', last_name='Ali')
+        cls.prop = Property.objects.create(name='Kelvin Apartments', address='Nairobi')
+        cls.other = Property.objects.create(name='Riverside Court', address='Mombasa')
+        cls.unit = Unit.objects.create(
+            property=cls.prop, unit_number='A1', unit_type='1BR',
+            rent_amount=Decimal('1000'), deposit_amount=Decimal('1000'),
+        )
+        cls.other_unit = Unit.objects.create(
+            property=cls.other, unit_number='B1', unit_type='1BR',
+            rent_amount=Decimal('1000'), deposit_amount=Decimal('1000'),
+        )
+
+    def inside(self, prop=None):
+        return Property.objects.get(pk=(prop or self.prop).pk).visitors_inside
+
+    def post(self, name, data):
+        return self.client.post(reverse(name), data, content_type='application/json')
+
+    def test_check_in_and_out_keep_the_counter(self):
+        self.client.force_login(self.guard)
+        response = self.post('gate_check_in', {
+            'property': self.prop.pk, 'unit_number': 'A1', 'name': 'Otieno', 'phone': '0722', 'vehicle_plate': 'kda 123x',
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['visitors_inside'], 1)
+        visitor = Visitor.objects.get(pk=response.json()['id'])
+        self.assertEqual((visitor.unit_visiting, visitor.vehicle_plate, visitor.security_guard_name), (self.unit, 'KDA 123X', 'Juma Ali'))
+        self.assertEqual(compute_dashboard_kpis().currently_checked_in, 1)
+
+        response = self.client.get(reverse('gate_inside'), {'property': self.prop.pk})
+        self.assertEqual([(row['id'], row['unit']) for row in response.json()['visitors']], [(visitor.pk, 'A1')])
+        self.assertEqual(self.client.get(reverse('gate_inside')).json()['properties'][0]['visitors_inside'], 1)
+
+        response = self.post('gate_check_out', {'vehicle_plate': 'KDA 123X'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['visitors_inside'], 0)
+        visitor.refresh_from_db()
+        self.assertIsNotNone(visitor.exit_time)
+        self.assertEqual(self.post('gate_check_out', {'visitor': visitor.pk}).status_code, 404)
+        self.assertEqual(compute_dashboard_kpis().currently_checked_in, 0)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get(reverse('gate_check_in')).status_code, 405)
+        response = self.post('gate_check_in', {'property': self.prop.pk, 'unit_number': 'Z9', 'name': 'X', 'phone': '1'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('No such unit.', response.json()['errors']['__all__'])
+        self.assertEqual(self.post('gate_check_out', {}).status_code, 400)
+        response = self.client.post(reverse('gate_check_out'), 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.inside(), 0)
+
+    def test_counter_leaves_property_updated_at(self):
+        updated_at = Property.objects.get(pk=self.prop.pk).updated_at
+        visitor = Visitor.objects.create(name='Guest', phone='0711', unit_visiting=self.unit)
+        self.client.force_login(self.guard)
+        self.post('gate_check_out', {'visitor': visitor.pk})
+        self.assertEqual(Property.objects.get(pk=self.prop.pk).updated_at, updated_at)
+
+    def test_visits_saved_or_deleted_elsewhere_are_counted(self):
+        visitor = Visitor.objects.create(name='Guest', phone='0711', unit_visiting=self.unit)
+        self.assertEqual(self.inside(), 1)
+        visitor.unit_visiting = self.other_unit
+        visitor.save()
+        self.assertEqual((self.inside(), self.inside(self.other)), (0, 1))
+        visitor.exit_time = timezone.now()
+        visitor.save()
+        self.assertEqual(self.inside(self.other), 0)
+        Visitor.objects.create(name='Guest', phone='0711', unit_visiting=self.unit)
+        self.unit.delete()
+        self.assertEqual(self.inside(), 0)
+        self.assertEqual(inside_drift([self.prop.pk, self.other.pk]), [])
+
+    def test_reconcile_command_fixes_drift(self):
+        Visitor.objects.bulk_create([Visitor(name='Bulk', phone='0700', unit_visiting=self.unit)])
+        out = io.StringIO()
+        call_command('reconcile_gate_counts', stdout=out)
+        self.assertIn(f'Property {self.prop.pk}: counter 0, open visits 1', out.getvalue())
+        call_command('reconcile_gate_counts', fix=True, stdout=io.StringIO())
+        self.assertEqual(self.inside(), 1)
+
+    def test_open_visits_use_the_partial_index(self):
+        plan = Visitor.objects.filter(exit_time__isnull=True, unit_visiting=self.unit).order_by('-entry_time').explain()
+        self.assertIn('pms_visitor_open_idx', plan)
+        self.assertEqual(open_visits(self.prop.pk), [])
+
+
+@override_settings(PMS_EVENTS_BACKEND='pms.events.LocalBackend', PMS_EVENTS_INTERVAL=0)
+class DashboardEventTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pw')
+        cls.prop = Property.objects.create(name='Kelvin Apartments', address='Nairobi', owner=cls.owner)
+        cls.unit = Unit.objects.create(
+            property=cls.prop, unit_number='A1', unit_type='1BR',
+            rent_amount=Decimal('1000'), deposit_amount=Decimal('1000'),
+        )
+        MaintenanceTicket.objects.create(unit=cls.unit, category='Plumbing', description='Leak', priority='high')
+
+    def test_fields_of_only_the_changed_groups(self):
+        with CaptureQueriesContext(connection) as ctx:
+            fields = compute_kpi_fields({'tickets'})
+        self.assertEqual(fields, {'urgent_tickets_count': 1})
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_writes_publish_their_groups_on_commit(self):
+        with mock.patch('pms.events.publish') as published:
+            with self.captureOnCommitCallbacks(execute=True):
+                MaintenanceTicket.objects.create(unit=self.unit, category='Power', description='Outage', priority='urgent')
+        published.assert_called_once_with(('tickets',), {self.owner.pk})
+
+    async def test_stream_sends_refreshed_fields_to_its_scope(self):
+        stream = event_stream(scope_of(None), lifetime=5, keepalive=5)
+        other = event_stream(str(self.owner.pk + 1), lifetime=0.2, keepalive=1)
+        self.assertTrue((await stream.__anext__()).startswith('retry: '))
+        await other.__anext__()
+        await asyncio.sleep(0)  # let the hub start listening
+        publish(['tickets'], {self.owner.pk})
+        message = await asyncio.wait_for(stream.__anext__(), 5)
+        self.assertTrue(message.startswith('event: kpis\n'))
+        self.assertEqual(json.loads(message.split('data: ', 1)[1]), {'urgent_tickets_count': 1})
+        # Another owner's dashboard hears nothing of it.
+        self.assertNotIn('event: kpis', ''.join([chunk async for chunk in other]))
+        await stream.aclose()
+
+    async def test_events_during_a_refresh_are_sent_after_it(self):
+        def compute(groups, owner=None):
+            if compute.calls == 0:
+                # Another write commits while the first refresh computes.
+                publish(['visitors'])
+            compute.calls += 1
+            return {'refresh': compute.calls}
+        compute.calls = 0
+
+        stream = event_stream(scope_of(None), lifetime=5, keepalive=5)
+        await stream.__anext__()
+        await asyncio.sleep(0)
+        with mock.patch('pms.events.compute_kpi_fields', compute):
+            publish(['tickets'])
+            messages = [await asyncio.wait_for(stream.__anext__(), 5) for _ in range(2)]
+        await stream.aclose()
+        self.assertEqual([json.loads(message.split('data: ', 1)[1]) for message in messages], [{'refresh': 1}, {'refresh': 2}])
+
+    @override_settings(PMS_EVENTS_STREAM_SECONDS=0)
+    async def test_reconnect_gets_a_snapshot(self):
+        request = AsyncRequestFactory().get(reverse('dashboard_events'), headers={'Last-Event-ID': '0'})
+        request.user = AnonymousUser()
+        response = await views.adashboard_events(request)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(json.loads(chunks[1].decode().split('data: ', 1)[1])['urgent_tickets_count'], 1)
+
+    def test_wsgi_stops_the_event_source(self):
+        response = views.dashboard_events(RequestFactory().get(reverse('dashboard_events')))
+        self.assertEqual(response.status_code, 204)
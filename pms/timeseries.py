@@ -0,0 +1,127 @@
+"""
+Revenue / expense time series for the dashboard's financial trend chart.
+
+Bucketing happens in SQL with ``Trunc``, so a series costs one grouped
+query over ``Payment`` (range-filtered on the indexed ``date`` column) and
+one over ``Expense``, however many rows fall in the range.
+"""
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import DateField, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .models import Payment, Expense
+
+ZERO = Decimal('0')
+
+BUCKETS = ('day', 'week', 'month')
+
+# Largest number of buckets a single request may ask for.
+MAX_BUCKETS = 400
+
+
+@dataclass(frozen=True)
+class TrendPoint:
+    bucket: date
+    revenue: Decimal
+    expenses: Decimal
+    net_profit: Decimal
+
+    def as_dict(self):
+        data = asdict(self)
+        data['bucket'] = self.bucket.isoformat()
+        return data
+
+
+def bucket_start(day, bucket):
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(day, bucket):
+    if bucket == 'week':
+        return day + timedelta(days=7)
+    if bucket == 'month':
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+def bucket_range(start, end, bucket):
+    """Every bucket start between ``start`` and ``end`` inclusive."""
+    current = bucket_start(start, bucket)
+    while current <= end:
+        yield current
+        current = next_bucket(current, bucket)
+
+
+def bucket_count(start, end, bucket):
+    if bucket == 'month':
+        return (end.year - start.year) * 12 + end.month - start.month + 1
+    if bucket == 'week':
+        return (bucket_start(end, 'week') - bucket_start(start, 'week')).days // 7 + 1
+    return (end - start).days + 1
+
+
+def datetime_range(start, end):
+    """
+    Aware datetimes bounding the local dates ``start``..``end`` inclusive, for
+    range filters that can use an index on a ``DateTimeField``.
+    """
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(start, time.min), tz),
+        timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz),
+    )
+
+
+def financial_series(start, end, bucket='day', property_id=None, owner=None):
+    """
+    Return a list of ``TrendPoint`` from ``start`` to ``end`` (inclusive
+    dates), one per bucket, with empty buckets filled with zeros.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"Unknown bucket {bucket!r}; expected one of {', '.join(BUCKETS)}.")
+    if end < start:
+        raise ValueError('The end date must not be before the start date.')
+    if bucket_count(start, end, bucket) > MAX_BUCKETS:
+        raise ValueError(f'Range spans more than {MAX_BUCKETS} {bucket} buckets; use a coarser bucket.')
+
+    since, until = datetime_range(start, end)
+    payments = Payment.objects.filter(date__gte=since, date__lt=until)
+    expenses = Expense.objects.filter(date__gte=start, date__lte=end)
+    if property_id is not None:
+        payments = payments.filter(lease__unit__property_id=property_id)
+        expenses = expenses.filter(property_id=property_id)
+    if owner is not None:
+        payments = payments.filter(lease__unit__property__owner=owner)
+        expenses = expenses.filter(property__owner=owner)
+
+    revenue = dict(
+        payments
+        .annotate(bucket=Trunc('date', bucket, output_field=DateField()))
+        .values('bucket')
+        .annotate(total=Sum('amount'))
+        .order_by()
+        .values_list('bucket', 'total')
+    )
+    spent = dict(
+        expenses
+        .annotate(bucket=Trunc('date', bucket, output_field=DateField()))
+        .values('bucket')
+        .annotate(total=Sum('amount'))
+        .order_by()
+        .values_list('bucket', 'total')
+    )
+
+    points = []
+    for day in bucket_range(start, end, bucket):
+        rev = revenue.get(day) or ZERO
+        exp = spent.get(day) or ZERO
+        points.append(TrendPoint(bucket=day, revenue=rev, expenses=exp, net_profit=rev - exp))
+    return points
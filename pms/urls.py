@@ -1,8 +1,14 @@
-from django.urls import path
+from django.conf import settings
+from django.urls import URLPattern, path
 from . import views
 
 urlpatterns = [
     path('', views.dashboard, name='dashboard'),
+    path('dashboard/cache-stats/', views.dashboard_cache_status, name='dashboard_cache_status'),
+    path('dashboard/request-stats/', views.request_stats, name='request_stats'),
+    path('dashboard/events/', views.dashboard_events, name='dashboard_events'),
+    path('api/financial-trend/', views.financial_trend, name='financial_trend'),
+    path('exports/<slug:dataset>/', views.export_data, name='export_data'),
     path('properties/', views.property_list, name='property_list'),
     path('properties/add/', views.property_create, name='property_create'),
     path('properties/<int:pk>/', views.property_detail, name='property_detail'),
@@ -12,11 +18,46 @@ urlpatterns = [
     path('tenants/', views.tenant_list, name='tenant_list'),
     path('tenants/add/', views.tenant_create, name='tenant_create'),
     path('leases/', views.lease_list, name='lease_list'),
+    path('leases/add/', views.lease_create, name='lease_create'),
     path('payments/', views.payment_list, name='payment_list'),
     path('payments/add/', views.payment_create, name='payment_create'),
+    path('payments/import/', views.payment_import, name='payment_import'),
     path('expenses/add/', views.expense_create, name='expense_create'),
     path('tickets/add/', views.ticket_create, name='ticket_create'),
     path('tickets/', views.ticket_list, name='ticket_list'),
     path('visitors/', views.visitor_list, name='visitor_list'),
     path('visitors/add/', views.visitor_create, name='visitor_create'),
+    path('gate/check-in/', views.gate_check_in, name='gate_check_in'),
+    path('gate/check-out/', views.gate_check_out, name='gate_check_out'),
+    path('gate/inside/', views.gate_inside, name='gate_inside'),
+    path('search/', views.search, name='search'),
+    path('lookups/tenants/', views.tenant_lookup, name='tenant_lookup'),
+    path('lookups/leases/', views.lease_lookup, name='lease_lookup'),
+    path('lookups/units/', views.unit_lookup, name='unit_lookup'),
+    path('lookups/properties/', views.property_lookup, name='property_lookup'),
 ]
+
+# Coroutine versions of the read-only views, served instead of the sync ones
+# when PMS_ASYNC_VIEWS is on (the ASGI entry point turns it on).
+ASYNC_VIEWS = {
+    views.dashboard: views.adashboard,
+    views.dashboard_events: views.adashboard_events,
+    views.unit_list: views.aunit_list,
+    views.tenant_list: views.atenant_list,
+    views.lease_list: views.alease_list,
+    views.payment_list: views.apayment_list,
+    views.ticket_list: views.aticket_list,
+    views.visitor_list: views.avisitor_list,
+}
+
+
+def swap_views(patterns, views_map):
+    """Copy ``patterns`` with each view found in ``views_map`` replaced by its value."""
+    return [
+        URLPattern(pattern.pattern, views_map.get(pattern.callback, pattern.callback), pattern.default_args, pattern.name)
+        for pattern in patterns
+    ]
+
+
+if getattr(settings, 'PMS_ASYNC_VIEWS', False):
+    urlpatterns = swap_views(urlpatterns, ASYNC_VIEWS)
@@ -1,111 +1,212 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models import Sum, Count, Q
+from django.db.models import Sum, Count, Max, Q
 from .models import Property, Unit, Tenant, Lease, Payment, Expense, MaintenanceTicket, Visitor
+from .caching import aget_dashboard_kpis, get_dashboard_kpis, get_financial_series, dashboard_cache_stats
+from .lookups import lookup_response, int_param
+from .search import search_response
+from .widgets import TypeaheadSelect
+from .pagination import akeyset_paginate, keyset_paginate
+from .exports import EXPORTS, export_rows, stream_csv, stream_xlsx
+from .statements import StatementFormatError, import_statement
+from .occupancy import long_vacant_q, set_units_status
+from .lifecycle import sweep_lease
+from .instrumentation import view_stats
+from .conditional import conditional_page, table_version
+from .events import event_stream, scope_of
+from . import gate
+from asgiref.sync import sync_to_async
 from django import forms
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse, Http404
+from django.utils.dateparse import parse_date
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_POST
 
 
 from django.utils import timezone
 from datetime import timedelta
-
-def dashboard(request):
-    today = timezone.now()
-    first_day_current_month = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    last_day_prev_month = first_day_current_month - timedelta(days=1)
-    first_day_prev_month = last_day_prev_month.replace(day=1)
-    thirty_days_ago = today - timedelta(days=30)
-
-    # Financials
-    total_rent_collected = Payment.objects.aggregate(Sum('amount'))['amount__sum'] or 0
-    total_expenses = Expense.objects.aggregate(Sum('amount'))['amount__sum'] or 0
-    net_income = total_rent_collected - total_expenses
-
-    # Monthly Trends
-    curr_month_revenue = Payment.objects.filter(date__gte=first_day_current_month).aggregate(Sum('amount'))['amount__sum'] or 0
-    prev_month_revenue = Payment.objects.filter(date__gte=first_day_prev_month, date__lt=first_day_current_month).aggregate(Sum('amount'))['amount__sum'] or 0
-    
-    curr_month_expenses = Expense.objects.filter(date__gte=first_day_current_month.date()).aggregate(Sum('amount'))['amount__sum'] or 0
-    prev_month_expenses = Expense.objects.filter(date__gte=first_day_prev_month.date(), date__lt=first_day_current_month.date()).aggregate(Sum('amount'))['amount__sum'] or 0
-    
-    curr_net_profit = curr_month_revenue - curr_month_expenses
-    prev_net_profit = prev_month_revenue - prev_month_expenses
-    
-    profit_trend = 0
-    if prev_net_profit > 0:
-        profit_trend = ((curr_net_profit - prev_net_profit) / prev_net_profit) * 100
-    elif curr_net_profit > 0:
-        profit_trend = 100
-
-    # Outstanding Rent (Current Month)
-    active_leases = Lease.objects.filter(status='active')
-    total_expected_rent = active_leases.aggregate(Sum('monthly_rent'))['monthly_rent__sum'] or 0
-    outstanding_rent = max(0, total_expected_rent - curr_month_revenue)
-
-    # Property Stats
-    total_properties = Property.objects.count()
-    total_units = Unit.objects.count()
-    occupied_units = Unit.objects.filter(status='occupied').count()
-    occupancy_rate = (occupied_units / total_units * 100) if total_units > 0 else 0
-    vacant_units_count = Unit.objects.filter(status='vacant', created_at__lte=thirty_days_ago).count()
-
-    # Action Alerts
-    expiring_leases_count = Lease.objects.filter(
-        status='active',
-        end_date__lte=today.date() + timedelta(days=30)
-    ).count()
-
-    # Overdue tenants: past due date with outstanding balance
-    overdue_tenants_count = Tenant.objects.filter(
-        status='active',
-        rent_due_date__lt=today.date(),
-        balance__gt=0
-    ).count()
-
-    # Maintenance & Support
-    recent_tickets = MaintenanceTicket.objects.order_by('-created_at')[:5]
-    urgent_tickets_count = MaintenanceTicket.objects.filter(
-        priority='high'
-    ).exclude(status='closed').count()
-
-    # Visitors
-    visitors_today = Visitor.objects.filter(entry_time__date=today.date()).count()
-    currently_checked_in = Visitor.objects.filter(exit_time__isnull=True).count()
-
+import io
+
+# List orderings used for keyset pagination; each ends in a unique column and
+# is backed by a composite index declared on the model.
+PAYMENT_ORDERING = ('-date', '-id')
+VISITOR_ORDERING = ('-entry_time', '-id')
+TENANT_ORDERING = ('last_name', 'first_name', 'id')
+LEASE_ORDERING = ('end_date', 'id')
+TICKET_ORDERING = ('-created_at', '-id')
+UNIT_ORDERING = ('property_id', 'unit_number', 'id')
+
+def dashboard_owner(request):
+    """Owners see their own portfolio; superusers and anonymous users see everything."""
+    user = request.user
+    if user.is_authenticated and not user.is_superuser:
+        return user
+    return None
+
+def _recent_tickets(owner):
+    """The latest tickets on the dashboard, scoped like its KPIs."""
+    tickets = MaintenanceTicket.objects.order_by('-created_at')
+    if owner is not None:
+        tickets = tickets.filter(unit__property__owner=owner)
+    return tickets[:5]
+
+def _dashboard_context(kpis, recent_tickets):
     # Pass empty forms for modals
-    context = {
-        'total_rent_collected': total_rent_collected,
-        'total_expenses': total_expenses,
-        'net_income': net_income,
-        'curr_month_revenue': curr_month_revenue,
-        'curr_month_expenses': curr_month_expenses,
-        'curr_net_profit': curr_net_profit,
-        'profit_trend': round(profit_trend, 1),
-        'outstanding_rent': outstanding_rent,
-        'total_properties': total_properties,
-        'total_units': total_units,
-        'occupied_units': occupied_units,
-        'occupancy_rate': round(occupancy_rate, 1),
-        'vacant_units_count': vacant_units_count,
+    context = kpis.as_dict()
+    context.update({
         'recent_tickets': recent_tickets,
-        'urgent_tickets_count': urgent_tickets_count,
-        'expiring_leases_count': expiring_leases_count,
-        'overdue_tenants_count': overdue_tenants_count,
-        'visitors_today': visitors_today,
-        'currently_checked_in': currently_checked_in,
         'tenant_form': TenantForm(),
         'payment_form': PaymentForm(),
         'expense_form': ExpenseForm(),
         'ticket_form': MaintenanceTicketForm(),
         'unit_quick_form': UnitQuickForm(),
-    }
-    return render(request, 'pms/dashboard.html', context)
+    })
+    return context
+
+def dashboard(request):
+    owner = dashboard_owner(request)
+    kpis = get_dashboard_kpis(owner=owner)
+
+    # Maintenance & Support
+    recent_tickets = _recent_tickets(owner)
+    return render(request, 'pms/dashboard.html', _dashboard_context(kpis, recent_tickets))
+
+async def adashboard(request):
+    """``dashboard`` for ASGI; its KPI aggregates are awaited together."""
+    # request.user loads the session and user synchronously.
+    owner = await sync_to_async(dashboard_owner)(request)
+    kpis = await aget_dashboard_kpis(owner=owner)
+    recent_tickets = [ticket async for ticket in _recent_tickets(owner)]
+    # The modal forms query their choices while rendering, so render in a thread.
+    return await sync_to_async(render)(request, 'pms/dashboard.html', _dashboard_context(kpis, recent_tickets))
+
+def dashboard_events(request):
+    """
+    The dashboard's event stream needs ASGI (``adashboard_events``). Under
+    WSGI, 204 tells the browser's EventSource to stop reconnecting.
+    """
+    return HttpResponse(status=204)
+
+async def adashboard_events(request):
+    """Server-sent KPI refreshes for the open dashboard (``pms.events``)."""
+    owner = await sync_to_async(dashboard_owner)(request)
+    snapshot = None
+    if 'HTTP_LAST_EVENT_ID' in request.META:
+        # A reconnect: send every figure, in case events were missed.
+        async def snapshot():
+            return (await aget_dashboard_kpis(owner=owner)).as_dict()
+    response = StreamingHttpResponse(event_stream(scope_of(owner), snapshot), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream.
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+async def _arender_page(request, template_name, name, queryset, ordering):
+    """Async list view body: fetch a keyset page, then render it in a thread."""
+    page = await akeyset_paginate(request, queryset, ordering)
+    return await sync_to_async(render)(request, template_name, {name: page, 'page': page})
+
+@staff_member_required
+def dashboard_cache_status(request):
+    return JsonResponse(dashboard_cache_stats())
+
+@staff_member_required
+def request_stats(request):
+    """Per-view query counts and timings recorded by this worker process."""
+    return JsonResponse({'views': view_stats.rows()})
+
+@cache_control(private=True, max_age=60)
+def financial_trend(request):
+    """
+    Revenue, expenses and net profit bucketed by day, week or month.
+
+    Accepts ``period=this_month|last_month`` or an explicit ``start``/``end``
+    (ISO dates), plus optional ``bucket`` and ``property`` filters.
+    """
+    today = timezone.localdate()
+    if request.GET.get('period') == 'last_month':
+        end = today.replace(day=1) - timedelta(days=1)
+        start = end.replace(day=1)
+    else:
+        start, end = today.replace(day=1), today
+    try:
+        start = parse_date(request.GET['start']) if 'start' in request.GET else start
+        end = parse_date(request.GET['end']) if 'end' in request.GET else end
+    except ValueError:
+        start = end = None
+    if start is None or end is None:
+        return JsonResponse({'error': 'start and end must be ISO dates (YYYY-MM-DD).'}, status=400)
+
+    bucket = request.GET.get('bucket', 'day')
+    try:
+        series = get_financial_series(
+            start, end, bucket,
+            property_id=int_param(request, 'property'),
+            owner=dashboard_owner(request),
+        )
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'bucket': bucket,
+        'series': series,
+    })
+
+@staff_member_required
+def export_data(request, dataset):
+    """
+    Stream ``dataset`` (payments, leases, expenses or visitors) as CSV or
+    XLSX (``?format=xlsx``), filtered by optional ``start``/``end`` ISO
+    dates and ``property`` id.
+    """
+    spec = EXPORTS.get(dataset)
+    if spec is None:
+        raise Http404(f'Unknown export {dataset!r}.')
+    bounds = {}
+    for name in ('start', 'end'):
+        value = request.GET.get(name)
+        try:
+            bounds[name] = parse_date(value) if value else None
+        except ValueError:
+            bounds[name] = None
+        if value and bounds[name] is None:
+            return JsonResponse({'error': 'start and end must be ISO dates (YYYY-MM-DD).'}, status=400)
+
+    headers = [header for header, _ in spec.columns]
+    rows = export_rows(spec, start=bounds['start'], end=bounds['end'], property_id=int_param(request, 'property'))
+    stamp = timezone.localdate().isoformat()
+    if request.GET.get('format') == 'xlsx':
+        response = StreamingHttpResponse(
+            stream_xlsx(headers, rows, sheet_name=dataset.title()),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+        filename = f'{dataset}-{stamp}.xlsx'
+    else:
+        response = StreamingHttpResponse(stream_csv(headers, rows), content_type='text/csv')
+        filename = f'{dataset}-{stamp}.csv'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 # Property Views
 def property_list(request):
-    properties = Property.objects.all()
+    properties = Property.objects.with_unit_stats()
     return render(request, 'pms/property_list.html', {'properties': properties})
 
+def _property_detail_version(request, pk):
+    version = Property.objects.filter(pk=pk).aggregate(
+        changed=Max('updated_at'),
+        unit_rows=Count('units', distinct=True),
+        units_changed=Max('units__updated_at'),
+        lease_rows=Count('units__leases', distinct=True),
+        leases_changed=Max('units__leases__updated_at'),
+    )
+    # A missing property is left to the view's 404.
+    return list(version.values()) if version['changed'] else None
+
+@conditional_page(_property_detail_version)
 def property_detail(request, pk):
-    property_obj = get_object_or_404(Property, pk=pk)
+    property_obj = get_object_or_404(Property.objects.with_unit_stats(), pk=pk)
     units = property_obj.units.all()
     return render(request, 'pms/property_detail.html', {
         'property': property_obj,
@@ -157,7 +258,7 @@ class UnitQuickForm(forms.ModelForm):
         model = Unit
         fields = ['property', 'unit_number', 'unit_type', 'rent_amount', 'deposit_amount', 'status', 'water_meter', 'electricity_meter']
         widgets = {
-            'property': forms.Select(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
+            'property': TypeaheadSelect('property_lookup', attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
             'unit_number': forms.TextInput(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
             'unit_type': forms.Select(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
             'rent_amount': forms.NumberInput(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
@@ -182,19 +283,23 @@ def unit_create(request, property_pk):
     return render(request, 'pms/unit_form.html', {'form': form, 'property': property_obj})
 
 
-def unit_list(request):
+def _unit_list_queryset(request):
     units = Unit.objects.select_related('property').all()
     filter_type = request.GET.get('filter')
 
     if filter_type == 'long_vacant':
-        today = timezone.now()
-        thirty_days_ago = today - timedelta(days=30)
-        units = units.filter(status='vacant', created_at__lte=thirty_days_ago)
+        units = units.filter(long_vacant_q())
+    return units
 
-    return render(request, 'pms/unit_list.html', {'units': units})
+def unit_list(request):
+    page = keyset_paginate(request, _unit_list_queryset(request), UNIT_ORDERING)
+    return render(request, 'pms/unit_list.html', {'units': page, 'page': page})
+
+async def aunit_list(request):
+    return await _arender_page(request, 'pms/unit_list.html', 'units', _unit_list_queryset(request), UNIT_ORDERING)
 
 # Tenant Views
-def tenant_list(request):
+def _tenant_list_queryset(request):
     tenants = Tenant.objects.all()
     filter_type = request.GET.get('filter')
 
@@ -205,8 +310,14 @@ def tenant_list(request):
             rent_due_date__lt=today,
             balance__gt=0
         )
+    return tenants
 
-    return render(request, 'pms/tenant_list.html', {'tenants': tenants})
+def tenant_list(request):
+    page = keyset_paginate(request, _tenant_list_queryset(request), TENANT_ORDERING)
+    return render(request, 'pms/tenant_list.html', {'tenants': page, 'page': page})
+
+async def atenant_list(request):
+    return await _arender_page(request, 'pms/tenant_list.html', 'tenants', _tenant_list_queryset(request), TENANT_ORDERING)
 
 class TenantForm(forms.ModelForm):
     class Meta:
@@ -239,8 +350,8 @@ class LeaseForm(forms.ModelForm):
         model = Lease
         fields = ['tenant', 'unit', 'start_date', 'end_date', 'monthly_rent', 'deposit_amount', 'payment_frequency', 'status']
         widgets = {
-            'tenant': forms.Select(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
-            'unit': forms.Select(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
+            'tenant': TypeaheadSelect('tenant_lookup', attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
+            'unit': TypeaheadSelect('unit_lookup', attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
             'start_date': forms.DateInput(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500', 'type': 'date'}),
             'end_date': forms.DateInput(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500', 'type': 'date'}),
             'monthly_rent': forms.NumberInput(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
@@ -254,9 +365,8 @@ def lease_create(request):
         form = LeaseForm(request.POST)
         if form.is_valid():
             lease = form.save()
-            # Update unit status to occupied
-            lease.unit.status = 'occupied'
-            lease.unit.save()
+            set_units_status([lease.unit_id], 'occupied', reason='lease_started')
+            sweep_lease(lease.pk)
             return redirect('property_list')
     else:
         # Pre-fill fields if coming from unit detail
@@ -273,28 +383,44 @@ def lease_create(request):
     return render(request, 'pms/lease_form.html', {'form': form})
 
 
-def lease_list(request):
-    leases = Lease.objects.select_related('tenant', 'unit').all()
+def _lease_list_queryset(request):
+    leases = Lease.objects.select_related('tenant', 'unit__property').all()
     filter_type = request.GET.get('filter')
 
     if filter_type == 'expiring':
-        today = timezone.now().date()
-        leases = leases.filter(status='active', end_date__lte=today + timedelta(days=30))
+        # Kept current by the sweep_leases command.
+        leases = leases.filter(status='expiring')
+    return leases
+
+def lease_list(request):
+    page = keyset_paginate(request, _lease_list_queryset(request), LEASE_ORDERING)
+    return render(request, 'pms/lease_list.html', {'leases': page, 'page': page})
 
-    return render(request, 'pms/lease_list.html', {'leases': leases})
+async def alease_list(request):
+    return await _arender_page(request, 'pms/lease_list.html', 'leases', _lease_list_queryset(request), LEASE_ORDERING)
 
 # Payment Views
+def _payment_list_version(request):
+    return table_version(Payment.objects.all(), Tenant)
+
+@conditional_page(_payment_list_version)
 def payment_list(request):
-    payments = Payment.objects.all().order_by('-date')
-    return render(request, 'pms/payment_list.html', {'payments': payments})
+    page = keyset_paginate(request, Payment.objects.select_related('tenant'), PAYMENT_ORDERING)
+    return render(request, 'pms/payment_list.html', {'payments': page, 'page': page})
+
+@conditional_page(_payment_list_version)
+async def apayment_list(request):
+    return await _arender_page(
+        request, 'pms/payment_list.html', 'payments', Payment.objects.select_related('tenant'), PAYMENT_ORDERING,
+    )
 
 class PaymentForm(forms.ModelForm):
     class Meta:
         model = Payment
         fields = ['tenant', 'lease', 'amount', 'method', 'receipt_number', 'notes']
         widgets = {
-            'tenant': forms.Select(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
-            'lease': forms.Select(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
+            'tenant': TypeaheadSelect('tenant_lookup', attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
+            'lease': TypeaheadSelect('lease_lookup', attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}, forward=['tenant']),
             'amount': forms.NumberInput(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
             'method': forms.Select(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
             'receipt_number': forms.TextInput(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
@@ -314,20 +440,53 @@ def payment_create(request):
             tenant = get_object_or_404(Tenant, pk=tenant_pk)
             initial = {'tenant': tenant}
             # Try to find an active lease
-            active_lease = tenant.leases.filter(status='active').first()
+            active_lease = tenant.leases.filter(status__in=Lease.OPEN_STATUSES).first()
             if active_lease:
                 initial['lease'] = active_lease
                 initial['amount'] = active_lease.monthly_rent
         form = PaymentForm(initial=initial)
     return render(request, 'pms/payment_form.html', {'form': form})
 
+class StatementImportForm(forms.Form):
+    statement = forms.FileField(
+        help_text='CSV export of an M-Pesa or bank statement.',
+        widget=forms.ClearableFileInput(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500', 'accept': '.csv'}),
+    )
+    method = forms.ChoiceField(
+        choices=[choice for choice in Payment.METHOD_CHOICES if choice[0] != 'cash'],
+        widget=forms.Select(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
+    )
+
+# Rows of the unmatched report shown on the page; the management command
+# writes the full report to a file.
+UNMATCHED_PREVIEW = 200
+
+@staff_member_required
+def payment_import(request):
+    result = None
+    if request.method == 'POST':
+        form = StatementImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = io.TextIOWrapper(form.cleaned_data['statement'].file, encoding='utf-8-sig', newline='')
+            try:
+                result = import_statement(upload, method=form.cleaned_data['method'])
+            except (StatementFormatError, UnicodeDecodeError) as exc:
+                form.add_error('statement', str(exc))
+    else:
+        form = StatementImportForm()
+    return render(request, 'pms/payment_import.html', {
+        'form': form,
+        'result': result,
+        'unmatched_preview': result.unmatched[:UNMATCHED_PREVIEW] if result else [],
+    })
+
 # Expense Forms
 class ExpenseForm(forms.ModelForm):
     class Meta:
         model = Expense
         fields = ['property', 'category', 'amount', 'date', 'description']
         widgets = {
-            'property': forms.Select(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
+            'property': TypeaheadSelect('property_lookup', attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
             'category': forms.TextInput(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
             'amount': forms.NumberInput(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
             'date': forms.DateInput(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500', 'type': 'date'}),
@@ -340,8 +499,8 @@ class MaintenanceTicketForm(forms.ModelForm):
         model = MaintenanceTicket
         fields = ['tenant', 'unit', 'category', 'description', 'priority']
         widgets = {
-            'tenant': forms.Select(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
-            'unit': forms.Select(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
+            'tenant': TypeaheadSelect('tenant_lookup', attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
+            'unit': TypeaheadSelect('unit_lookup', attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
             'category': forms.TextInput(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
             'description': forms.Textarea(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500', 'rows': 3}),
             'priority': forms.Select(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
@@ -369,14 +528,20 @@ def ticket_create(request):
     return render(request, 'pms/ticket_form.html', {'form': form})
 
 
-def ticket_list(request):
-    tickets = MaintenanceTicket.objects.select_related('unit', 'tenant').all()
+def _ticket_list_queryset(request):
+    tickets = MaintenanceTicket.objects.select_related('unit__property', 'tenant').all()
     filter_type = request.GET.get('filter')
 
     if filter_type == 'urgent':
         tickets = tickets.filter(priority='high').exclude(status='closed')
+    return tickets
 
-    return render(request, 'pms/ticket_list.html', {'tickets': tickets})
+def ticket_list(request):
+    page = keyset_paginate(request, _ticket_list_queryset(request), TICKET_ORDERING)
+    return render(request, 'pms/ticket_list.html', {'tickets': page, 'page': page})
+
+async def aticket_list(request):
+    return await _arender_page(request, 'pms/ticket_list.html', 'tickets', _ticket_list_queryset(request), TICKET_ORDERING)
 
 
 def unit_quick_create(request):
@@ -387,9 +552,19 @@ def unit_quick_create(request):
     return redirect('dashboard')
 
 
+def _visitor_list_version(request):
+    return table_version(Visitor.objects.all(), Unit, Property)
+
+@conditional_page(_visitor_list_version)
 def visitor_list(request):
-    visitors = Visitor.objects.select_related('unit_visiting').order_by('-entry_time')
-    return render(request, 'pms/visitor_list.html', {'visitors': visitors})
+    visitors = Visitor.objects.select_related('unit_visiting__property')
+    page = keyset_paginate(request, visitors, VISITOR_ORDERING)
+    return render(request, 'pms/visitor_list.html', {'visitors': page, 'page': page})
+
+@conditional_page(_visitor_list_version)
+async def avisitor_list(request):
+    visitors = Visitor.objects.select_related('unit_visiting__property')
+    return await _arender_page(request, 'pms/visitor_list.html', 'visitors', visitors, VISITOR_ORDERING)
 
 
 class VisitorForm(forms.ModelForm):
@@ -400,7 +575,7 @@ class VisitorForm(forms.ModelForm):
             'name': forms.TextInput(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
             'phone': forms.TextInput(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
             'id_number': forms.TextInput(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
-            'unit_visiting': forms.Select(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
+            'unit_visiting': TypeaheadSelect('unit_lookup', attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
             'vehicle_plate': forms.TextInput(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
             'security_guard_name': forms.TextInput(attrs={'class': 'w-full p-2 border rounded-lg focus:ring-2 focus:ring-blue-500'}),
         }
@@ -415,3 +590,123 @@ def visitor_create(request):
     else:
         form = VisitorForm()
     return render(request, 'pms/visitor_form.html', {'form': form})
+
+
+# Gate mode (pms.gate)
+def _gate_form(form_class, request):
+    data = gate.request_data(request)
+    if data is None:
+        return None, JsonResponse({'errors': {'__all__': ['Send a JSON object.']}}, status=400)
+    form = form_class(data)
+    if not form.is_valid():
+        return None, JsonResponse({'errors': form.errors}, status=400)
+    return form.cleaned_data, None
+
+@require_POST
+def gate_check_in(request):
+    data, error = _gate_form(gate.CheckInForm, request)
+    if error:
+        return error
+    unit = data['unit']
+    guard = data['guard']
+    if not guard and request.user.is_authenticated:
+        guard = request.user.get_full_name() or request.user.get_username()
+    visitor = gate.check_in(
+        unit['pk'], data['name'], data['phone'], id_number=data['id_number'],
+        vehicle_plate=data['vehicle_plate'], guard=guard,
+    )
+    return JsonResponse({
+        'id': visitor.pk, 'name': visitor.name, 'unit': unit['unit_number'], 'property': unit['property_id'],
+        'entry_time': visitor.entry_time, 'visitors_inside': gate.visitors_inside(unit['property_id']),
+    }, status=201)
+
+@require_POST
+def gate_check_out(request):
+    data, error = _gate_form(gate.CheckOutForm, request)
+    if error:
+        return error
+    visit = gate.check_out(visitor_id=data['visitor'], vehicle_plate=data['vehicle_plate'])
+    if visit is None:
+        return JsonResponse({'errors': {'__all__': ['No open visit found.']}}, status=404)
+    return JsonResponse({
+        'id': visit['id'], 'name': visit['name'], 'property': visit['property_id'], 'exit_time': visit['exit_time'],
+        'visitors_inside': gate.visitors_inside(visit['property_id']),
+    })
+
+def gate_inside(request):
+    """Visitors inside: per property, or for ``?property=`` its count and open visits."""
+    property_id = int_param(request, 'property')
+    if property_id is None:
+        properties = Property.objects.filter(visitors_inside__gt=0).order_by('name', 'pk')
+        return JsonResponse({'properties': [
+            {'id': row['pk'], 'name': row['name'], 'visitors_inside': row['visitors_inside']}
+            for row in properties.values('pk', 'name', 'visitors_inside')
+        ]})
+    inside = gate.visitors_inside(property_id)
+    if inside is None:
+        raise Http404('No such property.')
+    return JsonResponse({
+        'property': property_id,
+        'visitors_inside': inside,
+        'visitors': [
+            {
+                'id': row['pk'], 'name': row['name'], 'phone': row['phone'], 'vehicle_plate': row['vehicle_plate'],
+                'unit': row['unit_visiting__unit_number'], 'entry_time': row['entry_time'],
+            }
+            for row in gate.open_visits(property_id)
+        ],
+    })
+
+
+def search(request):
+    """Ranked full-text search over tenants, visitors, tickets and properties (``pms.search``)."""
+    return search_response(request)
+
+
+# Lookup Views (typeahead)
+def tenant_lookup(request):
+    return lookup_response(
+        request, Tenant.objects.all(),
+        search_fields=['first_name', 'last_name', 'id_passport_number', 'phone'],
+        ordering=['last_name', 'first_name', 'pk'],
+        fields=['first_name', 'last_name'],
+        label=lambda row: f"{row['first_name']} {row['last_name']}",
+    )
+
+def lease_lookup(request):
+    leases = Lease.objects.all()
+    tenant_id = int_param(request, 'tenant')
+    if tenant_id is not None:
+        leases = leases.filter(tenant_id=tenant_id)
+    return lookup_response(
+        request, leases,
+        search_fields=['tenant__first_name', 'tenant__last_name', 'unit__unit_number'],
+        ordering=['-pk'],
+        fields=['tenant__first_name', 'tenant__last_name', 'unit__unit_number', 'unit__property__name'],
+        label=lambda row: (
+            f"Lease: {row['tenant__first_name']} {row['tenant__last_name']} at "
+            f"{row['unit__property__name']} - {row['unit__unit_number']}"
+        ),
+    )
+
+def unit_lookup(request):
+    units = Unit.objects.all()
+    property_id = int_param(request, 'property')
+    if property_id is not None:
+        units = units.filter(property_id=property_id)
+    return lookup_response(
+        request, units,
+        search_fields=['unit_number', 'property__name'],
+        ordering=['property__name', 'unit_number', 'pk'],
+        fields=['unit_number', 'property__name'],
+        label=lambda row: f"{row['property__name']} - {row['unit_number']}",
+    )
+
+def property_lookup(request):
+    return lookup_response(
+        request, Property.objects.all(),
+        search_fields=['name'],
+        ordering=['name', 'pk'],
+        fields=['name'],
+        label=lambda row: row['name'],
+    )
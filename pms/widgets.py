@@ -0,0 +1,38 @@
+from django import forms
+from django.urls import reverse
+
+
+class TypeaheadSelect(forms.Select):
+    """
+    Select for a ``ModelChoiceField`` that renders only the empty and the
+    selected option instead of one ``<option>`` per row. The remaining
+    options are fetched on demand from the JSON lookup view named by
+    ``lookup``; see the typeahead script in ``base.html``.
+
+    ``forward`` names sibling fields whose values are passed along as
+    query parameters (e.g. narrowing leases to the chosen tenant).
+    """
+
+    def __init__(self, lookup, attrs=None, forward=()):
+        super().__init__(attrs)
+        self.lookup = lookup
+        self.forward = tuple(forward)
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        widget_attrs = context['widget']['attrs']
+        widget_attrs['data-lookup-url'] = reverse(self.lookup)
+        if self.forward:
+            widget_attrs['data-lookup-forward'] = ','.join(self.forward)
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        selected = [v for v in value if v not in ('', None)]
+        groups = [(None, [self.create_option(name, '', '---------', not selected, 0)], 0)]
+        if selected:
+            iterator = self.choices
+            queryset = iterator.queryset.filter(pk__in=selected)
+            for index, obj in enumerate(queryset, start=1):
+                option_value, label = iterator.choice(obj)
+                groups.append((None, [self.create_option(name, option_value, label, True, index)], index))
+        return groups